@@ -19,6 +19,8 @@ class GetProfileStatusViewTest(AuthorizedAPITestCase):
         # Patch the user.profile property to return the mock UserProfile instance
         with patch.object(User, 'profile') as mock_get_profile:
             mock_get_profile.return_value = True
+            mock_get_profile.photo_verification_status = 'pending'
 
             response = self._get_response('profile-status')
             self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.data, {'photo_verification_status': 'pending'})
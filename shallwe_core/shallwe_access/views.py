@@ -5,11 +5,17 @@ from rest_framework.views import APIView
 
 
 class GetProfileStatusView(APIView):
-    """Returns 403 if not logged in, 404 if has no profile, 200 if logged in and profile has been created"""
+    """
+    Returns 403 if not logged in, 404 if has no profile, 200 if logged in and profile has been created.\n
+    The latter comes with the profile photo verification status (verified, pending or rejected) to poll.
+    """
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
         if not hasattr(request.user, 'profile'):
             return Response(status=status.HTTP_404_NOT_FOUND)
         else:
-            return Response(status=status.HTTP_200_OK)
+            return Response(
+                {'photo_verification_status': request.user.profile.photo_verification_status},
+                status=status.HTTP_200_OK
+            )
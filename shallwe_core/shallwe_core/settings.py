@@ -26,6 +26,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'corsheaders',
     'rest_framework',
     'rest_framework.authtoken',
@@ -198,6 +199,16 @@ LOGGING = {
             "level": "INFO",
             "propagate": True,
         },
+        "shallwe_photo": {
+            "handlers": ["file", "console"],
+            "level": "INFO",
+            "propagate": True,
+        },
+        "shallwe_profile": {
+            "handlers": ["file", "console"],
+            "level": "INFO",
+            "propagate": True,
+        },
     },
 }
 
@@ -226,18 +237,42 @@ TAGGIT_CASE_INSENSITIVE = True
 
 # Shallwe locations settings
 DEFAULT_KATOTTG_CSV_PATH = BASE_DIR / 'shallwe_locations' / 'locations_src' / 'katottg.csv'
+LOCATIONS_SEARCH_IN_MEMORY = True    # Serve search from a per-process prefix index instead of querying the database
+LOCATIONS_SEARCH_CACHE_SIZE = 2048   # Max search responses kept per process (LRU), 0 to disable
+LOCATIONS_SEARCH_CACHE_ALIAS = None  # Name of a CACHES entry to share responses between processes, if any
+LOCATIONS_SEARCH_VERSION_CHECK_INTERVAL = 1  # Seconds a process trusts its locations data version before rereading it
+LOCATIONS_SEARCH_DEFAULT_LIMIT = 20  # Search results per page if no limit is requested
+LOCATIONS_SEARCH_MAX_LIMIT = 100     # Max search results per page
+LOCATIONS_UPDATE_BATCH_SIZE = 1000   # Locations written per query by update_locations
 
 # Shallwe photo settings
 ALLOWED_PHOTO_FORMATS = ['jpeg', 'jpg', 'png', 'heic', 'heif']
 ALLOWED_PHOTO_MAX_SIZE = 20 * 1024 * 1024   # 20MB
 ALLOWED_PHOTO_MIN_DIMENSIONS = (200, 200)
 ALLOWED_PHOTO_MAX_DIMENSIONS = (8192, 8192)
+FACE_DETECTOR_CASCADE = [         # DeepFace detectors with min confidence, run in order (fastest first) until one fails
+    ('ssd', 0.95),
+    ('mtcnn', 0.95),
+    ('retinaface', 0.95),
+]
+FACE_DETECTORS_PRELOAD = True     # Warm up the detectors in background on server worker start
+FACE_DETECTORS_PARALLEL = False   # Run all the detectors at once in a thread pool instead of one by one
+FACE_DETECTORS_POOL_SIZE = 3      # Max detectors running at once per worker process (in parallel mode)
+FACE_VERDICT_CACHE_SIZE = 4096    # Max face check verdicts kept per process (LRU), 0 to disable
+FACE_VERDICT_CACHE_TTL = 86400    # Seconds a face check verdict is reused for (a day)
+FACE_VERDICT_CACHE_ALIAS = None   # Name of a CACHES entry to share verdicts between processes, if any
 
 # Shallwe profile settings
 PROFILE_MAX_BUDGET = 99999
 PROFILE_NAME_REGEX = r'^[а-яА-ЯёЁіІїЇєЄґҐ`\']{2,16}$'
 PROFILE_OTHER_ANIMAL_REGEX = r'^[а-яА-ЯёЁіІїЇєЄґҐ`\'\-]{2,32}$'
 PROFILE_INTEREST_REGEX = r'^[а-яА-ЯёЁіІїЇєЄґҐ`\'\-\s]{2,32}$'
+PROFILE_PHOTO_ASYNC_VERIFICATION = False    # Queue the photo face check instead of running it within the request
+PROFILE_PHOTO_VERIFICATION_MAX_ATTEMPTS = 3   # Failed (erroneous) face check runs before the photo is marked failed
+PROFILE_PHOTO_VERIFICATION_TIMEOUT = 600      # Seconds a claimed face check may run before other workers retry it
+PROFILE_PHOTO_VERIFICATION_POLL_INTERVAL = 2  # Seconds the verify_profile_photos worker waits when the queue is empty
+PROFILE_MATCHES_REFRESH_TIMEOUT = 600         # Seconds a claimed matches refresh may run before other workers retry it
+PROFILE_MATCHES_REFRESH_POLL_INTERVAL = 2     # Seconds the refresh_profile_matches worker waits when the queue is empty
 
 
 # ----- Mode-specific settings -----
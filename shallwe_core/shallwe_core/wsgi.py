@@ -14,3 +14,11 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'shallwe_core.settings')
 
 application = get_wsgi_application()
+
+
+# Warm up face detectors in background once per worker, so user uploads don't wait for model loading
+from django.conf import settings  # noqa: E402
+
+if settings.FACE_DETECTORS_PRELOAD:
+    from shallwe_photo.facecheck import face_detector_registry  # noqa: E402
+    face_detector_registry.warm_up_in_background()
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ShallweLocationsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'shallwe_locations'
+
+    def ready(self):
+        from . import signals
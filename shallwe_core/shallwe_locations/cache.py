@@ -0,0 +1,120 @@
+"""
+Response cache for location search.
+
+Location data only changes when update_locations runs, so search responses (ranked results, see search.py)
+are cached by the lowercased search term (and search mode) and paginated on every request.
+Every entry is tagged with a data version stamp, which is bumped whenever locations change (see signals.py),
+so stale entries are never served after an update.
+
+The stamp is stored in the database (LocationsVersion), so all workers see an update made by another process
+(e.g. update_locations run by the entrypoint or cron). It's read at most once per
+LOCATIONS_SEARCH_VERSION_CHECK_INTERVAL seconds, every process drops its entries and search index once it changes.
+
+Entries are kept in a bounded per-process LRU. If LOCATIONS_SEARCH_CACHE_ALIAS names a Django cache (CACHES),
+entries are also shared through it.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches, BaseCache
+
+from .models import LocationsVersion
+from .search import invalidate_search_index
+
+
+class LocationSearchCache:
+    ENTRY_KEY_PREFIX = 'shallwe_locations:search:entry'
+
+    def __init__(self):
+        self._entries: OrderedDict[str, list] = OrderedDict()
+        self._lock = threading.Lock()
+        self._seen_version = None
+        self._checked_at = None  # Monotonic time the version was last read from the database
+
+    @property
+    def _max_size(self) -> int:
+        return settings.LOCATIONS_SEARCH_CACHE_SIZE
+
+    @property
+    def _shared_cache(self) -> BaseCache | None:
+        alias = settings.LOCATIONS_SEARCH_CACHE_ALIAS
+        return caches[alias] if alias else None
+
+    def get_data_version(self) -> str:
+        """Returns the current data version stamp, dropping local state if it was bumped (by any process)"""
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < settings.LOCATIONS_SEARCH_VERSION_CHECK_INTERVAL:
+            return self._seen_version
+
+        version = LocationsVersion.get_current()
+        self._checked_at = now
+        if version != self._seen_version:
+            self._reset(version)
+
+        return version
+
+    def bump_data_version(self) -> None:
+        """Marks all cached responses (local and shared, of every process) as stale"""
+        self._reset(LocationsVersion.bump())
+        self._checked_at = time.monotonic()
+
+    def get(self, search_term: str, fuzzy: bool = False) -> list | None:
+        search_term = self._get_term_key(search_term, fuzzy)
+        version = self.get_data_version()
+
+        with self._lock:
+            if (response_data := self._entries.get(search_term)) is not None:
+                self._entries.move_to_end(search_term)
+                return response_data
+
+        if shared_cache := self._shared_cache:
+            if (response_data := shared_cache.get(self._get_entry_key(version, search_term))) is not None:
+                self._set_local(search_term, response_data)
+                return response_data
+
+        return None
+
+    def set(self, search_term: str, response_data: list, fuzzy: bool = False) -> None:
+        search_term = self._get_term_key(search_term, fuzzy)
+        version = self.get_data_version()
+
+        self._set_local(search_term, response_data)
+
+        if shared_cache := self._shared_cache:
+            shared_cache.set(self._get_entry_key(version, search_term), response_data)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def _reset(self, version: str) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._seen_version = version
+        invalidate_search_index()
+
+    def _set_local(self, search_term: str, response_data: list) -> None:
+        if self._max_size <= 0:
+            return
+
+        with self._lock:
+            self._entries[search_term] = response_data
+            self._entries.move_to_end(search_term)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+    def _get_term_key(self, search_term: str, fuzzy: bool) -> str:
+        # Fuzzy and prefix results of the same term differ, the prefix ensures they never collide
+        return f'fuzzy:{search_term.lower()}' if fuzzy else search_term.lower()
+
+    def _get_entry_key(self, version: str, search_term: str) -> str:
+        # Hashed, since the terms are Cyrillic and some backends (e.g. memcached) are picky about keys
+        search_term_hash = hashlib.md5(search_term.encode('utf-8')).hexdigest()
+        return f'{self.ENTRY_KEY_PREFIX}:{version}:{search_term_hash}'
+
+
+location_search_cache = LocationSearchCache()
@@ -0,0 +1,152 @@
+"""
+Typo-tolerant and transliteration-aware matching of location names.
+
+Both names and search terms are reduced to a "skeleton": Latin is transliterated to Cyrillic, Russian and Ukrainian
+letters that sound alike are folded together, soft signs and apostrophes are dropped and doubled letters collapsed.
+So "Kyiv", "Киев" and "Київ" or "Zaporizhzhia" and "Запорожье" end up within a small edit distance of each other.
+
+Candidates are found through an in-memory trigram index over the skeletons and verified by prefix edit distance,
+so the search costs no database queries and stays within a few milliseconds over the whole KATOTTG set.
+"""
+
+import re
+from bisect import bisect_left
+from collections import Counter
+
+
+# Latin to Cyrillic, longest combinations first (covers Ukrainian national and common Russian transliterations)
+LATIN_TRANSLITERATION = (
+    ('shch', 'щ'), ('sch', 'щ'),
+    ('zh', 'ж'), ('kh', 'х'), ('ts', 'ц'), ('ch', 'ч'), ('sh', 'ш'),
+    ('yu', 'ю'), ('iu', 'ю'), ('ya', 'я'), ('ia', 'я'), ('ye', 'є'), ('ie', 'є'), ('yi', 'ї'), ('yo', 'йо'),
+    ('a', 'а'), ('b', 'б'), ('v', 'в'), ('w', 'в'), ('h', 'г'), ('g', 'г'), ('d', 'д'), ('e', 'е'), ('z', 'з'),
+    ('y', 'и'), ('i', 'і'), ('j', 'й'), ('k', 'к'), ('l', 'л'), ('m', 'м'), ('n', 'н'), ('o', 'о'), ('p', 'п'),
+    ('r', 'р'), ('s', 'с'), ('t', 'т'), ('u', 'у'), ('f', 'ф'), ('c', 'ц'), ('x', 'кс'), ('q', 'к'),
+)
+
+# Cyrillic letters that are spelled differently in Ukrainian and Russian (or commonly confused) folded together
+CYRILLIC_FOLDING = str.maketrans({
+    'і': 'и', 'ї': 'и', 'й': 'и', 'ы': 'и',
+    'є': 'е', 'э': 'е', 'ё': 'е',
+    'ґ': 'г',
+    'ь': None, 'ъ': None,
+})
+
+_LATIN_REGEX = re.compile('|'.join(latin for latin, _ in LATIN_TRANSLITERATION))
+_LATIN_MAP = dict(LATIN_TRANSLITERATION)
+_NON_LETTERS_REGEX = re.compile(r'[^а-яёіїєґ ]+')
+_REPEATS_REGEX = re.compile(r'(.)\1+')
+
+
+def get_skeleton(text: str) -> str:
+    """Reduces a name or a search term to its transliteration- and spelling-independent form"""
+    text = text.lower()
+    text = _LATIN_REGEX.sub(lambda match: _LATIN_MAP[match.group()], text)
+    text = text.replace('-', ' ')
+    text = _NON_LETTERS_REGEX.sub('', text)
+    text = text.translate(CYRILLIC_FOLDING)
+    text = _REPEATS_REGEX.sub(r'\1', text)
+    return ' '.join(text.split())
+
+
+def get_trigrams(skeleton: str) -> set[str]:
+    """Trigrams of a skeleton padded at the start, so the beginning of a name weighs more"""
+    padded = '  ' + skeleton
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def get_prefix_distance(term: str, name: str, max_distance: int) -> int | None:
+    """
+    Edit distance between the term and the closest prefix of the name (Levenshtein, row by row).\n
+    Returns None as soon as the distance is known to exceed max_distance.
+    """
+    previous_row = list(range(len(name) + 1))
+    for i, term_char in enumerate(term, start=1):
+        current_row = [i]
+        for j, name_char in enumerate(name, start=1):
+            current_row.append(min(
+                previous_row[j] + 1,
+                current_row[j - 1] + 1,
+                previous_row[j - 1] + (term_char != name_char)
+            ))
+        if min(current_row) > max_distance:
+            return None
+        previous_row = current_row
+
+    distance = min(previous_row)
+    return distance if distance <= max_distance else None
+
+
+def get_max_distance(skeleton: str) -> int:
+    """Edits tolerated for a term: none for very short ones, where any typo changes the meaning"""
+    if len(skeleton) <= 3:
+        return 0
+    elif len(skeleton) <= 6:
+        return 1
+    return 2
+
+
+class FuzzyNameIndex:
+    """
+    Trigram index over name skeletons.\n
+    Items are arbitrary payloads stored along with their name; search returns (payload, distance) pairs.
+    Equal skeletons (e.g. the many villages with the same name) are indexed and verified once.
+    """
+
+    # Distinct skeletons (with the most shared trigrams) verified with edit distance per search
+    MAX_CANDIDATES = 100
+
+    def __init__(self, named_items: list[tuple[str, object]]):
+        items_by_skeleton: dict[str, list[object]] = {}
+        for name, item in named_items:
+            items_by_skeleton.setdefault(get_skeleton(name), []).append(item)
+
+        # Sorted skeletons for exact prefix matches, which are never limited by MAX_CANDIDATES
+        self._skeletons: list[str] = sorted(items_by_skeleton)
+        self._items: list[list[object]] = [items_by_skeleton[skeleton] for skeleton in self._skeletons]
+        self._postings: dict[str, list[int]] = {}
+
+        for position, skeleton in enumerate(self._skeletons):
+            for trigram in get_trigrams(skeleton):
+                self._postings.setdefault(trigram, []).append(position)
+
+    def search(self, search_term: str) -> list[tuple[object, int]]:
+        skeleton = get_skeleton(search_term)
+        if not skeleton:
+            return []
+
+        distances = {position: 0 for position in self._search_exact_prefix(skeleton)}
+
+        if max_distance := get_max_distance(skeleton):
+            trigrams = get_trigrams(skeleton)
+            shared_trigrams = Counter()
+            for trigram in trigrams:
+                shared_trigrams.update(self._postings.get(trigram, ()))
+
+            # Every edit breaks at most 3 trigrams, so closer prefixes share at least this many with the term
+            min_shared = max(len(trigrams) - 3 * max_distance, 1)
+            # Only the name prefix of the term length (plus allowed insertions) can affect the distance
+            max_name_length = len(skeleton) + max_distance
+
+            for position, shared in shared_trigrams.most_common(self.MAX_CANDIDATES):
+                if shared < min_shared:
+                    break
+                if position not in distances:
+                    name_prefix = self._skeletons[position][:max_name_length]
+                    distance = get_prefix_distance(skeleton, name_prefix, max_distance)
+                    if distance is not None:
+                        distances[position] = distance
+
+        return [
+            (item, distance)
+            for position, distance in distances.items()
+            for item in self._items[position]
+        ]
+
+    def _search_exact_prefix(self, skeleton: str) -> list[int]:
+        positions = []
+        position = bisect_left(self._skeletons, skeleton)
+        while position < len(self._skeletons) and self._skeletons[position].startswith(skeleton):
+            positions.append(position)
+            position += 1
+        return positions
@@ -22,18 +22,26 @@ The default expected location of the file is set in settings.py with DEFAULT_KAT
 
 Downloading the source file at that point is strictly manual, since updates are rare and are not immediately adopted.
 
+Only the difference with the stored locations is written (see LocationsDiff).
+
 Basic usage:
 ./manage.py update_locations
+./manage.py update_locations --dry-run  <- only print what would change
+./manage.py update_locations --fast     <- bulk load with COPY (e.g. into a fresh database)
 """
 
 import csv
-from copy import deepcopy
+from collections import Counter
+from io import StringIO
+from typing import Iterable, Iterator
 
 from django.conf import settings
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
 from tqdm import tqdm
 
 from ...models import Location
+from ...signals import locations_updated, locations_bulk_update
 
 
 # ============== CSV OVERRIDES ================
@@ -191,42 +199,71 @@ class LocationWithParentsData:
 
 class LocationDataRegistry:
     """
-    Registers and stores csv rows as parented location data objects organized by category, e.g:
+    Links streamed csv rows to their parents (region, subregion, hromada, ppl).\n
+    The CSV lists every location right after its parents, so only the current chain of ancestors is kept
+    for linking, plus the regions (few, but referenced by name when fixing special cases), e.g:
     {
         'r': {  <- regions
             'UA0400...': LocationWithParentsData(Lvivska),
             ...other_regions
-        },
-        'c': {    <- cities
-            'UA0101...': LocationWithParentsData(Kyiv),
-            ...other_cities
-        },
-        ...other_categories
+        }
     }
     """
 
+    # Categories kept in the registry after their rows are processed
+    RETAINED_CATEGORIES = (CategoryMapper.REGION.category,)
+
+    # Hierarchy level of each category that can be a parent (lower levels drop the higher ones)
+    _ANCESTOR_LEVELS = {
+        CategoryMapper.REGION.category: 0,
+        CategoryMapper.CAPITAL.category: 0,
+        CategoryMapper.SUBREGION.category: 1,
+        CategoryMapper.HROMADA.category: 2,
+        CategoryMapper.OTHER_PPL.category: 3
+    }
+
     def __init__(self):
         self.locations: dict[str, dict[str, LocationWithParentsData]] = {
             key: {}
             for key
-            in CategoryMapper.CATEGORY_KEYS
+            in self.RETAINED_CATEGORIES
         }
-        self._locations_uncategorized: dict[str, LocationWithParentsData] = {}
+        self._locations_by_name: dict[tuple[str, str], list[LocationWithParentsData]] = {}  # By (category, name)
+        self._ancestors: dict[int, LocationFlatData] = {}
 
-    def register(self, csv_row) -> None:
+    def register(self, csv_row) -> LocationWithParentsData:
         """Register a location and link to known parents if any"""
 
         entry = LocationFlatData(csv_row)
         entry_with_parents = self._assign_with_parents(entry)
-        self.locations[entry.category][entry.full_code] = entry_with_parents  # For representation (categorized dict)
-        self._locations_uncategorized[entry.full_code] = entry_with_parents   # For search (flat dict)
+
+        if entry.category in self.locations:
+            self.locations[entry.category][entry.full_code] = entry_with_parents
+            self._locations_by_name.setdefault((entry.category, entry.name), []).append(entry_with_parents)
+        if (level := self._ANCESTOR_LEVELS.get(entry.category)) is not None:
+            self._ancestors = {
+                ancestor_level: ancestor
+                for ancestor_level, ancestor in self._ancestors.items()
+                if ancestor_level < level
+            }
+            self._ancestors[level] = entry
+
+        return entry_with_parents
+
+    def register_all(self, csv_rows: Iterable[dict]) -> Iterator[LocationWithParentsData]:
+        for csv_row in csv_rows:
+            yield self.register(csv_row)
 
     def search_by_name(self, name: str, category: str) -> list[LocationWithParentsData]:
-        locations = []
-        for location in self.locations[category].values():
-            if location.main_entry.name == name:
-                locations.append(location)
-        return locations
+        return list(self._locations_by_name.get((category, name), ()))
+
+    def rename(self, location: LocationWithParentsData, name: str) -> None:
+        """Renames a registered location, keeping it findable by the new name"""
+        entry = location.main_entry
+        if entry.category in self.locations:
+            self._locations_by_name[(entry.category, entry.name)].remove(location)
+            self._locations_by_name.setdefault((entry.category, name), []).append(location)
+        entry.name = name
 
     def _assign_with_parents(self, entry: LocationFlatData) -> LocationWithParentsData:
         """Links a flat entry to its parents if any (region, subregion, hromada, city_dist)"""
@@ -258,28 +295,30 @@ class LocationDataRegistry:
         return linked_entry
 
     def _get_flat_entry_by_full_code(self, location_code: str) -> LocationFlatData | None:
-        if entry := self._locations_uncategorized.get(location_code):
-            return entry.main_entry
+        for ancestor in self._ancestors.values():
+            if ancestor.full_code == location_code:
+                return ancestor
 
 
-def parse_katottg_entries(csv_file) -> LocationDataRegistry:
-    """Parses a CSV file containing KATOTTG entries and returns a LocationDataRegistry object"""
-    katottg_entries = LocationDataRegistry()
+def read_katottg_rows(csv_file) -> Iterator[dict]:
+    """Streams KATOTTG entries (CSV rows) from a file one by one"""
 
     with (open(csv_file, 'r', encoding='utf-8') as file):
         reader = csv.DictReader(file, fieldnames=KATOTTG_FIELDNAME_OVERRIDES.get_all())
-        next(reader)           # Skip the first row
-        rows = list(reader)    # Get the rest listed
+        next(reader)  # Skip the first row
 
         # TQDM for progress bar
-        for row in tqdm(rows, desc="Parsing CSV", unit="rows"):
-            katottg_entries.register(row)
+        yield from tqdm(reader, desc="Importing CSV", unit="rows")
+
 
-    return katottg_entries
+def parse_katottg_entries(csv_rows: Iterable[dict], registry: LocationDataRegistry
+                          ) -> Iterator[LocationWithParentsData]:
+    """Parses KATOTTG entries (CSV rows) into locations linked to their parents"""
+    return registry.register_all(csv_rows)
 
 
 class SpecialCasesFixer:
-    """Fixes special cases in the parsed location data"""
+    """Fixes special cases in the parsed location data as it streams through"""
 
     # Constants
     _KYIV_NAME = 'Київ'
@@ -291,57 +330,63 @@ class SpecialCasesFixer:
     # (Original code tail (00000000) suggests a region against app logic)
     _HIERARCHY_TAIL_OVERRIDE = '99999999'
 
-    def __init__(self, parsed_locations: LocationDataRegistry):
-        self._fixed_locations = deepcopy(parsed_locations)
-
-    def fix(self) -> LocationDataRegistry:
-        self._override_crimea()
-        self._fix_capitals()
-        return self._fixed_locations
-
-    def _override_crimea(self):
-        crimea_entry = self._fixed_locations.search_by_name(
-            self._CRIMEA_NAME_ORIGINAL,
+    def __init__(self, registry: LocationDataRegistry):
+        self._registry = registry
+        self._fixed_capitals: dict[str, LocationWithParentsData] = {}
+
+    def fix(self, locations: Iterable[LocationWithParentsData]) -> Iterator[LocationWithParentsData]:
+        for location in locations:
+            category = location.category
+
+            if category == CategoryMapper.REGION.category:
+                if location.main_entry.name == self._CRIMEA_NAME_ORIGINAL:
+                    self._override_crimea(location)
+            elif category == CategoryMapper.CAPITAL.category:
+                self._fix_capital(location)
+            elif category == CategoryMapper.CITY_DISTRICT.category:
+                if location.ppl and (capital := self._fixed_capitals.get(location.ppl.full_code)):
+                    self._fix_capital_district(location, capital)
+
+            yield location
+
+    def _override_crimea(self, crimea: LocationWithParentsData):
+        self._registry.rename(crimea, self._CRIMEA_NAME_OVERRIDE)
+
+    def _fix_capital(self, capital: LocationWithParentsData):
+        capital_entity = capital.main_entry
+
+        # 1) Make all capital parents beyond the region point to the capital itself
+        capital.subregion = capital.region
+        capital.hromada = capital.region
+        capital.ppl = capital.region
+
+        # 2) Assign a proper region to the capital (it comes as a region itself, after all the regions)
+        region_search_name = self._KYIV_REGION_NAME \
+            if capital_entity.name == self._KYIV_NAME \
+            else self._CRIMEA_NAME_OVERRIDE
+        proper_region = self._registry.search_by_name(
+            region_search_name,
             CategoryMapper.REGION.category
         )[0].main_entry
-        crimea_entry.name = self._CRIMEA_NAME_OVERRIDE
-
-    def _fix_capitals(self):
-        for capital in self._fixed_locations.locations[CategoryMapper.CAPITAL.category].values():
-            capital_entity = capital.main_entry
-
-            # 1) Make all capital parents beyond the region point to the capital itself
-            capital.subregion = capital.region
-            capital.hromada = capital.region
-            capital.ppl = capital.region
-
-            # 2) Assign a proper region to the capital (it comes as a region itself)
-            region_search_name = self._KYIV_REGION_NAME \
-                if capital_entity.name == self._KYIV_NAME \
-                else self._CRIMEA_NAME_OVERRIDE
-            proper_region = self._fixed_locations.search_by_name(
-                region_search_name,
-                CategoryMapper.REGION.category
-            )[0].main_entry
-            capital.region = proper_region
-
-            # 3) Create proper hierarchy code (shortened) (region short hierarchy with default capital tail)
-            proper_hierarchy = proper_region.trimmed_hierarchy_code + self._HIERARCHY_TAIL_OVERRIDE
-            capital_entity.hierarchy_code = proper_hierarchy
-
-            # 4) Process districts of that capital
-            for district in self._fixed_locations.locations[CategoryMapper.CITY_DISTRICT.category].values():
-                if district.ppl == capital_entity:
-                    # Give this capital's district a proper region
-                    district.region = capital.region
-                    # Add district number to chain for right hierarchy code
-                    district.main_entry.hierarchy_code = proper_hierarchy + district.main_entry.hierarchy_code[-2:]
+        capital.region = proper_region
+
+        # 3) Create proper hierarchy code (shortened) (region short hierarchy with default capital tail)
+        capital_entity.hierarchy_code = proper_region.trimmed_hierarchy_code + self._HIERARCHY_TAIL_OVERRIDE
+
+        self._fixed_capitals[capital_entity.full_code] = capital
+
+    def _fix_capital_district(self, district: LocationWithParentsData, capital: LocationWithParentsData):
+        # Give this capital's district a proper region
+        district.region = capital.region
+        # Add district number to chain for right hierarchy code
+        district.main_entry.hierarchy_code = capital.main_entry.hierarchy_code + district.main_entry.hierarchy_code[-2:]
 
 
 class LocationModelsBuilder:
     """
-    Builds final Location models from the location data
-    Outputs a dict of Location models keyed by autocode
+    Builds final Location models from the streamed location data.\n
+    A populated place is held back until its districts (listed right after it) are built,
+    since having districts makes it a city.
     """
 
     WHOLE_COUNTRY_MODEL = Location(
@@ -351,31 +396,49 @@ class LocationModelsBuilder:
         search_name='Вся Україна'
     )
 
-    def __init__(self, fixed_locations: LocationDataRegistry):
-        self._fixed_locations = fixed_locations
-        self._locations_to_create_or_update: dict[str, Location] = {}
+    # Location data categories stored as Location models
+    MODEL_CATEGORIES = (
+        CategoryMapper.REGION.category,
+        CategoryMapper.CAPITAL.category,
+        CategoryMapper.OTHER_PPL.category,
+        CategoryMapper.CITY_DISTRICT.category
+    )
+
+    def make_locations(self, locations: Iterable[LocationWithParentsData]) -> Iterator[Location]:
+        yield self.WHOLE_COUNTRY_MODEL
 
-    def make_locations(self) -> dict[str, Location]:
-        self._prepare_whole_country()
-        self._prepare_location_models()
-        return self._locations_to_create_or_update
+        held_ppl = None
+        for new_location_data in locations:
+            category = new_location_data.category
+            if category not in self.MODEL_CATEGORIES:
+                continue
 
-    def _prepare_whole_country(self) -> None:
-        self._locations_to_create_or_update[self.WHOLE_COUNTRY_MODEL.autocode] = self.WHOLE_COUNTRY_MODEL
+            if category != CategoryMapper.CITY_DISTRICT.category and held_ppl is not None:
+                yield held_ppl
+                held_ppl = None
 
-    def _prepare_location_models(self) -> None:
-        for location_type in (
-                CategoryMapper.REGION.category,
-                CategoryMapper.CAPITAL.category,
-                CategoryMapper.OTHER_PPL.category,
-                CategoryMapper.CITY_DISTRICT.category
+            new_location = self._make_location_model(new_location_data, held_ppl)
+            if category in (CategoryMapper.CAPITAL.category, CategoryMapper.OTHER_PPL.category):
+                held_ppl = new_location
+            else:
+                yield new_location
+
+        if held_ppl is not None:
+            yield held_ppl
+
+    def _make_location_model(self, new_location_data: LocationWithParentsData, held_ppl: Location | None
+                             ) -> Location:
+        # Districts can only be linked to the populated place just before them
+        category = new_location_data.category
+        if category == CategoryMapper.CITY_DISTRICT.category and (
+                held_ppl is None
+                or new_location_data.ppl is None
+                or held_ppl.autocode != new_location_data.ppl.autocode
         ):
-            for _, new_location_data in self._fixed_locations.locations[location_type].items():
-                self._prepare_location_model(new_location_data)
+            raise ValueError(f'\nCity district "{new_location_data.main_entry.name}" '
+                             f'is not listed right after its city.\n')
 
-    def _prepare_location_model(self, new_location_data: LocationWithParentsData) -> None:
         # Prepare region data
-        category = new_location_data.category
         autocode = new_location_data.main_entry.autocode
         hierarchy = new_location_data.main_entry.trimmed_hierarchy_code
         search_name = new_location_data.main_entry.name
@@ -397,13 +460,13 @@ class LocationModelsBuilder:
             # Update further if the entry is a city district
             if category == CategoryMapper.CITY_DISTRICT.category:
                 district_name = new_location_data.city_dist.name
-                new_city = self._locations_to_create_or_update[new_location_data.ppl.autocode]
+                new_city = held_ppl
                 new_city.category = CategoryMapper.CAPITAL.category
                 city = new_city
                 region_name = new_city.region_name
 
-        # Create and store the model
-        new_location = Location(
+        # Create the model
+        return Location(
             autocode=autocode,
             category=category,
             hierarchy=hierarchy,
@@ -414,7 +477,159 @@ class LocationModelsBuilder:
             search_name=search_name,
             city=city
         )
-        self._locations_to_create_or_update[autocode] = new_location
+
+
+class LocationsDiff:
+    """
+    Compares imported Location models with the stored ones (keyed by autocode) and keeps only the delta:\n
+    new locations to insert, changed ones to update (with their changed fields) and autocodes to delete.
+    """
+
+    # Fields compared and updated (city compared by its autocode)
+    FIELDS = ('category', 'hierarchy', 'region_name', 'subregion_name', 'ppl_name', 'district_name', 'city',
+              'search_name')
+
+    def __init__(self, current_locations: dict[str, tuple]):
+        self._current_locations = current_locations
+        self._imported_autocodes: set[str] = set()
+        self.to_create: list[Location] = []
+        self.to_update: list[Location] = []
+        self.changed_fields: Counter[str] = Counter()
+
+    @classmethod
+    def from_database(cls) -> 'LocationsDiff':
+        current_locations = Location.objects.values_list('autocode', *cls._get_attnames())
+        return cls({autocode: tuple(values) for autocode, *values in current_locations})
+
+    @property
+    def imported_count(self) -> int:
+        return len(self._imported_autocodes)
+
+    @property
+    def to_delete(self) -> list[str]:
+        return [autocode for autocode in self._current_locations if autocode not in self._imported_autocodes]
+
+    def compare(self, imported_locations: Iterable[Location]) -> None:
+        attnames = self._get_attnames()
+
+        for location in imported_locations:
+            self._imported_autocodes.add(location.autocode)
+            current_values = self._current_locations.get(location.autocode)
+
+            if current_values is None:
+                self.to_create.append(location)
+                continue
+
+            imported_values = tuple(getattr(location, attname) for attname in attnames)
+            if imported_values != current_values:
+                self.to_update.append(location)
+                self.changed_fields.update(
+                    field
+                    for field, current_value, imported_value in zip(self.FIELDS, current_values, imported_values)
+                    if current_value != imported_value
+                )
+
+    def has_changes(self) -> bool:
+        return bool(self.to_create or self.to_update or self.to_delete)
+
+    def get_summary(self) -> str:
+        changed_fields = ', '.join(f'{field}: {count}' for field, count in self.changed_fields.most_common())
+        return (f'Locations to insert: {len(self.to_create)}\n'
+                f'Locations to update: {len(self.to_update)}' + (f' ({changed_fields})' if changed_fields else '') +
+                f'\nLocations to delete: {len(self.to_delete)}')
+
+    @classmethod
+    def _get_attnames(cls) -> list[str]:
+        return [Location._meta.get_field(field).attname for field in cls.FIELDS]
+
+
+class LocationsCopyLoader:
+    """
+    Fast loader: streams Location models into a temporary staging table with COPY FROM STDIN
+    and merges them into the Location table with a single INSERT ... ON CONFLICT (autocode).\n
+    Rows that didn't change are left untouched, rows missing from the staging table are deleted
+    through the ORM (as few as in the default path), so the deletion cascades to the rows referencing them.
+    """
+
+    STAGING_TABLE = 'shallwe_locations_location_staging'
+
+    def __init__(self, batch_size: int):
+        self.batch_size = batch_size
+        self.loaded_count = 0
+        self.merged_count = 0
+        self.deleted_count = 0
+
+    def load(self, locations: Iterable[Location]) -> None:
+        table = connection.ops.quote_name(Location._meta.db_table)
+        staging = connection.ops.quote_name(self.STAGING_TABLE)
+        fields = [Location._meta.get_field(field) for field in ('autocode', *LocationsDiff.FIELDS)]
+        columns = [field.column for field in fields]
+        column_list = ', '.join(connection.ops.quote_name(column) for column in columns)
+        update_columns = [connection.ops.quote_name(column) for column in columns[1:]]
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'CREATE TEMPORARY TABLE {staging} (LIKE {table} INCLUDING DEFAULTS)')
+            cursor.copy_expert(
+                f'COPY {staging} ({column_list}) FROM STDIN WITH (FORMAT csv)',
+                _CopyStream(self._get_csv_lines(locations, [field.attname for field in fields]))
+            )
+
+            # Deleting first frees hierarchy codes that could be taken over by other locations
+            cursor.execute(
+                f'SELECT autocode FROM {table} AS location WHERE NOT EXISTS '
+                f'(SELECT 1 FROM {staging} AS staged WHERE staged.autocode = location.autocode)'
+            )
+            to_delete = [autocode for autocode, in cursor.fetchall()]
+            with locations_bulk_update():
+                for i in range(0, len(to_delete), self.batch_size):
+                    Location.objects.filter(autocode__in=to_delete[i:i + self.batch_size]).delete()
+            self.deleted_count = len(to_delete)
+
+            cursor.execute(
+                f'INSERT INTO {table} AS location ({column_list}) SELECT {column_list} FROM {staging} '
+                f'ON CONFLICT (autocode) DO UPDATE SET '
+                + ', '.join(f'{column} = EXCLUDED.{column}' for column in update_columns) +
+                f' WHERE ({", ".join(f"location.{column}" for column in update_columns)}) '
+                f'IS DISTINCT FROM ({", ".join(f"EXCLUDED.{column}" for column in update_columns)})'
+            )
+            self.merged_count = cursor.rowcount
+
+            # Dropped explicitly rather than ON COMMIT, since the load may run inside an outer transaction
+            cursor.execute(f'DROP TABLE {staging}')
+
+    def has_changes(self) -> bool:
+        return bool(self.merged_count or self.deleted_count)
+
+    def _get_csv_lines(self, locations: Iterable[Location], attnames: list[str]) -> Iterator[str]:
+        buffer = StringIO()
+        writer = csv.writer(buffer, lineterminator='\n')  # None is written unquoted, which COPY reads as NULL
+
+        for location in locations:
+            writer.writerow([getattr(location, attname) for attname in attnames])
+            self.loaded_count += 1
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+
+class _CopyStream:
+    """File-like wrapper over an iterator of strings, read by copy_expert chunk by chunk"""
+
+    def __init__(self, lines: Iterator[str]):
+        self._lines = lines
+        self._buffer = ''
+
+    def read(self, size: int = -1) -> str:
+        while size < 0 or len(self._buffer) < size:
+            line = next(self._lines, None)
+            if line is None:
+                break
+            self._buffer += line
+
+        if size < 0:
+            size = len(self._buffer)
+        chunk, self._buffer = self._buffer[:size], self._buffer[size:]
+        return chunk
 
 
 # ============ MAIN PROCESS ===============
@@ -425,32 +640,69 @@ class Command(BaseCommand):
 
     def add_arguments(self, parser):
         parser.add_argument('csv_file', nargs='?', type=str, help='Path to the CSV file')
+        parser.add_argument('--dry-run', action='store_true', help='Only print the changes, do not apply them')
+        parser.add_argument('--fast', action='store_true',
+                            help='Load through a staging table with COPY instead of comparing in Python '
+                                 '(best for fresh databases)')
 
     def handle(self, *args, **options):
         csv_file = options['csv_file'] or settings.DEFAULT_KATOTTG_CSV_PATH
+        if options['fast'] and options['dry_run']:
+            raise CommandError('--fast applies the changes right away, it cannot be combined with --dry-run')
+
+        # Every stage is a generator, so rows flow through one by one instead of loading the whole file
+        self.stdout.write('Importing locations: parsing CSV, fixing special cases, creating models, '
+                          'loading into the database...')
+        registry = LocationDataRegistry()
+        parsed_entries = parse_katottg_entries(read_katottg_rows(csv_file), registry)
+        fixed_entries = SpecialCasesFixer(registry).fix(parsed_entries)
+        locations_to_create_update = LocationModelsBuilder().make_locations(fixed_entries)
+
+        if options['fast']:
+            self._load_fast(locations_to_create_update)
+            return
+
+        diff = LocationsDiff.from_database()
+        diff.compare(locations_to_create_update)
+        self.stdout.write(diff.get_summary())
+
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS('Dry run, no changes applied.'))
+            return
+
+        if diff.has_changes():
+            self.stdout.write('Updating the database...')
+            self._update_database(diff)
+            locations_updated.send(sender=self.__class__)
 
-        self.stdout.write('Parsing CSV...')
-        parsed_entries = parse_katottg_entries(csv_file)
-
-        self.stdout.write('Fixing special cases to fit the database...')
-        fixed_entries = SpecialCasesFixer(parsed_entries).fix()
-
-        self.stdout.write('Creating models...')
-        locations_to_create_update = LocationModelsBuilder(fixed_entries).make_locations()
+        self.stdout.write(self.style.SUCCESS(
+            f'Locations updated successfully. Total locations: {diff.imported_count}'
+        ))
 
-        self.stdout.write('Updating the database...')
-        self._update_database(locations_to_create_update)
+    def _load_fast(self, locations_to_create_update: Iterable[Location]) -> None:
+        loader = LocationsCopyLoader(settings.LOCATIONS_UPDATE_BATCH_SIZE)
+        loader.load(locations_to_create_update)
+        if loader.has_changes():
+            locations_updated.send(sender=self.__class__)
 
+        self.stdout.write(f'Locations inserted or updated: {loader.merged_count}\n'
+                          f'Locations deleted: {loader.deleted_count}')
         self.stdout.write(self.style.SUCCESS(
-            f'Locations updated successfully. Total locations: {len(locations_to_create_update.values())}'
+            f'Locations updated successfully. Total locations: {loader.loaded_count}'
         ))
 
-    def _update_database(self, locations_to_create_or_update: dict[str, Location]) -> None:
-        Location.objects.bulk_create(
-            locations_to_create_or_update.values(),
-            update_conflicts=True,
-            unique_fields=['autocode'],
-            update_fields=['category', 'hierarchy', 'region_name', 'subregion_name', 'ppl_name', 'district_name',
-                           'city', 'search_name']
-        )
-        Location.objects.exclude(autocode__in=locations_to_create_or_update.keys()).delete()
+    def _update_database(self, diff: LocationsDiff) -> None:
+        """Writes only the delta in batches, all in one transaction"""
+        batch_size = settings.LOCATIONS_UPDATE_BATCH_SIZE
+
+        # Rows deleted through the ORM send model signals, locations_updated is sent once instead
+        with transaction.atomic(), locations_bulk_update():
+            # Deleting first frees hierarchy codes that could be taken over by other locations
+            to_delete = diff.to_delete
+            for i in range(0, len(to_delete), batch_size):
+                Location.objects.filter(autocode__in=to_delete[i:i + batch_size]).delete()
+
+            if diff.to_update:
+                Location.objects.bulk_update(diff.to_update, list(diff.changed_fields), batch_size=batch_size)
+
+            Location.objects.bulk_create(diff.to_create, batch_size=batch_size)
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.1 on 2026-10-17 21:55
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shallwe_locations', '0003_alter_location_city'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='location',
+            index=models.Index(models.F('category'), django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Lower('search_name'), name='text_pattern_ops'), name='location_category_search_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.0.1 on 2026-10-17 23:07
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shallwe_locations', '0004_location_category_search_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LocationsVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.UUIDField(default=uuid.uuid4)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -1,9 +1,14 @@
+import uuid
+
+from django.contrib.postgres.indexes import OpClass
 from django.db import models
-from django.db.models import CheckConstraint, Q
+from django.db.models import CheckConstraint, Q, F
+from django.db.models.functions import Lower
 
 
 class Location(models.Model):
     HIERARCHY_REGEX = r'^UA(?:\d{2}|\d{10}|\d{12})$'
+    HIERARCHY_LENGTHS = (2, 4, 12, 14)  # Whole country, region, city or other PPL, city district
 
     class CategoryChoices(models.TextChoices):
         WHOLE_COUNTRY = 'a', 'Whole country'
@@ -35,6 +40,15 @@ class Location(models.Model):
             'hierarchy'
         ]
 
+        indexes = [
+            # Prefix search by name within a category (see search.py), pattern ops make LIKE 'x%' use the index
+            models.Index(
+                F('category'),
+                OpClass(Lower('search_name'), name='text_pattern_ops'),
+                name='location_category_search_idx'
+            ),
+        ]
+
         constraints = [
             # City District category constraints
             CheckConstraint(
@@ -106,3 +120,31 @@ class Location(models.Model):
     @classmethod
     def get_all_country(cls) -> 'Location':
         return cls.objects.get(category='a')
+
+    @classmethod
+    def get_hierarchy_prefixes(cls, hierarchy: str) -> list[str]:
+        """Hierarchies of the locations containing the given one, from the whole country to itself"""
+        return [hierarchy[:length] for length in cls.HIERARCHY_LENGTHS if length <= len(hierarchy)]
+
+
+class LocationsVersion(models.Model):
+    """
+    Single row stamping the current locations data.\n
+    It's changed whenever locations change, so every process (e.g. server workers after update_locations)
+    can tell its cached locations data is stale (see cache.py).
+    """
+
+    SINGLETON_ID = 1
+
+    version = models.UUIDField(default=uuid.uuid4, null=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @classmethod
+    def get_current(cls) -> str:
+        version, _ = cls.objects.get_or_create(pk=cls.SINGLETON_ID)
+        return version.version.hex
+
+    @classmethod
+    def bump(cls) -> str:
+        version, _ = cls.objects.update_or_create(pk=cls.SINGLETON_ID, defaults={'version': uuid.uuid4()})
+        return version.version.hex
@@ -1,16 +1,38 @@
+import threading
+from bisect import bisect_left
+from operator import itemgetter
+
 from django.db.models import QuerySet
+from django.db.models.functions import Lower
 from django.conf import settings
 
+from .fuzzy import FuzzyNameIndex
 from .models import Location
 
 from shallwe_util.efficiency import time_measure
 
 
+# Fields returned for each searchable category
+SEARCH_FIELDS = {
+    Location.CategoryChoices.REGION: ('hierarchy', 'region_name'),
+    Location.CategoryChoices.CITY: ('hierarchy', 'ppl_name', 'region_name'),
+    Location.CategoryChoices.OTHER_PPL: ('hierarchy', 'ppl_name', 'region_name', 'subregion_name'),
+}
+
+
+# Result groups in the order of their relevance
+RESULT_GROUPS = ('regions', 'cities', 'other_ppls')
+
+
 class SearchResult:
-    def __init__(self, regions: QuerySet[dict], cities: QuerySet[dict], other_ppls: QuerySet[dict]):
+    def __init__(self, regions: QuerySet[dict] | list[dict], cities: QuerySet[dict] | list[dict],
+                 other_ppls: QuerySet[dict] | list[dict], search_term: str = '', distances: dict[str, int] = None):
         self.regions = regions
         self.cities = cities
         self.other_ppls = other_ppls
+        self.search_term = search_term.lower()
+        # Edit distances of fuzzy matches by hierarchy (exact prefix matches are 0)
+        self.distances = distances or {}
 
     def to_dict(self) -> dict:
         for city in self.cities:
@@ -25,33 +47,257 @@ class SearchResult:
     def is_empty(self) -> bool:
         return not any((self.regions, self.cities, self.other_ppls))
 
+    def to_ranked_list(self) -> list[tuple[str, dict]]:
+        """
+        Flattens the result into (group name, entry) pairs ordered by relevance:\n
+        closest fuzzy matches first (if any), then exact name matches, then regions, cities and other PPLs,
+        then shorter (closer to the term) names.
+        """
+        result_dict = self.to_dict()
+        ranked = [
+            (group_name, entry)
+            for group_name in RESULT_GROUPS
+            for entry in result_dict[group_name]
+        ]
+        ranked.sort(key=lambda group_entry: self._get_relevance_key(*group_entry))
+        return ranked
 
-def search(search_term: str) -> SearchResult:
-    search_term = search_term.lower()
+    def _get_relevance_key(self, group_name: str, entry: dict) -> tuple:
+        name = (entry.get('ppl_name') or entry['region_name']).lower()
+        return (
+            self.distances.get(entry['hierarchy'], 0),
+            name != self.search_term,
+            RESULT_GROUPS.index(group_name),
+            len(name),
+            name,
+            entry['hierarchy']
+        )
+
+
+def get_search_page(ranked_result: list[tuple[str, dict]], offset: int, limit: int) -> dict:
+    """
+    Slices a ranked result and groups the page back by category, e.g:
+    {
+        'regions': [...],
+        'cities': [...],
+        'other_ppls': [...],
+        'next_cursor': '20'  <- offset of the next page, None if this page is the last
+    }
+    """
+    page = {group_name: [] for group_name in RESULT_GROUPS}
+    for group_name, entry in ranked_result[offset:offset + limit]:
+        page[group_name].append(entry)
+
+    next_offset = offset + limit
+    page['next_cursor'] = str(next_offset) if next_offset < len(ranked_result) else None
+    return page
+
+
+class LocationPrefixIndex:
+    """
+    In-memory prefix index over Location.search_name, split by category.\n
+    Keeps lowercased search names sorted per category, so a prefix lookup is a bisect plus a scan over the matches.
+    Built with a single query over the Location table and kept once per process (see get_search_index).
+    """
+
+    def __init__(self, rows: list[dict], districts_by_city: dict[str, list[dict]]):
+        self._keys: dict[str, list[str]] = {category: [] for category in SEARCH_FIELDS}
+        self._values: dict[str, list[dict]] = {category: [] for category in SEARCH_FIELDS}
+        self._districts_by_city = districts_by_city
+
+        for row in sorted(rows, key=lambda row_: row_['search_name'].lower()):
+            category = row['category']
+            self._keys[category].append(row['search_name'].lower())
+            self._values[category].append({field: row[field] for field in SEARCH_FIELDS[category]})
+
+    @classmethod
+    def build(cls) -> 'LocationPrefixIndex':
+        return cls(get_searchable_rows(), get_districts_by_city())
+
+    def search(self, search_term: str, category: str) -> list[dict]:
+        """Returns copies of the category entries starting with the (lowercase) term, ordered by hierarchy"""
+        keys = self._keys[category]
+        values = self._values[category]
+
+        matches = []
+        position = bisect_left(keys, search_term)
+        while position < len(keys) and keys[position].startswith(search_term):
+            matches.append(dict(values[position]))
+            position += 1
+
+        matches.sort(key=itemgetter('hierarchy'))
+        return matches
+
+    def get_districts(self, city_hierarchy: str) -> list[dict]:
+        """Returns copies of the city districts, ordered by hierarchy"""
+        return [dict(district) for district in self._districts_by_city.get(city_hierarchy, ())]
+
+
+class LocationFuzzyIndex:
+    """
+    In-memory typo-tolerant and transliteration-aware index over Location.search_name (see fuzzy.py).\n
+    Built lazily on the first fuzzy search and kept once per process, like the prefix index.
+    """
+
+    def __init__(self, rows: list[dict]):
+        self._name_index = FuzzyNameIndex([
+            (row['search_name'], (row['category'], {field: row[field] for field in SEARCH_FIELDS[row['category']]}))
+            for row in rows
+        ])
+
+    @classmethod
+    def build(cls) -> 'LocationFuzzyIndex':
+        return cls(get_searchable_rows())
+
+    def search(self, search_term: str) -> tuple[dict[str, list[dict]], dict[str, int]]:
+        """Returns copies of the matched entries by category and their edit distances by hierarchy"""
+        entries_by_category = {category: [] for category in SEARCH_FIELDS}
+        distances = {}
+
+        for (category, entry), distance in self._name_index.search(search_term):
+            entries_by_category[category].append(dict(entry))
+            distances[entry['hierarchy']] = distance
+
+        for entries in entries_by_category.values():
+            entries.sort(key=itemgetter('hierarchy'))
+        return entries_by_category, distances
+
+
+def get_searchable_rows() -> list[dict]:
+    """Fetches all regions, cities and other PPLs with the fields needed for search in a single query"""
+    all_fields = {field for fields in SEARCH_FIELDS.values() for field in fields}
+    rows = Location.objects.filter(
+        category__in=SEARCH_FIELDS.keys()
+    ).values('category', 'search_name', *all_fields)
+    return list(rows)
+
+
+def get_districts_by_city(city_hierarchies: list[str] = None) -> dict[str, list[dict]]:
+    """
+    Fetches city districts with a single query and groups them by their city hierarchy.\n
+    Limited to the given cities if any, otherwise returns districts of all cities.
+    """
+    districts = Location.objects.filter(category=Location.CategoryChoices.CITY_DISTRICT)
+    if city_hierarchies is not None:
+        districts = districts.filter(city__hierarchy__in=city_hierarchies)
 
-    regions = Location.objects.filter(
-        search_name__istartswith=search_term,
-        category='r'
-    ).values('hierarchy', 'region_name')
+    districts_by_city = {}
+    for district in districts.values('hierarchy', 'district_name', 'city__hierarchy'):
+        city_hierarchy = district.pop('city__hierarchy')
+        districts_by_city.setdefault(city_hierarchy, []).append(district)
+    return districts_by_city
 
-    cities = Location.objects.filter(
-        search_name__istartswith=search_term,
-        category='c'
-    ).values('hierarchy', 'ppl_name', 'region_name')
 
-    other_ppls = Location.objects.filter(
-        search_name__istartswith=search_term,
-        category='p'
-    ).values('hierarchy', 'ppl_name', 'region_name', 'subregion_name')
+_search_index: LocationPrefixIndex | None = None
+_fuzzy_search_index: LocationFuzzyIndex | None = None
+_search_index_lock = threading.Lock()
+
+
+def get_search_index() -> LocationPrefixIndex:
+    """Returns the process-wide prefix index, building it on first use"""
+    global _search_index
+
+    if _search_index is None:
+        with _search_index_lock:
+            if _search_index is None:
+                _search_index = LocationPrefixIndex.build()
+    return _search_index
+
+
+def get_fuzzy_search_index() -> LocationFuzzyIndex:
+    """Returns the process-wide fuzzy index, building it on first use"""
+    global _fuzzy_search_index
+
+    if _fuzzy_search_index is None:
+        with _search_index_lock:
+            if _fuzzy_search_index is None:
+                _fuzzy_search_index = LocationFuzzyIndex.build()
+    return _fuzzy_search_index
+
+
+def invalidate_search_index() -> None:
+    """Drops the process-wide search indexes, so the next search rebuilds them from the database"""
+    global _search_index, _fuzzy_search_index
+
+    with _search_index_lock:
+        _search_index = None
+        _fuzzy_search_index = None
+
+
+def _search_in_memory(search_term: str) -> tuple[list[dict], list[dict], list[dict]]:
+    index = get_search_index()
+
+    regions = index.search(search_term, Location.CategoryChoices.REGION)
+    cities = index.search(search_term, Location.CategoryChoices.CITY)
+    other_ppls = index.search(search_term, Location.CategoryChoices.OTHER_PPL)
 
-    # Retrieving related districts for each city
     for city in cities:
-        city['districts'] = Location.objects.filter(
-            city__hierarchy=city['hierarchy'],
-            category='d'
-        ).values('hierarchy', 'district_name')
+        city['districts'] = index.get_districts(city['hierarchy'])
+
+    return regions, cities, other_ppls
+
+
+def get_search_queryset(search_term: str, category: str) -> QuerySet[dict]:
+    """Lowercase prefix match on the same expression as the category search index (see Location.Meta.indexes)"""
+    return Location.objects.alias(
+        search_name_lower=Lower('search_name')
+    ).filter(
+        search_name_lower__startswith=search_term,
+        category=category
+    ).values(*SEARCH_FIELDS[category])
+
+
+def _search_fuzzy(search_term: str) -> tuple[list[dict], list[dict], list[dict], dict[str, int]]:
+    entries_by_category, distances = get_fuzzy_search_index().search(search_term)
+    index = get_search_index()
+
+    cities = entries_by_category[Location.CategoryChoices.CITY]
+    for city in cities:
+        city['districts'] = index.get_districts(city['hierarchy'])
+
+    return (
+        entries_by_category[Location.CategoryChoices.REGION],
+        cities,
+        entries_by_category[Location.CategoryChoices.OTHER_PPL],
+        distances
+    )
+
+
+def _search_in_database(search_term: str) -> tuple[QuerySet[dict], list[dict], QuerySet[dict]]:
+    regions, cities, other_ppls = (
+        get_search_queryset(search_term, category)
+        for category in (
+            Location.CategoryChoices.REGION,
+            Location.CategoryChoices.CITY,
+            Location.CategoryChoices.OTHER_PPL
+        )
+    )
+
+    # Retrieving related districts for all matched cities at once
+    cities = list(cities)
+    districts_by_city = get_districts_by_city([city['hierarchy'] for city in cities])
+    for city in cities:
+        city['districts'] = districts_by_city.get(city['hierarchy'], [])
+
+    return regions, cities, other_ppls
+
+
+def search(search_term: str, fuzzy: bool = False) -> SearchResult:
+    """
+    Finds regions, cities (with districts) and other PPLs whose names start with the search term.\n
+    Fuzzy mode also matches typos and Latin/Russian spellings, always in memory.
+    """
+    search_term = search_term.lower()
+    distances = None
+
+    if fuzzy:
+        regions, cities, other_ppls, distances = _search_fuzzy(search_term)
+    elif settings.LOCATIONS_SEARCH_IN_MEMORY:
+        regions, cities, other_ppls = _search_in_memory(search_term)
+    else:
+        regions, cities, other_ppls = _search_in_database(search_term)
 
-    result = SearchResult(regions, cities, other_ppls)
+    result = SearchResult(regions, cities, other_ppls, search_term, distances)
     return result
 
 
@@ -0,0 +1,46 @@
+import threading
+from contextlib import contextmanager
+
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver, Signal
+
+from .cache import location_search_cache
+from .models import Location
+from .search import invalidate_search_index
+
+
+# Sent by the update_locations command once the Location table is rewritten (bulk operations send no model signals)
+locations_updated = Signal()
+
+_bulk_update_state = threading.local()
+
+
+@contextmanager
+def locations_bulk_update():
+    """Mutes the per-row handling of Location changes while the locations are rewritten in bulk
+    (the writer sends locations_updated once done)"""
+    _bulk_update_state.is_active = True
+    try:
+        yield
+    finally:
+        _bulk_update_state.is_active = False
+
+
+# Location
+@receiver([post_save, post_delete], sender=Location)
+def handle_location_change(sender, **kwargs):
+    # Single locations edited (e.g. in admin), bulk updates are handled once on locations_updated
+    if not getattr(_bulk_update_state, 'is_active', False):
+        invalidate_locations_data()
+
+
+@receiver(locations_updated)
+def handle_locations_update(sender, **kwargs):
+    invalidate_locations_data()
+
+
+def invalidate_locations_data():
+    # Drop the in-memory search index so it is rebuilt from the fresh data on the next search
+    invalidate_search_index()
+    # Mark cached search responses as stale for all the processes
+    location_search_cache.bump_data_version()
@@ -0,0 +1,106 @@
+from unittest.mock import patch
+
+from django.test import override_settings
+
+from shallwe_util.tests import AuthorizedAPITestCase
+from ..cache import location_search_cache, LocationSearchCache
+from ..models import LocationsVersion
+from ..search import search
+from ..signals import locations_updated
+
+
+SHARED_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'locations': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'locations-test'},
+}
+
+
+class LocationSearchCacheTestCase(AuthorizedAPITestCase):
+    fixtures = ['locations_fixture.json']
+
+    def setUp(self):
+        location_search_cache.bump_data_version()
+
+    def _get_response_shortcut(self, query: str = None):
+        return self._get_response('location-search', method='get', query_params={'query': query})
+
+    def test_repeated_search_served_from_cache(self):
+        with patch('shallwe_locations.views.search', wraps=search) as search_mock:
+            first_response = self._get_response_shortcut('Київ')
+            second_response = self._get_response_shortcut('КИЇВ')
+
+        self.assertEqual(search_mock.call_count, 1)
+        self.assertEqual(first_response.data, second_response.data)
+
+    def test_not_found_cached(self):
+        with patch('shallwe_locations.views.search', wraps=search) as search_mock:
+            self._get_response_shortcut('320fdsfsd')
+            response = self._get_response_shortcut('320fdsfsd')
+
+        self.assertEqual(search_mock.call_count, 1)
+        self.assertEqual(response.status_code, 404)
+
+    def test_fuzzy_cached_separately(self):
+        self._get_response_shortcut('Киів')
+        response = self._get_response('location-search', query_params={'query': 'Киів', 'fuzzy': 'true'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNotNone(location_search_cache.get('Киів'))
+        self.assertIsNotNone(location_search_cache.get('Киів', fuzzy=True))
+        self.assertNotEqual(location_search_cache.get('Киів'), location_search_cache.get('Киів', fuzzy=True))
+
+    def test_locations_updated_invalidates_cache(self):
+        location_search_cache.set('київ', [])
+        self.assertIsNotNone(location_search_cache.get('київ'))
+
+        locations_updated.send(sender=self.__class__)
+        self.assertIsNone(location_search_cache.get('київ'))
+
+    @override_settings(LOCATIONS_SEARCH_CACHE_SIZE=2)
+    def test_lru_eviction(self):
+        for search_term in ('київ', 'харків', 'львів'):
+            location_search_cache.set(search_term, [('regions', {'region_name': search_term})])
+        location_search_cache.get('харків')     # Mark as recently used
+        location_search_cache.set('одеса', [('regions', {'region_name': 'одеса'})])
+
+        self.assertIsNone(location_search_cache.get('київ'))
+        self.assertIsNone(location_search_cache.get('львів'))
+        self.assertIsNotNone(location_search_cache.get('харків'))
+        self.assertIsNotNone(location_search_cache.get('одеса'))
+
+    @override_settings(LOCATIONS_SEARCH_CACHE_SIZE=0)
+    def test_local_cache_disabled(self):
+        location_search_cache.set('київ', [('regions', {'region_name': 'київ'})])
+        self.assertIsNone(location_search_cache.get('київ'))
+
+    @override_settings(CACHES=SHARED_CACHES, LOCATIONS_SEARCH_CACHE_ALIAS='locations')
+    def test_shared_cache(self):
+        location_search_cache.set('київ', [('regions', {'region_name': 'київ'})])
+
+        # Another process would only see the shared entry
+        location_search_cache.clear()
+        self.assertEqual(location_search_cache.get('київ'), [('regions', {'region_name': 'київ'})])
+
+    @override_settings(LOCATIONS_SEARCH_VERSION_CHECK_INTERVAL=0)
+    def test_version_bump_from_other_process(self):
+        location_search_cache.set('київ', [('regions', {'region_name': 'київ'})])
+
+        # Another process (e.g. update_locations) has its own cache instance, only the database is shared
+        LocationSearchCache().bump_data_version()
+        self.assertIsNone(location_search_cache.get('київ'))
+
+    @override_settings(CACHES=SHARED_CACHES, LOCATIONS_SEARCH_CACHE_ALIAS='locations',
+                       LOCATIONS_SEARCH_VERSION_CHECK_INTERVAL=0)
+    def test_shared_entries_dropped_on_version_bump(self):
+        location_search_cache.set('київ', [('regions', {'region_name': 'київ'})])
+
+        LocationsVersion.bump()
+        location_search_cache.clear()
+        self.assertIsNone(location_search_cache.get('київ'))
+
+    @override_settings(LOCATIONS_SEARCH_VERSION_CHECK_INTERVAL=60)
+    def test_version_read_once_per_interval(self):
+        location_search_cache.set('київ', [('regions', {'region_name': 'київ'})])
+
+        with self.assertNumQueries(0):
+            self.assertIsNotNone(location_search_cache.get('київ'))
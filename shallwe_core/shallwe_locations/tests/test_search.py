@@ -0,0 +1,183 @@
+import time
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+
+from shallwe_util.tests import benchmark
+from ..models import Location
+from ..search import (
+    search, get_search_index, get_fuzzy_search_index, invalidate_search_index, get_search_queryset
+)
+from ..signals import locations_updated
+
+
+class LocationSearchInMemoryTestCase(TestCase):
+    fixtures = ['locations_fixture.json']
+
+    def setUp(self):
+        invalidate_search_index()
+
+    def _search_both_ways(self, search_term: str) -> tuple[dict, dict]:
+        with override_settings(LOCATIONS_SEARCH_IN_MEMORY=True):
+            in_memory_result = search(search_term).to_dict()
+        with override_settings(LOCATIONS_SEARCH_IN_MEMORY=False):
+            in_database_result = search(search_term).to_dict()
+        return in_memory_result, in_database_result
+
+    def test_in_memory_matches_database(self):
+        for search_term in ('Киї', 'ки', 'КИ', 'бород', 'Харків', 'х', 'ки320'):
+            in_memory_result, in_database_result = self._search_both_ways(search_term)
+            self.assertEqual(in_memory_result, in_database_result, f'Results differ for "{search_term}"')
+
+    def test_index_built_once(self):
+        get_search_index()
+
+        with self.assertNumQueries(0):
+            get_search_index().search('ки', Location.CategoryChoices.OTHER_PPL)
+
+    def test_index_results_are_copies(self):
+        result = search('Київ')
+        result.to_dict()
+
+        # Mutating a returned entry should not leak into the index
+        self.assertNotIn('districts', get_search_index().search('київ', Location.CategoryChoices.CITY)[0])
+
+    def test_index_rebuilt_after_locations_updated(self):
+        get_search_index()
+
+        # Bulk operations (like in update_locations) bypass model signals
+        Location.objects.filter(category='p', search_name__istartswith='бород').update(search_name='Тестове')
+        self.assertTrue(search('бород').other_ppls)
+
+        locations_updated.send(sender=self.__class__)
+        self.assertFalse(search('бород').other_ppls)
+        self.assertTrue(search('тестове').other_ppls)
+
+    def test_index_rebuilt_after_location_saved(self):
+        get_search_index()
+
+        location = Location.objects.get(category='c', search_name='Харків')
+        location.search_name = 'Тестове'
+        location.save()
+
+        self.assertFalse(search('харків').cities)
+        self.assertTrue(search('тестове').cities)
+
+
+class LocationFuzzySearchTestCase(TestCase):
+    fixtures = ['locations_fixture.json']
+
+    def setUp(self):
+        invalidate_search_index()
+
+    def _get_city_names(self, search_term: str) -> list[str]:
+        return [city['ppl_name'] for city in search(search_term, fuzzy=True).cities]
+
+    def test_transliterated_terms(self):
+        for search_term, city_name in (('Kyiv', 'Київ'), ('Kharkiv', 'Харків'), ('Lviv', 'Львів'), ('Odesa', 'Одеса')):
+            self.assertIn(city_name, self._get_city_names(search_term), f'"{city_name}" not found by "{search_term}"')
+
+    def test_russian_spelling_and_typos(self):
+        for search_term, city_name in (('Киев', 'Київ'), ('Харьков', 'Харків'), ('Харкв', 'Харків')):
+            self.assertIn(city_name, self._get_city_names(search_term), f'"{city_name}" not found by "{search_term}"')
+
+    def test_closest_matches_first(self):
+        group_name, entry = search('Київ', fuzzy=True).to_ranked_list()[0]
+        self.assertEqual((group_name, entry['ppl_name']), ('cities', 'Київ'))
+        self.assertTrue(entry['districts'])
+
+    def test_prefix_matches_included(self):
+        for search_term in ('ки', 'харків', 'бород'):
+            fuzzy_result = search(search_term, fuzzy=True).to_dict()
+            for group_name, entries in search(search_term).to_dict().items():
+                for entry in entries:
+                    self.assertIn(entry, fuzzy_result[group_name], f'Prefix match missing for "{search_term}"')
+
+    def test_fuzzy_search_no_queries(self):
+        get_search_index()
+        get_fuzzy_search_index()
+        with self.assertNumQueries(0):
+            search('Kharkov', fuzzy=True)
+
+
+class LocationSearchQueriesTestCase(TestCase):
+    fixtures = ['locations_fixture.json']
+
+    def setUp(self):
+        invalidate_search_index()
+
+    def test_database_search_query_count_constant(self):
+        # One query per category plus one for the districts of all matched cities
+        with override_settings(LOCATIONS_SEARCH_IN_MEMORY=False):
+            for search_term, cities_count in (('харків', 1), ('к', 5)):
+                with self.assertNumQueries(4):
+                    result = search(search_term).to_dict()
+                self.assertEqual(len(result['cities']), cities_count)
+                self.assertTrue(all(city['districts'] for city in result['cities']))
+
+    def test_in_memory_search_no_queries(self):
+        with override_settings(LOCATIONS_SEARCH_IN_MEMORY=True):
+            get_search_index()
+            for search_term in ('харків', 'к', 'ки'):
+                with self.assertNumQueries(0):
+                    result = search(search_term).to_dict()
+                self.assertTrue(all(city['districts'] for city in result['cities']))
+
+
+class LocationSearchIndexUsageTestCase(TestCase):
+    """Checks the database search path can be served by the category search index"""
+    fixtures = ['locations_fixture.json']
+
+    @classmethod
+    def setUpTestData(cls):
+        # Statistics of the fixture rows (held until the test class ends, so autovacuum doesn't replace them)
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {Location._meta.db_table}')
+
+    def setUp(self):
+        # The planner prefers sequential scans on a table this small, so only the usable plans are compared
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def test_prefix_search_uses_index(self):
+        for search_term in ('ки', 'київ', 'бород', 'х'):
+            for category in ('r', 'c', 'p'):
+                plan = get_search_queryset(search_term, category).explain()
+                self.assertIn('location_category_search_idx', plan, f'No index used for "{search_term}":\n{plan}')
+                self.assertNotIn('Seq Scan', plan)
+
+
+@benchmark
+class LocationFuzzySearchBenchmarkTestCase(TestCase):
+    """Checks fuzzy search latency on the full KATOTTG dataset"""
+
+    SEARCH_TERMS = (
+        'Kyiv', 'Киев', 'Kharkov', 'Харьков', 'Lviv', 'Odessa', 'Dnipro', 'Днепр', 'Zaporizhzhia', 'Запорожье',
+        'Kryvyi Rih', 'Mykolaiv', 'Николаев', 'Chernihiv', 'Ivano-Frankivsk', 'Бородянка', 'Бородянко', 'Vinnytsia',
+        'Ужгород', 'Uzhhorod', 'Полтва', 'Poltava', 'Кременчуг', 'Kremenchuk', 'Бiла Церква', 'Bila Tserkva', 'Ки',
+    )
+    MAX_P95_MS = 10
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('update_locations', fast=True, stdout=StringIO())
+
+    def setUp(self):
+        invalidate_search_index()
+
+    def test_fuzzy_search_p95(self):
+        get_search_index()
+        get_fuzzy_search_index()
+
+        timings = []
+        for _ in range(5):
+            for search_term in self.SEARCH_TERMS:
+                start = time.perf_counter()
+                search(search_term, fuzzy=True).to_ranked_list()
+                timings.append((time.perf_counter() - start) * 1000)
+
+        timings.sort()
+        p95 = timings[int(len(timings) * 0.95) - 1]
+        self.assertLess(p95, self.MAX_P95_MS, f'Fuzzy search p95 is {p95:.2f} ms')
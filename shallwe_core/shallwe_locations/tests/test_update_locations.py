@@ -0,0 +1,173 @@
+import os
+import tempfile
+from io import StringIO
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+
+from shallwe_profile.models import UserProfile, UserProfileRentPreferences
+from ..management.commands.update_locations import LocationDataRegistry, read_katottg_rows, parse_katottg_entries
+from ..models import Location, LocationsVersion
+
+
+class UpdateLocationsTestCase(TestCase):
+    """Imports a part of the KATOTTG source (Crimea, Kyiv region and both capitals) in small batches"""
+
+    REGION_CODES = ('UA01', 'UA32', 'UA80', 'UA85')
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        with open(settings.DEFAULT_KATOTTG_CSV_PATH, 'r', encoding='utf-8') as file:
+            cls.csv_lines = file.readlines()
+        cls.csv_lines = cls.csv_lines[:1] + [line for line in cls.csv_lines[1:] if line.startswith(cls.REGION_CODES)]
+
+    def _write_csv(self, lines: list[str]) -> str:
+        file = tempfile.NamedTemporaryFile('w', encoding='utf-8', suffix='.csv', delete=False)
+        with file:
+            file.writelines(lines)
+        self.addCleanup(os.remove, file.name)
+        return file.name
+
+    def _update_locations(self, lines: list[str], *args) -> str:
+        stdout = StringIO()
+        with override_settings(LOCATIONS_UPDATE_BATCH_SIZE=100):
+            call_command('update_locations', self._write_csv(lines), *args, stdout=stdout, stderr=StringIO())
+        return stdout.getvalue()
+
+    def test_import(self):
+        self._update_locations(self.csv_lines)
+
+        self.assertEqual(Location.objects.filter(category='r').count(), 2)
+        self.assertTrue(Location.objects.filter(category='r', search_name='АР Крим').exists())
+
+        kyiv = Location.objects.get(category='c', search_name='Київ')
+        self.assertEqual((kyiv.region_name, kyiv.subregion_name, kyiv.ppl_name), ('Київська', 'Київ', 'Київ'))
+        self.assertEqual(kyiv.districts.count(), 10)
+        self.assertFalse(kyiv.districts.exclude(region_name='Київська').exists())
+
+        sevastopol = Location.objects.get(category='c', search_name='Севастополь')
+        self.assertEqual(sevastopol.region_name, 'АР Крим')
+
+        # Populated places with districts become cities
+        simferopol = Location.objects.get(search_name='Сімферополь')
+        self.assertEqual(simferopol.category, 'c')
+        self.assertEqual(simferopol.districts.count(), 3)
+
+    def test_reimport_deletes_unlisted(self):
+        self._update_locations(self.csv_lines)
+        self._update_locations([line for line in self.csv_lines if not line.startswith('UA85')])
+
+        self.assertFalse(Location.objects.filter(search_name='Севастополь').exists())
+        self.assertTrue(Location.objects.filter(search_name='Київ').exists())
+
+    def test_version_bumped_once_per_import(self):
+        self._update_locations(self.csv_lines)
+        lines = [line for line in self.csv_lines if not line.startswith('UA85')]
+
+        for args in ((), ('--fast',)):
+            Location.objects.bulk_create([Location(autocode='99999', hierarchy='UA99', category='r',
+                                                   region_name='Тестова', search_name='Тестова')])
+            with patch.object(LocationsVersion, 'bump', wraps=LocationsVersion.bump) as bump_mock:
+                self._update_locations(lines, *args)
+            self.assertEqual(bump_mock.call_count, 1, args)
+
+        # Single locations edited outside of imports still invalidate the cached data
+        with patch.object(LocationsVersion, 'bump', wraps=LocationsVersion.bump) as bump_mock:
+            Location.objects.get(search_name='Київ', category='c').save()
+        self.assertEqual(bump_mock.call_count, 1)
+
+    def test_reimport_writes_only_changes(self):
+        self._update_locations(self.csv_lines)
+        Location.objects.filter(search_name='Київ', category='c').update(ppl_name='Змінено')
+        Location.objects.filter(search_name='Севастополь').delete()
+
+        output = self._update_locations(self.csv_lines)
+        self.assertIn('Locations to insert: 1\n', output)
+        self.assertIn('Locations to update: 1 (ppl_name: 1)\n', output)
+        self.assertIn('Locations to delete: 0\n', output)
+        self.assertEqual(Location.objects.get(search_name='Київ', category='c').ppl_name, 'Київ')
+
+        # Nothing left to change, so only the current locations are read
+        with self.assertNumQueries(1):
+            output = self._update_locations(self.csv_lines)
+        self.assertIn('Locations to insert: 0\nLocations to update: 0\nLocations to delete: 0\n', output)
+
+    def test_dry_run(self):
+        self._update_locations(self.csv_lines)
+        Location.objects.filter(search_name='Київ', category='c').update(ppl_name='Змінено')
+
+        output = self._update_locations(self.csv_lines[:-5], '--dry-run')
+        self.assertIn('Locations to update: 1 (ppl_name: 1)\n', output)
+        self.assertIn('Locations to delete: 5\n', output)
+        self.assertEqual(Location.objects.get(search_name='Київ', category='c').ppl_name, 'Змінено')
+        self.assertEqual(Location.objects.filter(search_name='Севастополь').count(), 1)
+
+    def test_fast_load(self):
+        self._update_locations(self.csv_lines)
+        expected_locations = list(Location.objects.values())
+        Location.objects.filter(search_name='Київ', category='c').update(ppl_name='Змінено')
+        Location.objects.filter(search_name='Севастополь').delete()
+
+        output = self._update_locations(self.csv_lines, '--fast')
+        self.assertIn('Locations inserted or updated: 2\nLocations deleted: 0\n', output)
+        self.assertEqual(list(Location.objects.values()), expected_locations)
+
+        output = self._update_locations([line for line in self.csv_lines if not line.startswith('UA85')], '--fast')
+        self.assertIn('Locations inserted or updated: 0\nLocations deleted: 5\n', output)
+
+    def test_fast_load_deletes_preferred_location(self):
+        self._update_locations(self.csv_lines, '--fast')
+        user = User.objects.create_user(username='testuser', password='testpassword')
+        profile = UserProfile.objects.create(user=user, name='ТестЮзер')
+        rent_preferences = UserProfileRentPreferences.objects.create(user_profile=profile,
+                                                                     min_budget=1000, max_budget=2000)
+        rent_preferences.set_locations(Location.objects.filter(search_name__in=['Севастополь', 'Київ']))
+
+        output = self._update_locations([line for line in self.csv_lines if not line.startswith('UA85')], '--fast')
+        self.assertIn('Locations deleted: 5\n', output)
+        connection.check_constraints()  # Deferred foreign keys are checked at commit otherwise
+
+        self.assertQuerySetEqual(rent_preferences.locations.values_list('search_name', flat=True), ['Київ'])
+        self.assertFalse(rent_preferences.location_prefixes.filter(prefix__startswith='UA01').exists())
+
+    def test_fast_load_into_empty_table(self):
+        self._update_locations(self.csv_lines, '--fast')
+        fast_locations = list(Location.objects.values())
+
+        Location.objects.all().delete()
+        self._update_locations(self.csv_lines)
+        self.assertEqual(list(Location.objects.values()), fast_locations)
+
+    def test_district_not_after_its_city(self):
+        district_line = next(line for line in self.csv_lines if ',B,' in line)
+        lines = [line for line in self.csv_lines if line != district_line]
+        lines.insert(1 + lines[1:].index(next(line for line in lines[1:] if ',H,' in line)), district_line)
+
+        with self.assertRaises(ValueError):
+            self._update_locations(lines)
+        self.assertFalse(Location.objects.exists())
+
+    def test_registry_keeps_only_regions(self):
+        registry = LocationDataRegistry()
+        for _ in parse_katottg_entries(read_katottg_rows(self._write_csv(self.csv_lines)), registry):
+            pass
+
+        self.assertEqual(list(registry.locations), ['r'])
+        self.assertEqual(len(registry.locations['r']), 2)
+
+    def test_registry_search_by_name(self):
+        registry = LocationDataRegistry()
+        for _ in parse_katottg_entries(read_katottg_rows(self._write_csv(self.csv_lines)), registry):
+            pass
+
+        [crimea] = registry.search_by_name('Автономна Республіка Крим', 'r')
+        registry.rename(crimea, 'АР Крим')
+
+        self.assertEqual(registry.search_by_name('АР Крим', 'r'), [crimea])
+        self.assertEqual(registry.search_by_name('Автономна Республіка Крим', 'r'), [])
+        self.assertEqual(registry.search_by_name('Київська', 'r')[0].main_entry.name, 'Київська')
@@ -0,0 +1,117 @@
+from django.conf import settings
+from rest_framework import status
+
+from shallwe_util.tests import AuthorizedAPITestCase
+
+
+class LocationSearchViewTestCase(AuthorizedAPITestCase):
+    fixtures = ['locations_fixture.json']
+
+    def _get_response_shortcut(self, query: str = None):
+        url = 'location-search'
+        response = self._get_response(url, method='get', query_params={'query': query})
+        return response
+
+    def test_location_search_kyi(self):
+        response = self._get_response_shortcut('Киї')
+        print(f'>>>>>>>>>>>\n{response.data}\n>>>>>>>>>>>>')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.assertTrue('regions' in response.data)
+        self.assertTrue('cities' in response.data)
+        self.assertTrue('other_ppls' in response.data)
+
+        self.assertEqual(len(response.data['regions']), 1)
+        self.assertEqual(len(response.data['cities']), 1)
+
+        self.assertEqual(response.data['cities'][0]['ppl_name'], 'Київ')
+        self.assertEqual(len(response.data['cities'][0]['districts']), 10)
+
+    def test_location_search_ppls_only(self):
+        response = self._get_response_shortcut('Бород')
+        print(f'>>>>>>>>>>>\n{response.data}\n>>>>>>>>>>>>')
+
+        self.assertTrue(not response.data['regions'])
+        self.assertTrue(not response.data['cities'])
+        self.assertTrue(response.data['other_ppls'])
+
+    def test_location_search_forbidden_cases(self):
+        response1 = self._get_response_shortcut('')
+        response2 = self._get_response_shortcut('К')
+        response3 = self._get_response_shortcut('К' * 33)
+
+        self.assertEqual(response1.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response2.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response3.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_location_search_not_found(self):
+        response = self._get_response_shortcut('320fdsfsd')
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_location_search_exact_match_first(self):
+        response = self._get_response_shortcut('Київ')
+
+        # The city itself goes before the region that merely starts with its name
+        self.assertEqual(response.data['cities'][0]['ppl_name'], 'Київ')
+        self.assertIsNone(response.data['next_cursor'])
+
+    def test_location_search_fuzzy(self):
+        response = self._get_response('location-search', query_params={'query': 'Kyiv', 'fuzzy': 'true'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['cities'][0]['ppl_name'], 'Київ')
+
+        # Latin terms match nothing without fuzzy mode
+        response = self._get_response('location-search', query_params={'query': 'Kyiv', 'fuzzy': 'false'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        response = self._get_response('location-search', query_params={'query': 'Kyiv', 'fuzzy': 'yes'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_location_search_limit_and_cursor(self):
+        full_response = self._get_response('location-search', query_params={'query': 'Ки', 'limit': 100})
+        full_ranked = [
+            entry['hierarchy']
+            for group_name in ('regions', 'cities', 'other_ppls')
+            for entry in full_response.data[group_name]
+        ]
+
+        paged_ranked = []
+        cursor = 0
+        while cursor is not None:
+            query_params = {'query': 'Ки', 'limit': 50, 'cursor': cursor}
+            response = self._get_response('location-search', query_params=query_params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            page = [
+                entry['hierarchy']
+                for group_name in ('regions', 'cities', 'other_ppls')
+                for entry in response.data[group_name]
+            ]
+            self.assertLessEqual(len(page), 50)
+            paged_ranked += page
+            cursor = response.data['next_cursor']
+
+        # No repeats between pages, and the first two pages hold the same entries as one page of 100
+        self.assertGreater(len(paged_ranked), 100)
+        self.assertEqual(len(paged_ranked), len(set(paged_ranked)))
+        self.assertEqual(set(paged_ranked[:100]), set(full_ranked))
+
+    def test_location_search_default_limit(self):
+        response = self._get_response_shortcut('Ки')
+        results_count = sum(len(response.data[group_name]) for group_name in ('regions', 'cities', 'other_ppls'))
+
+        self.assertEqual(results_count, settings.LOCATIONS_SEARCH_DEFAULT_LIMIT)
+        self.assertIsNotNone(response.data['next_cursor'])
+
+    def test_location_search_invalid_pagination(self):
+        for query_params in (
+            {'query': 'Ки', 'limit': 0},
+            {'query': 'Ки', 'limit': settings.LOCATIONS_SEARCH_MAX_LIMIT + 1},
+            {'query': 'Ки', 'limit': 'abc'},
+            {'query': 'Ки', 'cursor': -1},
+            {'query': 'Ки', 'cursor': 'abc'},
+        ):
+            response = self._get_response('location-search', query_params=query_params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -1,8 +1,10 @@
+from django.conf import settings
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.views import APIView
 from rest_framework.response import Response
 
-from .search import search
+from .cache import location_search_cache
+from .search import search, get_search_page
 
 
 class LocationSearchView(APIView):
@@ -23,10 +25,36 @@ class LocationSearchView(APIView):
         elif len(search_term) < 2 or len(search_term) > 32:
             return Response({'error': 'Search term length should be between 2 and 32 characters'}, status=400)
 
-        result = search(search_term)
+        # Check if pagination parameters are valid
+        max_limit = settings.LOCATIONS_SEARCH_MAX_LIMIT
+        limit = self._parse_non_negative_int(request.GET.get('limit', settings.LOCATIONS_SEARCH_DEFAULT_LIMIT))
+        if limit is None or not 1 <= limit <= max_limit:
+            return Response({'error': f'Limit should be an integer between 1 and {max_limit}'}, status=400)
+
+        cursor = self._parse_non_negative_int(request.GET.get('cursor', 0))
+        if cursor is None:
+            return Response({'error': 'Invalid cursor'}, status=400)
+
+        # Check if search mode is valid
+        fuzzy = request.GET.get('fuzzy', 'false').lower()
+        if fuzzy not in ('true', 'false'):
+            return Response({'error': 'Fuzzy should be either true or false'}, status=400)
+        fuzzy = fuzzy == 'true'
+
+        ranked_result = location_search_cache.get(search_term, fuzzy)
+        if ranked_result is None:
+            ranked_result = search(search_term, fuzzy).to_ranked_list()
+            location_search_cache.set(search_term, ranked_result, fuzzy)
 
         # Check if anything matched
-        if result.is_empty():
+        if not ranked_result:
             return Response({'error': 'No matching locations found'}, status=404)
         else:
-            return Response(result.to_dict())
+            return Response(get_search_page(ranked_result, cursor, limit))
+
+    def _parse_non_negative_int(self, value: str | int) -> int | None:
+        try:
+            value = int(value)
+        except ValueError:
+            return None
+        return value if value >= 0 else None
@@ -1,4 +1,5 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class ShallwePhotoConfig(AppConfig):
@@ -8,3 +9,8 @@ class ShallwePhotoConfig(AppConfig):
     def ready(self):
         from pi_heif import register_heif_opener
         register_heif_opener()    # for working with HEIF, HEIC
+
+        # Decompression bomb limit: no image over the max allowed pixels count is decoded (see formatcheck.open_image)
+        from PIL import Image
+        max_dimensions = settings.ALLOWED_PHOTO_MAX_DIMENSIONS
+        Image.MAX_IMAGE_PIXELS = max_dimensions[0] * max_dimensions[1]
@@ -0,0 +1,91 @@
+"""
+Verdict cache for face checks.
+
+The same photo is often checked several times in a row (first by the facecheck endpoint, then on profile
+create/update, then again on retries), while every check runs the whole detector cascade.
+Verdicts are cached by a hash of the normalized pixels (the minified RGB image that actually gets checked),
+so the same photo re-encoded or with different metadata is still recognized. The detector settings are
+part of the hash, so changing them never serves verdicts of the previous detectors.
+
+Entries are kept in a bounded per-process LRU and expire after FACE_VERDICT_CACHE_TTL seconds.
+If FACE_VERDICT_CACHE_ALIAS names a Django cache (CACHES), verdicts are also shared through it between processes.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from PIL import Image
+from django.conf import settings
+from django.core.cache import caches, BaseCache
+
+
+class FaceVerdictCache:
+    ENTRY_KEY_PREFIX = 'shallwe_photo:facecheck:verdict'
+
+    def __init__(self):
+        self._entries: OrderedDict[str, tuple[bool, float]] = OrderedDict()  # hash: (verdict, expiry time)
+        self._lock = threading.Lock()
+
+    @property
+    def _max_size(self) -> int:
+        return settings.FACE_VERDICT_CACHE_SIZE
+
+    @property
+    def _ttl(self) -> int:
+        return settings.FACE_VERDICT_CACHE_TTL
+
+    @property
+    def _shared_cache(self) -> BaseCache | None:
+        alias = settings.FACE_VERDICT_CACHE_ALIAS
+        return caches[alias] if alias else None
+
+    @staticmethod
+    def get_image_hash(image: Image.Image) -> str:
+        image_hash = hashlib.sha256(repr(settings.FACE_DETECTOR_CASCADE).encode('utf-8'))
+        image_hash.update(f'{image.mode}:{image.size}'.encode('utf-8'))
+        image_hash.update(image.tobytes())
+        return image_hash.hexdigest()
+
+    def get(self, image_hash: str) -> bool | None:
+        with self._lock:
+            if (entry := self._entries.get(image_hash)) is not None:
+                is_face_detected, expires_at = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(image_hash)
+                    return is_face_detected
+                del self._entries[image_hash]
+
+        if shared_cache := self._shared_cache:
+            if (is_face_detected := shared_cache.get(self._get_entry_key(image_hash))) is not None:
+                self._set_local(image_hash, is_face_detected)
+                return is_face_detected
+
+        return None
+
+    def set(self, image_hash: str, is_face_detected: bool) -> None:
+        self._set_local(image_hash, is_face_detected)
+
+        if shared_cache := self._shared_cache:
+            shared_cache.set(self._get_entry_key(image_hash), is_face_detected, timeout=self._ttl)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def _set_local(self, image_hash: str, is_face_detected: bool) -> None:
+        if self._max_size <= 0:
+            return
+
+        with self._lock:
+            self._entries[image_hash] = (is_face_detected, time.monotonic() + self._ttl)
+            self._entries.move_to_end(image_hash)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+    def _get_entry_key(self, image_hash: str) -> str:
+        return f'{self.ENTRY_KEY_PREFIX}:{image_hash}'
+
+
+face_verdict_cache = FaceVerdictCache()
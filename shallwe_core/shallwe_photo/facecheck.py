@@ -1,42 +1,241 @@
+import io
+import logging
 import os
-import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from contextlib import redirect_stdout
+from typing import BinaryIO
 
+import cv2
+import numpy as np
 from PIL import Image
-from deepface import DeepFace
+from deepface.commons import functions
+from deepface.detectors import FaceDetector
 from django.conf import settings
 
 from shallwe_util.efficiency import time_measure
+from .cache import face_verdict_cache
 
 
-def check_face(image_path):
-    backends = ['ssd', 'mtcnn', 'retinaface']
+logger = logging.getLogger(__name__)
 
-    results = []
-    for backend in backends:
+
+class FaceDetectorRegistry:
+    """
+    Keeps face detector models built and warmed up once per process,
+    so model loading and TensorFlow graph warm-up never land on user requests.\n
+    Detectors are warmed up at worker start (see wsgi.py) if FACE_DETECTORS_PRELOAD is on, otherwise on first use.
+    """
+
+    # Blank input to run each model once while warming up
+    _WARM_UP_IMAGE_SHAPE = (200, 200, 3)
+
+    def __init__(self):
+        self._detectors: dict[str, object] = {}
+        self._run_locks: dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def backends(self) -> list[str]:
+        return [backend for backend, _ in settings.FACE_DETECTOR_CASCADE]
+
+    def is_ready(self) -> bool:
+        """Whether all the configured detectors are built and warmed up"""
+        return all(backend in self._detectors for backend in self.backends)
+
+    def get(self, backend: str) -> object:
+        if (detector := self._detectors.get(backend)) is None:
+            with self._lock:
+                if (detector := self._detectors.get(backend)) is None:
+                    detector = self._build(backend)
+                    self._detectors[backend] = detector
+        return detector
+
+    def get_run_lock(self, backend: str) -> threading.Lock:
+        """Lock to hold while running the detector, since the models are not safe to run from several threads"""
+        with self._lock:
+            return self._run_locks.setdefault(backend, threading.Lock())
+
+    def warm_up(self) -> None:
+        for backend in self.backends:
+            self.get(backend)
+
+    def warm_up_in_background(self) -> threading.Thread:
+        thread = threading.Thread(target=self._warm_up_logged, name='face-detectors-warm-up', daemon=True)
+        thread.start()
+        return thread
+
+    def _warm_up_logged(self) -> None:
+        try:
+            self.warm_up()
+        except Exception:
+            logger.exception('Face detectors warm-up failed, they will be built on first use')
+        else:
+            logger.info('Face detectors are warmed up: %s', ', '.join(self.backends))
+
+    def _build(self, backend: str) -> object:
         with open(os.devnull, 'w') as null_file:
             with redirect_stdout(null_file):    # redirecting stdout to null to prevent progress bars in console
-                results.append(DeepFace.extract_faces(
-                    image_path,
-                    detector_backend=backend,
-                    enforce_detection=False
-                ))
-    is_face_detected = all(result[0]["confidence"] > 0.95 for result in results)
-    return is_face_detected
+                detector = FaceDetector.build_model(backend)
+                FaceDetector.detect_faces(detector, backend, np.zeros(self._WARM_UP_IMAGE_SHAPE, dtype=np.uint8))
+        return detector
+
+
+face_detector_registry = FaceDetectorRegistry()
+
+
+def get_face_confidence(image: np.ndarray, backend: str) -> float:
+    """Confidence of the first face found by the detector (0 if none), image is a BGR array"""
+    detector = face_detector_registry.get(backend)
+    with face_detector_registry.get_run_lock(backend), open(os.devnull, 'w') as null_file:
+        with redirect_stdout(null_file):
+            faces = FaceDetector.detect_faces(detector, backend, image)
+    # Each face is (face image, [x, y, w, h], confidence), some detectors also report empty regions
+    faces = [face for face in faces if face[1][2] > 0 and face[1][3] > 0]
+    return faces[0][2] if faces else 0
+
+
+class FaceCheckResult:
+    """Verdict of the detector cascade with the time spent on each stage that ran"""
+
+    def __init__(self):
+        self.is_face_detected = True
+        self.stage_timings: list[tuple[str, float]] = []  # (backend, seconds)
+
+    def __str__(self):
+        stages = ', '.join(f'{backend}: {seconds * 1000:.0f} ms' for backend, seconds in self.stage_timings)
+        return f'{"Face" if self.is_face_detected else "No face"} ({stages})'
+
+
+def run_face_cascade(image: np.ndarray) -> FaceCheckResult:
+    """
+    Runs the detectors of FACE_DETECTOR_CASCADE in order, each has to find a face with at least its min confidence.\n
+    Stops at the first detector that doesn't, so non-face images only cost the cheapest detector.
+    """
+    result = FaceCheckResult()
+
+    for backend, min_confidence in settings.FACE_DETECTOR_CASCADE:
+        start_time = time.perf_counter()
+        confidence = get_face_confidence(image, backend)
+        result.stage_timings.append((backend, time.perf_counter() - start_time))
+
+        if confidence <= min_confidence:
+            result.is_face_detected = False
+            break
+
+    logger.info('Face check: %s', result)
+    return result
+
+
+_detection_pool: ThreadPoolExecutor | None = None
+_detection_pool_lock = threading.Lock()
+
+
+def get_detection_pool() -> ThreadPoolExecutor:
+    """Process-wide pool shared by all requests, so a burst of uploads can't run more than its size of detectors"""
+    global _detection_pool
+
+    if _detection_pool is None:
+        with _detection_pool_lock:
+            if _detection_pool is None:
+                _detection_pool = ThreadPoolExecutor(
+                    max_workers=settings.FACE_DETECTORS_POOL_SIZE,
+                    thread_name_prefix='face-detection'
+                )
+    return _detection_pool
+
+
+def _get_timed_face_confidence(image: np.ndarray, backend: str) -> tuple[float, float]:
+    start_time = time.perf_counter()
+    confidence = get_face_confidence(image, backend)
+    return confidence, time.perf_counter() - start_time
+
+
+def run_face_detectors_parallel(image: np.ndarray) -> FaceCheckResult:
+    """
+    Runs all the detectors of FACE_DETECTOR_CASCADE at once in the detection pool and joins their verdicts.\n
+    Takes as long as the slowest detector; detectors not started yet are cancelled once one fails.
+    """
+    result = FaceCheckResult()
+    futures = {
+        get_detection_pool().submit(_get_timed_face_confidence, image, backend): (backend, min_confidence)
+        for backend, min_confidence in settings.FACE_DETECTOR_CASCADE
+    }
+
+    for future in as_completed(futures):
+        backend, min_confidence = futures[future]
+        confidence, seconds = future.result()
+        result.stage_timings.append((backend, seconds))
+
+        if confidence <= min_confidence:
+            result.is_face_detected = False
+            for pending_future in futures:
+                pending_future.cancel()
+            break
+
+    logger.info('Face check (parallel): %s', result)
+    return result
+
+
+def load_image_array(image: str | np.ndarray | bytes | BinaryIO | Image.Image) -> np.ndarray:
+    """
+    Loads an image as a BGR array (as the detectors expect) from a path, encoded bytes, a buffer or a PIL image.\n
+    Arrays are returned as is, so they should be BGR already.
+    """
+    if isinstance(image, np.ndarray):
+        return image
+    if isinstance(image, str):
+        return functions.load_image(image)[0]
+
+    if isinstance(image, (bytes, bytearray)):
+        image = io.BytesIO(image)
+    if not isinstance(image, Image.Image):
+        image = Image.open(image)
+    return cv2.cvtColor(np.asarray(image.convert('RGB')), cv2.COLOR_RGB2BGR)
+
+
+def check_face(image: str | np.ndarray | bytes | BinaryIO | Image.Image):
+    image = load_image_array(image)
+
+    if settings.FACE_DETECTORS_PARALLEL:
+        return run_face_detectors_parallel(image).is_face_detected
+    return run_face_cascade(image).is_face_detected
+
+
+def load_minified_image(image: Image.Image, size: tuple[int, int] = (200, 200)) -> Image.Image:
+    """
+    Downscales a not yet loaded image without resampling it at full resolution:
+    JPEG is decoded right at a reduced scale (draft mode, by up to 8 times),
+    other formats (PNG, HEIF - libheif has no reduced decoding) are box-reduced by an integer factor after decoding,
+    so only the final resize runs the resampling filter, on an image barely larger than the target.\n
+    Images in other modes (palette, bilevel, 16-bit grayscale, etc.) are converted to RGB (RGBA if transparent) first,
+    as reduce() doesn't support some of them and resize() only samples the nearest pixels of others.
+    """
+    image.draft(None, size)  # No-op for formats other than JPEG, or if already loaded
+    if image.mode not in ('L', 'RGB', 'RGBA'):
+        image = image.convert('RGBA' if image.has_transparency_data else 'RGB')
+    reduce_factor = min(image.size[0] // size[0], image.size[1] // size[1])
+    if reduce_factor > 1:
+        image = image.reduce(reduce_factor)
+    return image.resize(size)
 
 
-def check_face_minified_temp(image: Image.Image):
-    minified_image = image.resize((200, 200))
+def check_face_minified(image: Image.Image):
+    minified_image = load_minified_image(image)
     # Get rid of alpha channel
     if minified_image.mode == 'RGBA':
         rgb_image = Image.new('RGB', minified_image.size, (255, 255, 255))
         # Paste the original image onto the new image, using the alpha channel as a mask
         rgb_image.paste(minified_image, mask=minified_image.split()[3])
         minified_image = rgb_image
-    # Check in temp jpg file
-    with tempfile.NamedTemporaryFile(delete=True, suffix='.jpg') as temp_file:
-        minified_image.save(temp_file, format='JPEG')
-        is_face_detected = check_face(temp_file.name)
+    # The same photo is often checked again (facecheck endpoint, then profile upload, then retries)
+    image_hash = face_verdict_cache.get_image_hash(minified_image)
+    if (is_face_detected := face_verdict_cache.get(image_hash)) is not None:
+        return is_face_detected
+    # Check the pixels right away, without encoding to a file and decoding back
+    is_face_detected = check_face(minified_image)
+    face_verdict_cache.set(image_hash, is_face_detected)
     return is_face_detected
 
 
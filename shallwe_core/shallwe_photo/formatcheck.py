@@ -1,4 +1,7 @@
-from PIL import Image
+import struct
+from typing import BinaryIO, NamedTuple
+
+from PIL import Image, UnidentifiedImageError
 from django.conf import settings
 from django.core.files.uploadedfile import InMemoryUploadedFile
 
@@ -50,7 +53,153 @@ def validate_image_format(uploaded_image: InMemoryUploadedFile):
         )
 
 
-def validate_image_dimensions(image: Image.Image):
+class ImageHeader(NamedTuple):
+    """Real format of an uploaded image (as named in ALLOWED_PHOTO_FORMATS) and its size, if found in the header"""
+    format: str
+    size: tuple[int, int] | None
+
+
+# Formats of the same file content, as named in ALLOWED_PHOTO_FORMATS and content types
+_FORMAT_ALIASES = {'jpg': 'jpeg', 'heic': 'heif'}
+
+# Names of the formats in Pillow, to open the image without trying every other format
+_PILLOW_FORMATS = {'jpeg': 'JPEG', 'png': 'PNG', 'heif': 'HEIF'}
+
+_HEIF_BRANDS = {b'heic', b'heix', b'heim', b'heis', b'hevc', b'hevx', b'hevm', b'hevs', b'mif1', b'msf1'}
+
+# JPEG start of frame markers (which hold the size), all from 0xC0 to 0xCF except DHT, JPG and DAC
+_JPEG_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+_JPEG_SOS_MARKER = 0xDA
+_JPEG_STANDALONE_MARKERS = set(range(0xD0, 0xD8)) | {0x01}
+
+# HEIF metadata is usually a few KB, a bigger one is left to Pillow
+_HEIF_META_MAX_SIZE = 1024 * 1024
+
+
+def read_image_header(uploaded_image: InMemoryUploadedFile) -> ImageHeader:
+    """
+    Detects the real format and size of an image, reading only the few header bytes holding them
+    (the rest of the file, like EXIF or pixel data, is skipped over), so nothing gets decoded.\n
+    The size is None if it's not found in the header (then Pillow finds it when opening the image).
+    """
+    uploaded_image.seek(0)
+    try:
+        magic = uploaded_image.read(12)
+        if magic.startswith(b'\xff\xd8\xff'):
+            return ImageHeader('jpeg', _read_jpeg_size(uploaded_image))
+        if magic.startswith(b'\x89PNG\r\n\x1a\n'):
+            return ImageHeader('png', _read_png_size(uploaded_image))
+        if magic[4:8] == b'ftyp' and magic[8:12] in _HEIF_BRANDS:
+            return ImageHeader('heif', _read_heif_size(uploaded_image))
+    except (struct.error, IndexError):  # Header cut short
+        raise NotAnImageError("Not an image: the file is corrupted")
+    finally:
+        uploaded_image.seek(0)
+
+    raise NotAnImageError("Not an image: unknown file content")
+
+
+def _read_jpeg_size(file: BinaryIO) -> tuple[int, int] | None:
+    file.seek(2)
+    while True:
+        if file.read(1) != b'\xff':  # Every segment starts with a marker, unless the file is cut or corrupted
+            raise NotAnImageError("Not an image: the file is corrupted")
+        marker = file.read(1)[0]
+        if marker == 0xFF:  # Fill byte
+            file.seek(-1, 1)
+            continue
+        if marker in _JPEG_STANDALONE_MARKERS:
+            continue
+        if marker == _JPEG_SOS_MARKER:  # Pixel data starts, no frame found
+            return None
+
+        segment_length, = struct.unpack('>H', file.read(2))
+        if marker in _JPEG_SOF_MARKERS:
+            height, width = struct.unpack('>xHH', file.read(5))
+            return width, height
+        file.seek(segment_length - 2, 1)
+
+
+def _read_png_size(file: BinaryIO) -> tuple[int, int] | None:
+    file.seek(8)
+    _, chunk_type, width, height = struct.unpack('>I4sII', file.read(16))
+    return (width, height) if chunk_type == b'IHDR' else None
+
+
+def _read_heif_size(file: BinaryIO) -> tuple[int, int] | None:
+    """Takes the largest image spatial extents (ispe) property, which belongs to the primary image"""
+    file.seek(0)
+    while header := file.read(8):
+        box_size, box_type = struct.unpack('>I4s', header)
+        header_size = 8
+        if box_size == 1:
+            box_size, = struct.unpack('>Q', file.read(8))
+            header_size = 16
+
+        if box_type == b'meta':
+            if not header_size < box_size <= _HEIF_META_MAX_SIZE:
+                return None
+            meta = file.read(box_size - header_size)
+            sizes = [
+                struct.unpack_from('>II', meta, offset + 4)
+                for offset in _iter_heif_boxes(meta, 4, (b'iprp', b'ipco', b'ispe'))
+            ]
+            return max(sizes, key=lambda size: size[0] * size[1], default=None)
+
+        if box_size == 0:  # Box lasts till the end of the file
+            return None
+        file.seek(box_size - header_size, 1)
+
+    return None
+
+
+def _iter_heif_boxes(data: bytes, offset: int, path: tuple[bytes, ...]):
+    """Yields content offsets of the boxes found by the path of box types (nested in data, starting from offset)"""
+    while offset + 8 <= len(data):
+        box_size, box_type = struct.unpack_from('>I4s', data, offset)
+        if box_size < 8:
+            return
+        if box_type == path[0]:
+            if len(path) == 1:
+                yield offset + 8
+            else:
+                yield from _iter_heif_boxes(data[:offset + box_size], offset + 8, path[1:])
+        offset += box_size
+
+
+def validate_image_header(uploaded_image: InMemoryUploadedFile, header: ImageHeader):
+    content_format = uploaded_image.content_type.removeprefix('image/')
+    if _FORMAT_ALIASES.get(content_format, content_format) != header.format:
+        raise InvalidImageFormatError(
+            f"Image content ({header.format}) does not match its format: {uploaded_image.content_type}"
+        )
+    if header.size:
+        validate_image_dimensions(header)
+        validate_image_square(header)
+
+
+def open_image(uploaded_image: InMemoryUploadedFile, header: ImageHeader) -> Image.Image:
+    """
+    Opens the image (without decoding it yet), refusing decompression bombs:
+    images over Pillow's MAX_IMAGE_PIXELS, which is set to the ALLOWED_PHOTO_MAX_DIMENSIONS pixels count
+    (see ShallwePhotoConfig.ready). Pillow itself only errors out on twice as many pixels.
+    """
+    try:
+        image = Image.open(uploaded_image, formats=[_PILLOW_FORMATS[header.format]])
+    except UnidentifiedImageError:
+        raise NotAnImageError("Not an image: the file is corrupted")
+    except Image.DecompressionBombError:
+        image = None
+
+    if image is None or image.size[0] * image.size[1] > Image.MAX_IMAGE_PIXELS:
+        max_dimensions = settings.ALLOWED_PHOTO_MAX_DIMENSIONS
+        raise ImageDimensionsError(
+            f"Image dimensions exceed the maximum allowed size of {max_dimensions[0]}x{max_dimensions[1]} pixels"
+        )
+    return image
+
+
+def validate_image_dimensions(image: Image.Image | ImageHeader):
     min_dimensions = settings.ALLOWED_PHOTO_MIN_DIMENSIONS
     max_dimensions = settings.ALLOWED_PHOTO_MAX_DIMENSIONS
     if image.size[0] < min_dimensions[0] or image.size[1] < min_dimensions[1]:
@@ -63,7 +212,7 @@ def validate_image_dimensions(image: Image.Image):
         )
 
 
-def validate_image_square(image: Image.Image):
+def validate_image_square(image: Image.Image | ImageHeader):
     if image.size[0] != image.size[1]:
         raise ImageNotSquareError("Image must be a square")
 
@@ -74,7 +223,11 @@ def clean_image(uploaded_image, return_opened=True):
     validate_image_size(uploaded_image)
     validate_image_format(uploaded_image)
 
-    image = Image.open(uploaded_image)
+    # Reject by the header bytes first, before Pillow opens (and anything decodes) the image
+    header = read_image_header(uploaded_image)
+    validate_image_header(uploaded_image, header)
+
+    image = open_image(uploaded_image, header)
 
     validate_image_dimensions(image)
     validate_image_square(image)
@@ -0,0 +1,54 @@
+"""
+Photo renditions: downscaled copies of a photo made at once, when the photo is saved.
+
+The photo is decoded a single time (JPEG right at a reduced scale, see Image.draft) and the renditions are made
+by progressive downscaling: the largest one from the decoded photo, every next one from the previous one,
+so each resize works on the smallest image available. All the renditions are then encoded in one go.
+Serving the renditions later is plain file serving, without any image work.
+"""
+
+import io
+from typing import NamedTuple
+
+from PIL import Image
+from django.core.files import File
+from django.core.files.base import ContentFile
+from imagekit.processors import ResizeToFill
+
+
+class Rendition(NamedTuple):
+    """Square rendition of a photo"""
+    size: int
+    quality: int
+    format: str = 'WEBP'
+
+
+def make_renditions(photo: File, renditions: dict[str, Rendition]) -> dict[str, ContentFile]:
+    """Renders the photo in every rendition, returns the encoded files by the same keys"""
+    should_close = photo.closed  # An open file (like a fresh upload) is left open for its owner
+    photo.open('rb')
+    try:
+        with Image.open(photo) as image:
+            resized_images = resize_progressively(image, renditions)
+    finally:
+        if should_close:
+            photo.close()
+    return {key: encode(resized_images[key], rendition) for key, rendition in renditions.items()}
+
+
+def resize_progressively(image: Image.Image, renditions: dict[str, Rendition]) -> dict[str, Image.Image]:
+    """Resizes a not yet loaded image to every rendition, from the largest to the smallest"""
+    largest_size = max(rendition.size for rendition in renditions.values())
+    image.draft(None, (largest_size, largest_size))  # No-op for formats other than JPEG
+
+    resized_images = {}
+    for key, rendition in sorted(renditions.items(), key=lambda item: item[1].size, reverse=True):
+        image = ResizeToFill(rendition.size, rendition.size).process(image)
+        resized_images[key] = image
+    return resized_images
+
+
+def encode(image: Image.Image, rendition: Rendition) -> ContentFile:
+    buffer = io.BytesIO()
+    image.save(buffer, format=rendition.format, quality=rendition.quality)
+    return ContentFile(buffer.getvalue())
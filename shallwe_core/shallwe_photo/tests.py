@@ -1,7 +1,28 @@
-from django.conf import settings
+import io
+import struct
+import threading
+import time
+from unittest.mock import patch
+
+import numpy as np
+from imagekit import ImageSpec
+from imagekit.processors import ResizeToFill
+from PIL import Image, ImageFile
 from rest_framework import status
 
-from shallwe_util.tests import AuthorizedAPITestCase
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+
+from shallwe_util.tests import AuthorizedAPITestCase, benchmark
+from . import formatcheck
+from .cache import face_verdict_cache
+from .facecheck import (
+    FaceCheckResult, FaceDetectorRegistry, face_detector_registry, get_face_confidence, run_face_cascade,
+    run_face_detectors_parallel, load_image_array, load_minified_image, check_face_minified
+)
+from .renditions import Rendition, make_renditions
 
 
 class FaceDetectionViewTest(AuthorizedAPITestCase):
@@ -113,3 +134,464 @@ class FaceDetectionViewTest(AuthorizedAPITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertIn('success', response.data)
         self.assertTrue(response.data['success'])
+
+
+class FaceDetectorRegistryTest(TestCase):
+
+    def test_detectors_built_once(self):
+        registry = FaceDetectorRegistry()
+        with patch.object(FaceDetectorRegistry, '_build', side_effect=lambda backend: object()) as build_mock:
+            self.assertFalse(registry.is_ready())
+            registry.warm_up()
+            detector = registry.get(settings.FACE_DETECTOR_CASCADE[0][0])
+            registry.warm_up()
+
+        self.assertTrue(registry.is_ready())
+        self.assertIs(registry.get(settings.FACE_DETECTOR_CASCADE[0][0]), detector)
+        self.assertEqual(build_mock.call_count, len(settings.FACE_DETECTOR_CASCADE))
+
+    def test_background_warm_up(self):
+        registry = FaceDetectorRegistry()
+        with patch.object(FaceDetectorRegistry, '_build', side_effect=lambda backend: object()):
+            registry.warm_up_in_background().join()
+        self.assertTrue(registry.is_ready())
+
+    def test_failed_warm_up_not_ready(self):
+        registry = FaceDetectorRegistry()
+        with patch.object(FaceDetectorRegistry, '_build', side_effect=OSError('No weights')):
+            with self.assertLogs('shallwe_photo.facecheck', level='ERROR'):
+                registry.warm_up_in_background().join()
+        self.assertFalse(registry.is_ready())
+
+
+class FaceConfidenceTest(TestCase):
+    image = np.zeros((200, 200, 3), dtype=np.uint8)
+
+    def _get_confidence(self, faces: list[tuple]) -> float:
+        with (
+            patch.object(face_detector_registry, 'get', return_value=object()),
+            patch('shallwe_photo.facecheck.FaceDetector.detect_faces', return_value=faces)
+        ):
+            return get_face_confidence(self.image, 'ssd')
+
+    def test_first_face_confidence(self):
+        face = np.zeros((50, 50, 3), dtype=np.uint8)
+        self.assertEqual(self._get_confidence([(face, [10, 10, 50, 50], 0.97), (face, [80, 80, 50, 50], 0.5)]), 0.97)
+        self.assertEqual(self._get_confidence([]), 0)
+
+    def test_empty_regions_skipped(self):
+        face = np.zeros((50, 50, 3), dtype=np.uint8)
+        empty_face = np.zeros((0, 0, 3), dtype=np.uint8)
+        self.assertEqual(self._get_confidence([(empty_face, [0, 0, 0, 0], 0.99), (face, [10, 10, 50, 50], 0.8)]), 0.8)
+        self.assertEqual(self._get_confidence([(empty_face, [10, 10, 0, 50], 0.99)]), 0)
+
+
+@override_settings(FACE_DETECTOR_CASCADE=[('ssd', 0.9), ('mtcnn', 0.95), ('retinaface', 0.95)])
+class FaceCascadeTest(TestCase):
+    image = np.zeros((200, 200, 3), dtype=np.uint8)
+
+    def _run_cascade(self, confidences: dict[str, float]):
+        with patch('shallwe_photo.facecheck.get_face_confidence', side_effect=lambda _, backend: confidences[backend]):
+            return run_face_cascade(self.image)
+
+    def test_all_stages_pass(self):
+        result = self._run_cascade({'ssd': 0.99, 'mtcnn': 0.99, 'retinaface': 0.99})
+        self.assertTrue(result.is_face_detected)
+        self.assertEqual([backend for backend, _ in result.stage_timings], ['ssd', 'mtcnn', 'retinaface'])
+
+    def test_stops_at_first_failure(self):
+        result = self._run_cascade({'ssd': 0.99, 'mtcnn': 0.5, 'retinaface': 0.99})
+        self.assertFalse(result.is_face_detected)
+        self.assertEqual([backend for backend, _ in result.stage_timings], ['ssd', 'mtcnn'])
+
+    def test_stage_thresholds(self):
+        self.assertTrue(self._run_cascade({'ssd': 0.92, 'mtcnn': 0.99, 'retinaface': 0.99}).is_face_detected)
+        self.assertFalse(self._run_cascade({'ssd': 0.99, 'mtcnn': 0.92, 'retinaface': 0.99}).is_face_detected)
+
+    @override_settings(FACE_DETECTOR_CASCADE=[('retinaface', 0.95), ('ssd', 0.95)])
+    def test_configurable_order(self):
+        result = self._run_cascade({'ssd': 0.99, 'mtcnn': 0.99, 'retinaface': 0.1})
+        self.assertEqual([backend for backend, _ in result.stage_timings], ['retinaface'])
+
+
+@override_settings(FACE_DETECTOR_CASCADE=[('ssd', 0.95), ('mtcnn', 0.95), ('retinaface', 0.95)])
+class FaceDetectorsParallelTest(TestCase):
+    image = np.zeros((200, 200, 3), dtype=np.uint8)
+
+    def setUp(self):
+        self.running_count = 0
+        self.max_running_count = 0
+        self.counter_lock = threading.Lock()
+
+    def _run_parallel(self, confidences: dict[str, float], pool_size: int = 3, wait_for_others=None):
+        def get_face_confidence_counted(_, backend):
+            with self.counter_lock:
+                self.running_count += 1
+                self.max_running_count = max(self.max_running_count, self.running_count)
+            if wait_for_others:
+                wait_for_others()
+            with self.counter_lock:
+                self.running_count -= 1
+            return confidences[backend]
+
+        with (
+            override_settings(FACE_DETECTORS_POOL_SIZE=pool_size),
+            patch('shallwe_photo.facecheck._detection_pool', None),
+            patch('shallwe_photo.facecheck.get_face_confidence', side_effect=get_face_confidence_counted)
+        ):
+            return run_face_detectors_parallel(self.image)
+
+    def test_detectors_run_at_once(self):
+        # Every detector waits for the others to start, which never happens (BrokenBarrierError) if run one by one
+        all_started = threading.Barrier(3, timeout=5)
+        result = self._run_parallel({'ssd': 0.99, 'mtcnn': 0.99, 'retinaface': 0.99}, wait_for_others=all_started.wait)
+
+        self.assertTrue(result.is_face_detected)
+        self.assertEqual(len(result.stage_timings), 3)
+        self.assertEqual(self.max_running_count, 3)
+
+    def test_failure_detected(self):
+        result = self._run_parallel({'ssd': 0.99, 'mtcnn': 0.3, 'retinaface': 0.99})
+        self.assertFalse(result.is_face_detected)
+
+    def test_pool_size_limit(self):
+        # Running detectors linger a bit, so that any others let through at the same time would be counted
+        result = self._run_parallel({'ssd': 0.99, 'mtcnn': 0.99, 'retinaface': 0.99}, pool_size=1,
+                                    wait_for_others=lambda: time.sleep(0.05))
+
+        self.assertTrue(result.is_face_detected)
+        self.assertEqual(len(result.stage_timings), 3)
+        self.assertEqual(self.max_running_count, 1)
+
+
+class InMemoryFaceCheckTest(TestCase):
+
+    def setUp(self):
+        face_verdict_cache.clear()
+
+    def test_load_image_array(self):
+        red_image = Image.new('RGB', (4, 4), (255, 0, 0))
+        buffer = io.BytesIO()
+        red_image.save(buffer, format='PNG')
+
+        for image in (red_image, buffer.getvalue(), io.BytesIO(buffer.getvalue())):
+            array = load_image_array(image)
+            self.assertEqual(array.shape, (4, 4, 3))
+            self.assertEqual(array[0, 0].tolist(), [0, 0, 255])  # BGR
+
+        array = np.zeros((4, 4, 3), dtype=np.uint8)
+        self.assertIs(load_image_array(array), array)
+
+    def test_minified_check_passes_pixels(self):
+        image = Image.new('RGBA', (600, 600), (0, 0, 0, 0))
+
+        with patch('shallwe_photo.facecheck.run_face_cascade', return_value=FaceCheckResult()) as cascade_mock:
+            self.assertTrue(check_face_minified(image))
+
+        checked_image = cascade_mock.call_args.args[0]
+        self.assertEqual(checked_image.shape, (200, 200, 3))
+        self.assertEqual(checked_image[0, 0].tolist(), [255, 255, 255])  # Transparency flattened onto white
+
+
+class MinifiedImageLoadTest(TestCase):
+
+    def _open_encoded(self, image: Image.Image, format_: str) -> Image.Image:
+        buffer = io.BytesIO()
+        image.save(buffer, format=format_)
+        return Image.open(buffer)
+
+    def test_minified_jpeg_decoded_at_reduced_scale(self):
+        image = self._open_encoded(Image.new('RGB', (3200, 3200), (200, 150, 100)), 'JPEG')
+
+        minified_image = load_minified_image(image)
+        self.assertEqual(minified_image.size, (200, 200))
+        self.assertEqual(image.size, (400, 400))  # Decoded 8 times smaller
+        self.assertEqual(minified_image.getpixel((100, 100)), image.getpixel((200, 200)))
+
+    def test_minified_png_reduced(self):
+        gradient = Image.linear_gradient('L').resize((1000, 1000)).convert('RGB')
+
+        with patch.object(Image.Image, 'reduce', autospec=True, side_effect=Image.Image.reduce) as reduce_mock:
+            minified_image = load_minified_image(self._open_encoded(gradient, 'PNG'))
+        self.assertEqual(reduce_mock.call_args.args[1], 5)
+
+        # Same picture as resampling the full image
+        expected_image = gradient.resize((200, 200))
+        pixel_differences = np.abs(np.asarray(minified_image, dtype=int) - np.asarray(expected_image, dtype=int))
+        self.assertLessEqual(pixel_differences.max(), 2)
+
+    def test_minified_other_modes(self):
+        gradient = Image.linear_gradient('L').resize((1000, 1000))
+        transparent_palette = gradient.convert('RGB').quantize(16)
+        transparent_palette.info['transparency'] = 0
+
+        for image, expected_mode in (
+            (gradient.convert('RGB').quantize(16), 'RGB'),
+            (transparent_palette, 'RGBA'),
+            (gradient.convert('1'), 'RGB'),
+            (gradient.convert('I').point(lambda value: value * 256).convert('I;16'), 'RGB'),
+        ):
+            minified_image = load_minified_image(self._open_encoded(image, 'PNG'))
+            self.assertEqual(minified_image.size, (200, 200))
+            self.assertEqual(minified_image.mode, expected_mode)
+
+
+class FaceDetectionImageModesViewTest(AuthorizedAPITestCase):
+
+    def setUp(self):
+        face_verdict_cache.clear()
+
+    def test_palette_and_bilevel_png(self):
+        gradient = Image.linear_gradient('L').resize((1000, 1000))
+
+        for image in (gradient.convert('RGB').quantize(16), gradient.convert('1')):
+            buffer = io.BytesIO()
+            image.save(buffer, format='PNG')
+            uploaded_image = SimpleUploadedFile('photo.png', buffer.getvalue(), content_type='image/png')
+
+            with patch('shallwe_photo.facecheck.run_face_cascade', return_value=FaceCheckResult()) as cascade_mock:
+                response = self._get_response('facecheck', method='post', data={'image': uploaded_image})
+
+            self.assertEqual(response.status_code, status.HTTP_200_OK, image.mode)
+            self.assertTrue(response.data['success'])
+            self.assertEqual(cascade_mock.call_args.args[0].shape, (200, 200, 3))
+
+
+class FaceVerdictCacheTest(AuthorizedAPITestCase):
+
+    def setUp(self):
+        face_verdict_cache.clear()
+
+    def _check_face(self, image: Image.Image) -> tuple[bool, int]:
+        """Returns the verdict and how many times the detectors actually ran"""
+        with patch('shallwe_photo.facecheck.run_face_cascade', return_value=FaceCheckResult()) as cascade_mock:
+            is_face_detected = check_face_minified(image)
+        return is_face_detected, cascade_mock.call_count
+
+    def test_same_image_checked_once(self):
+        image = Image.new('RGB', (400, 400), (200, 150, 100))
+        self.assertEqual(self._check_face(image), (True, 1))
+        self.assertEqual(self._check_face(image), (True, 0))
+
+        # Same pixels in another format are the same photo
+        buffer = io.BytesIO()
+        image.save(buffer, format='PNG')
+        self.assertEqual(self._check_face(Image.open(buffer)), (True, 0))
+
+        self.assertEqual(self._check_face(Image.new('RGB', (400, 400), (0, 0, 0))), (True, 1))
+
+    def test_negative_verdict_cached(self):
+        image = Image.new('RGB', (400, 400), (200, 150, 100))
+        no_face_result = FaceCheckResult()
+        no_face_result.is_face_detected = False
+
+        with patch('shallwe_photo.facecheck.run_face_cascade', return_value=no_face_result):
+            self.assertFalse(check_face_minified(image))
+        self.assertEqual(self._check_face(image), (False, 0))
+
+    def test_expiry_and_size_limit(self):
+        image = Image.new('RGB', (400, 400), (200, 150, 100))
+
+        with override_settings(FACE_VERDICT_CACHE_TTL=0):
+            self._check_face(image)
+            self.assertEqual(self._check_face(image), (True, 1))
+
+        with override_settings(FACE_VERDICT_CACHE_SIZE=1):
+            self._check_face(image)
+            self._check_face(Image.new('RGB', (400, 400), (0, 0, 0)))
+            self.assertEqual(self._check_face(image), (True, 1))
+
+    def test_detector_settings_change(self):
+        image = Image.new('RGB', (400, 400), (200, 150, 100))
+        self._check_face(image)
+
+        with override_settings(FACE_DETECTOR_CASCADE=[('ssd', 0.5)]):
+            self.assertEqual(self._check_face(image), (True, 1))
+
+    @override_settings(
+        CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'faces-test'}},
+        FACE_VERDICT_CACHE_ALIAS='default'
+    )
+    def test_shared_between_processes(self):
+        image = Image.new('RGB', (400, 400), (200, 150, 100))
+        self._check_face(image)
+
+        face_verdict_cache.clear()  # As if checked by another process
+        self.assertEqual(self._check_face(image), (True, 0))
+
+    def test_facecheck_endpoint(self):
+        from django.contrib.staticfiles import finders
+
+        for expected_run_count in (1, 0):
+            with open(finders.find('shallwe_photo/img/valid-format.jpg'), 'rb') as image_file, \
+                    patch('shallwe_photo.facecheck.run_face_cascade', return_value=FaceCheckResult()) as cascade_mock:
+                response = self._get_response('facecheck', method='post', data={'image': image_file})
+
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertTrue(response.data['success'])
+            self.assertEqual(cascade_mock.call_count, expected_run_count)
+
+
+class FormatCheckHeaderTest(TestCase):
+
+    def _get_upload(self, data: bytes, content_type: str = 'image/jpeg') -> SimpleUploadedFile:
+        return SimpleUploadedFile('photo', data, content_type=content_type)
+
+    def _get_static_upload(self, filename: str, content_type: str) -> SimpleUploadedFile:
+        from django.contrib.staticfiles import finders
+        with open(finders.find('shallwe_photo/img/' + filename), 'rb') as image_file:
+            return self._get_upload(image_file.read(), content_type)
+
+    def _encode(self, image: Image.Image, format_: str, **params) -> bytes:
+        buffer = io.BytesIO()
+        image.save(buffer, format=format_, **params)
+        return buffer.getvalue()
+
+    def test_header_read(self):
+        for filename, content_type in (
+            ('valid-format.jpg', 'image/jpeg'),
+            ('valid-format.png', 'image/png'),
+            ('valid-format.heic', 'image/heic'),
+            ('valid-format.heif', 'image/heif'),
+        ):
+            uploaded_image = self._get_static_upload(filename, content_type)
+            header = formatcheck.read_image_header(uploaded_image)
+            self.assertEqual(header.size, (1000, 1000))
+            self.assertEqual(uploaded_image.tell(), 0)
+            self.assertEqual(formatcheck.clean_image(uploaded_image).size, (1000, 1000))
+
+    def test_jpeg_size_after_large_metadata(self):
+        exif = Image.Exif()
+        exif[0x010E] = 'x' * 60000  # ImageDescription
+        data = self._encode(Image.new('RGB', (300, 200)), 'JPEG', exif=exif, icc_profile=b'\0' * 30000)
+        self.assertEqual(formatcheck.read_image_header(self._get_upload(data)).size, (300, 200))
+
+    def test_content_not_matching_type(self):
+        with self.assertRaisesRegex(formatcheck.InvalidImageFormatError, 'does not match'):
+            formatcheck.clean_image(self._get_static_upload('valid-format.png', 'image/jpeg'))
+        with self.assertRaisesRegex(formatcheck.NotAnImageError, 'unknown file content'):
+            formatcheck.clean_image(self._get_static_upload('invalid-format.gif', 'image/png'))
+        with self.assertRaisesRegex(formatcheck.NotAnImageError, 'unknown file content'):
+            formatcheck.clean_image(self._get_upload(b'not an image at all'))
+
+    def test_rejected_before_opening(self):
+        # Only a header of a huge PNG, the rest is never read
+        huge_png_header = self._encode(Image.new('L', (1, 1)), 'PNG')[:16] + struct.pack('>II', 100000, 100000)
+        truncated_jpeg = self._encode(Image.new('RGB', (300, 300)), 'JPEG')[:100]
+
+        with patch('shallwe_photo.formatcheck.Image.open') as open_mock:
+            with self.assertRaisesRegex(formatcheck.ImageDimensionsError, 'exceed the maximum'):
+                formatcheck.clean_image(self._get_upload(huge_png_header, 'image/png'))
+            with self.assertRaisesRegex(formatcheck.ImageNotSquareError, 'square'):
+                formatcheck.clean_image(self._get_static_upload('non-square.jpg', 'image/jpeg'))
+            with self.assertRaises(formatcheck.NotAnImageError):
+                formatcheck.clean_image(self._get_upload(truncated_jpeg))
+        open_mock.assert_not_called()
+
+    def test_decompression_bomb_refused(self):
+        # Over the limit, but under the twice larger one where Pillow errors on its own
+        with patch.object(Image, 'MAX_IMAGE_PIXELS', 600000):
+            with self.assertRaisesRegex(formatcheck.ImageDimensionsError, 'exceed the maximum'):
+                formatcheck.clean_image(self._get_static_upload('valid-format.jpg', 'image/jpeg'))
+
+    def test_pillow_limit_set(self):
+        max_dimensions = settings.ALLOWED_PHOTO_MAX_DIMENSIONS
+        self.assertEqual(Image.MAX_IMAGE_PIXELS, max_dimensions[0] * max_dimensions[1])
+
+
+PROFILE_PHOTO_RENDITIONS = {
+    'w768': Rendition(size=768, quality=80),
+    'w540': Rendition(size=540, quality=90),
+    'w192': Rendition(size=192, quality=80),
+    'w64': Rendition(size=64, quality=80),
+}
+
+
+class RenditionsTest(TestCase):
+
+    def test_renditions(self):
+        source = io.BytesIO()
+        Image.new('RGB', (1200, 900), (200, 150, 100)).save(source, format='JPEG')
+
+        renditions = make_renditions(ContentFile(source.getvalue()), PROFILE_PHOTO_RENDITIONS)
+
+        self.assertEqual(list(renditions), list(PROFILE_PHOTO_RENDITIONS))
+        for key, rendition in PROFILE_PHOTO_RENDITIONS.items():
+            with Image.open(renditions[key]) as image:
+                self.assertEqual((image.format, image.size), ('WEBP', (rendition.size, rendition.size)))
+                center_pixel = image.getpixel((rendition.size // 2, rendition.size // 2))
+                self.assertLessEqual(max(abs(a - b) for a, b in zip(center_pixel, (200, 150, 100))), 2)
+
+    def test_source_decoded_once(self):
+        source = io.BytesIO()
+        Image.new('RGBA', (1000, 1000), (0, 0, 0, 0)).save(source, format='PNG')
+
+        with patch('PIL.ImageFile.ImageFile.load', autospec=True, side_effect=ImageFile.ImageFile.load) as load_mock:
+            renditions = make_renditions(ContentFile(source.getvalue()), PROFILE_PHOTO_RENDITIONS)
+        # Only the source is decoded (loading an already loaded image is a no-op), the renditions are never reopened
+        self.assertEqual(len({id(call.args[0]) for call in load_mock.call_args_list}), 1)
+
+        with Image.open(renditions['w64']) as image:
+            self.assertEqual(image.mode, 'RGBA')
+
+
+@benchmark
+class RenditionsBenchmarkTest(TestCase):
+    """Compares CPU time per upload of the profile photo renditions against the previous imagekit setup"""
+
+    ROUNDS = 3
+
+    class ImagekitPhotoSpec(ImageSpec):
+        format = 'WEBP'
+
+        def __init__(self, source, size: int, quality: int):
+            super().__init__(source)
+            self.processors = [ResizeToFill(size, size)]
+            self.options = {'quality': quality}
+
+    def _make_imagekit_renditions(self, upload: bytes) -> list[bytes]:
+        # ProcessedImageField made the 768 photo, each ImageSpecField decoded it again to make its own size
+        photo_w768 = self.ImagekitPhotoSpec(ContentFile(upload), 768, 80).generate().read()
+        return [photo_w768] + [
+            self.ImagekitPhotoSpec(ContentFile(photo_w768), rendition.size, rendition.quality).generate().read()
+            for key, rendition in PROFILE_PHOTO_RENDITIONS.items() if key != 'w768'
+        ]
+
+    def _get_cpu_time_per_upload(self, make_renditions_, upload: bytes) -> float:
+        make_renditions_(upload)  # Warm up
+        start_time = time.process_time()
+        for _ in range(self.ROUNDS):
+            make_renditions_(upload)
+        return (time.process_time() - start_time) / self.ROUNDS
+
+    def test_cpu_time_per_upload(self):
+        from django.contrib.staticfiles import finders
+
+        for filename in ('male-face-anfas.jpg', 'valid-format.png'):
+            with open(finders.find('shallwe_photo/img/' + filename), 'rb') as image_file:
+                upload = image_file.read()
+
+            imagekit_time = self._get_cpu_time_per_upload(self._make_imagekit_renditions, upload)
+            single_decode_time = self._get_cpu_time_per_upload(
+                lambda upload_: make_renditions(ContentFile(upload_), PROFILE_PHOTO_RENDITIONS), upload
+            )
+
+            if filename.endswith('.jpg'):  # A phone-sized photo, where decoding dominates (encoding is the same)
+                self.assertLess(single_decode_time, imagekit_time * 0.75,
+                                f'{filename}: imagekit {imagekit_time * 1000:.0f} ms, '
+                                f'single decode {single_decode_time * 1000:.0f} ms of CPU time per upload')
+
+
+class FaceDetectorsReadinessViewTest(AuthorizedAPITestCase):
+
+    def test_not_ready(self):
+        with patch.object(face_detector_registry, 'is_ready', return_value=False):
+            response = self._get_response('facecheck-ready', authenticated=False)
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertFalse(response.data['ready'])
+
+    def test_ready(self):
+        with patch.object(face_detector_registry, 'is_ready', return_value=True):
+            response = self._get_response('facecheck-ready', authenticated=False)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data['ready'])
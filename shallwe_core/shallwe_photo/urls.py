@@ -1,7 +1,8 @@
 from django.urls import path
 
-from .views import FaceDetectionView
+from .views import FaceDetectionView, FaceDetectorsReadinessView
 
 urlpatterns = [
     path('facecheck/', FaceDetectionView.as_view(), name='facecheck'),
+    path('facecheck/ready/', FaceDetectorsReadinessView.as_view(), name='facecheck-ready'),
 ]
@@ -1,10 +1,10 @@
 from django.core.files.uploadedfile import InMemoryUploadedFile
 
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from .facecheck import check_face_minified_temp
+from .facecheck import check_face_minified, face_detector_registry
 from . import formatcheck
 
 
@@ -25,7 +25,7 @@ class FaceDetectionView(APIView):
             return Response({'error': clean_result['error']}, status=400)
 
         # Check face
-        is_face_detected = check_face_minified_temp(clean_result['image'])
+        is_face_detected = check_face_minified(clean_result['image'])
         return Response({'success': is_face_detected})
 
     def _try_clean_image(self, uploaded_image: InMemoryUploadedFile):
@@ -40,3 +40,13 @@ class FaceDetectionView(APIView):
         except (formatcheck.ImageValidationError, ValueError) as e:
             result['error'] = str(e)
         return result
+
+
+class FaceDetectorsReadinessView(APIView):
+    """Readiness probe: tells the load balancer whether this worker's face detectors are warmed up"""
+    permission_classes = [AllowAny]
+
+    def get(self, request, *args, **kwargs):
+        if face_detector_registry.is_ready():
+            return Response({'ready': True})
+        return Response({'ready': False}, status=503)
@@ -49,5 +49,11 @@ class UserProfileAdmin(nested_admin.NestedModelAdmin):
 
     display_photo.short_description = 'Photo'
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # LocationsInline edits the preferred locations rows directly, which sends no m2m_changed
+        if hasattr(form.instance, 'rent_preferences'):
+            form.instance.rent_preferences.update_location_prefixes()
+
 
 admin.site.register(UserProfile, UserProfileAdmin)
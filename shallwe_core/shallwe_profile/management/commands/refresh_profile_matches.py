@@ -0,0 +1,63 @@
+"""
+The command recomputes the stored matches (see shallwe_profile/matches.py) of all the profiles.
+They are refreshed on profile changes, but ages (thus matches) also change over time, so it should run daily.
+
+With --queued it runs a worker processing the refreshes queued on profile changes instead.
+Several workers may run at once.
+
+Basic usage:
+./manage.py refresh_profile_matches                  <- recompute the matches of all the profiles
+./manage.py refresh_profile_matches --queued         <- keep polling the queue
+./manage.py refresh_profile_matches --queued --once  <- process the queued refreshes and exit
+"""
+
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ...matches import refresh_profile_matches, process_next_matches_refresh
+from ...models import UserProfile
+
+
+class Command(BaseCommand):
+    help = 'Recompute the stored matches of all the profiles or process the queued refreshes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queued', action='store_true', help='Process the refreshes queued on profile changes')
+        parser.add_argument('--once', action='store_true', help='Exit once the queue is empty (with --queued)')
+
+    def handle(self, *args, **options):
+        if options['once'] and not options['queued']:
+            raise CommandError('--once only applies to processing the queue, use it with --queued')
+
+        if options['queued']:
+            self._process_queue(options['once'])
+        else:
+            self._refresh_all()
+
+    def _refresh_all(self) -> None:
+        created_count = deleted_count = recomputed_count = 0
+        for profile in UserProfile.objects.order_by('pk').iterator():
+            refresh = refresh_profile_matches(profile)
+            created_count += refresh.created
+            deleted_count += refresh.deleted
+            recomputed_count += refresh.recomputed
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Match rows created: {created_count}, deleted: {deleted_count}, recomputed: {recomputed_count}'
+        ))
+
+    def _process_queue(self, once: bool) -> None:
+        self.stdout.write('Processing queued matches refreshes...')
+
+        processed_count = 0
+        while True:
+            if process_next_matches_refresh():
+                processed_count += 1
+            elif once:
+                break
+            else:
+                time.sleep(settings.PROFILE_MATCHES_REFRESH_POLL_INTERVAL)
+
+        self.stdout.write(self.style.SUCCESS(f'Matches refreshes processed: {processed_count}'))
@@ -0,0 +1,38 @@
+"""
+The command runs a worker processing queued profile photo face checks (see shallwe_profile/verification.py).
+Only needed if PROFILE_PHOTO_ASYNC_VERIFICATION is on. Several workers may run at once.
+
+Basic usage:
+./manage.py verify_profile_photos          <- keep polling the queue
+./manage.py verify_profile_photos --once   <- process the queued jobs and exit
+"""
+
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from shallwe_photo.facecheck import face_detector_registry
+from ...verification import process_next_photo_verification
+
+
+class Command(BaseCommand):
+    help = 'Process queued profile photo face checks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit once the queue is empty')
+
+    def handle(self, *args, **options):
+        face_detector_registry.warm_up()
+        self.stdout.write('Face detectors are ready, processing photo verifications...')
+
+        processed_count = 0
+        while True:
+            if process_next_photo_verification():
+                processed_count += 1
+            elif options['once']:
+                break
+            else:
+                time.sleep(settings.PROFILE_PHOTO_VERIFICATION_POLL_INTERVAL)
+
+        self.stdout.write(self.style.SUCCESS(f'Photo verifications processed: {processed_count}'))
@@ -0,0 +1,172 @@
+"""
+Materialized matches: the compatible profiles of every profile (see matching.py) with their scores,
+stored in the ProfileMatch table so a match list is read by a single indexed lookup instead of being recomputed.
+
+The table is refreshed incrementally: when a profile's parameters change
+(UserProfileWithParametersCreateUpdateSerializer saves them), only the matches of that profile are recomputed -
+its row (the profile's matches) and column (the profile as somebody's match), the same pairs as matches are mutual.
+Every refresh reports the match rows created, deleted and recomputed through the matches_refreshed signal and the log.
+
+A refresh takes longer as the number of candidates grows, so the request only queues it (ProfileMatchesRefreshJob)
+and the refresh_profile_matches --queued command processes the queue, any number of its workers can run at once:
+a worker claims a job in a short transaction (skipping the rows locked by other workers) and refreshes outside of it.
+A job queued again while being processed is kept for another run, a job claimed longer than
+PROFILE_MATCHES_REFRESH_TIMEOUT ago (its worker died) is claimed again.
+
+Matches change over time too (ages are counted from birth dates), the refresh_profile_matches command
+recomputes all of them.
+"""
+
+import logging
+import time
+from datetime import timedelta
+from typing import NamedTuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q, QuerySet
+from django.utils import timezone
+
+from .matching import find_matching_profiles, get_visible_q
+from .models import UserProfile, ProfileMatch, ProfileMatchesRefreshJob, DrinkingLevelChoices, NeighbourlinessLevelChoices, \
+    GuestsLevelChoices, PartiesLevelChoices, NeatnessLevelChoices
+from .signals import matches_refreshed
+
+
+logger = logging.getLogger(__name__)
+
+
+# Lifestyle levels scored by closeness
+SCORED_LEVELS = {
+    'drinking_level': DrinkingLevelChoices,
+    'neighbourliness_level': NeighbourlinessLevelChoices,
+    'guests_level': GuestsLevelChoices,
+    'parties_level': PartiesLevelChoices,
+    'neatness_level': NeatnessLevelChoices,
+}
+NEUTRAL_SCORE = 50  # Nothing to compare
+
+
+class MatchesRefresh(NamedTuple):
+    """Counts of match rows (two per matching pair) changed by a refresh"""
+    created: int
+    deleted: int
+    recomputed: int
+
+
+def get_profile_matches(profile: UserProfile) -> QuerySet[ProfileMatch]:
+    """Stored matches of the profile with visible profiles, the best ones first"""
+    return ProfileMatch.objects.filter(
+        get_visible_q('matched_profile__'),
+        profile=profile
+    ).select_related('matched_profile').order_by('-score', 'matched_profile_id')
+
+
+def enqueue_matches_refresh(profile: UserProfile) -> ProfileMatchesRefreshJob:
+    """Queues a refresh of the stored matches of the profile (a single job per profile)"""
+    job, _ = ProfileMatchesRefreshJob.objects.update_or_create(
+        profile=profile,
+        defaults={'status': ProfileMatchesRefreshJob.StatusChoices.QUEUED}
+    )
+    return job
+
+
+def process_next_matches_refresh() -> bool:
+    """Processes the oldest queued refresh not claimed by other workers, returns False if there was none"""
+    with transaction.atomic():
+        job = ProfileMatchesRefreshJob.objects.select_for_update(skip_locked=True).filter(
+            Q(status=ProfileMatchesRefreshJob.StatusChoices.QUEUED) |
+            Q(status=ProfileMatchesRefreshJob.StatusChoices.RUNNING,
+              updated_at__lt=timezone.now() - timedelta(seconds=settings.PROFILE_MATCHES_REFRESH_TIMEOUT))
+        ).select_related('profile').order_by('updated_at').first()
+
+        if job is None:
+            return False
+
+        job.status = ProfileMatchesRefreshJob.StatusChoices.RUNNING
+        job.save(update_fields=['status', 'updated_at'])
+
+    try:
+        refresh_profile_matches(job.profile)
+    except Exception:
+        # Not retried, the periodic refresh of all the profiles catches up
+        logger.exception('Matches refresh of profile %s failed', job.profile_id)
+
+    # Kept if queued again since it was claimed (the profile changed while being refreshed)
+    ProfileMatchesRefreshJob.objects.filter(pk=job.pk, updated_at=job.updated_at).delete()
+    return True
+
+
+def refresh_profile_matches(profile: UserProfile) -> MatchesRefresh:
+    """Recomputes the stored matches of the profile (both directions)"""
+    start_time = time.perf_counter()
+
+    profile = _get_profiles_for_scoring(UserProfile.objects.select_related('neighbor_preferences')).get(pk=profile.pk)
+    candidates = []
+    if profile.is_visible and hasattr(profile, 'about'):
+        candidates = _get_profiles_for_scoring(find_matching_profiles(profile))
+    scores = {candidate.pk: get_match_score(profile, candidate) for candidate in candidates}
+
+    with transaction.atomic():
+        profile_matches = ProfileMatch.objects.filter(Q(profile=profile) | Q(matched_profile=profile))
+        stored_ids = set(profile_matches.filter(profile=profile).values_list('matched_profile_id', flat=True))
+        deleted_count, _ = profile_matches.exclude(
+            profile_id__in=list(scores)
+        ).exclude(
+            matched_profile_id__in=list(scores)
+        ).delete()
+
+        ProfileMatch.objects.bulk_create(
+            [
+                ProfileMatch(profile_id=profile_id, matched_profile_id=matched_profile_id, score=score)
+                for candidate_id, score in scores.items()
+                for profile_id, matched_profile_id in ((profile.pk, candidate_id), (candidate_id, profile.pk))
+            ],
+            update_conflicts=True,
+            unique_fields=['profile', 'matched_profile'],
+            update_fields=['score', 'updated_at'],
+        )
+
+    refresh = MatchesRefresh(
+        created=2 * len(scores.keys() - stored_ids),
+        deleted=deleted_count,
+        recomputed=2 * len(scores.keys() & stored_ids),
+    )
+    duration = time.perf_counter() - start_time
+    logger.info('Matches of profile %s refreshed in %.3f s: %d created, %d deleted, %d recomputed',
+                profile.pk, duration, *refresh)
+    matches_refreshed.send(sender=ProfileMatch, profile=profile, refresh=refresh, duration=duration)
+    return refresh
+
+
+def get_match_score(profile: UserProfile, other_profile: UserProfile) -> int:
+    """
+    Score of two matching profiles, 0-100: the mean of closeness of their lifestyle levels,
+    shared interests (of all their interests) and shared budget (of the narrower budget).\n
+    Only what both profiles have specified is compared.
+    """
+    similarities = []
+
+    for level, choices in SCORED_LEVELS.items():
+        value, other_value = getattr(profile.about, level), getattr(other_profile.about, level)
+        if value is not None and other_value is not None:
+            similarities.append(1 - abs(value - other_value) / (max(choices.values) - min(choices.values)))
+
+    interests = {tag.name for tag in profile.about.interests_tags.all()}
+    other_interests = {tag.name for tag in other_profile.about.interests_tags.all()}
+    if interests and other_interests:
+        similarities.append(len(interests & other_interests) / len(interests | other_interests))
+
+    if hasattr(profile, 'rent_preferences') and hasattr(other_profile, 'rent_preferences'):
+        rent, other_rent = profile.rent_preferences, other_profile.rent_preferences
+        shared_budget = min(rent.max_budget, other_rent.max_budget) - max(rent.min_budget, other_rent.min_budget)
+        narrower_budget = min(rent.max_budget - rent.min_budget, other_rent.max_budget - other_rent.min_budget)
+        similarities.append(max(shared_budget, 0) / narrower_budget if narrower_budget else 1.0)
+
+    if not similarities:
+        return NEUTRAL_SCORE
+    return round(100 * sum(similarities) / len(similarities))
+
+
+def _get_profiles_for_scoring(profiles: QuerySet[UserProfile]) -> QuerySet[UserProfile]:
+    return profiles.select_related('about', 'rent_preferences').prefetch_related('about__interests_tags')
@@ -0,0 +1,295 @@
+"""
+Flatmate matching: finds the profiles compatible with a given one both ways.
+
+A candidate matches if its parameters (UserProfileAbout) satisfy the profile's neighbor preferences
+and the profile's own parameters satisfy the candidate's neighbor preferences.
+Both directions are compiled into a single query, so candidates are filtered by the database only
+(the array preferences are matched with containment, served by their GIN indexes).
+
+Preferences are read as follows: an empty preference (null, no items or the loosest level) accepts anyone,
+including those who haven't specified the parameter, any other one accepts only the specified values it allows.
+Profiles without neighbor preferences accept anyone.
+Only visible profiles are matched: not hidden by their users and with a photo that passed the face check
+(a photo pending the queued check or rejected by it isn't shown to anyone).
+
+If the profile has rent preferences, candidates are also limited to those whose rent preferences overlap
+the profile's ones: budget and rent duration ranges (GiST-indexed range columns) and preferred locations
+(one is the same as or contains the other, found through the location prefixes index, PreferredLocationPrefix).
+So only the rent preferences relevant by those indexes are touched.
+
+CompatibilityVectors does the same screening in memory: the packed compatibility codes of all the candidates
+(see models/parameters/compatibility.py) are loaded into NumPy arrays once, then every profile is checked
+against all of them with a few vectorized bitwise operations.
+"""
+
+from datetime import date
+
+import numpy as np
+from dateutil.relativedelta import relativedelta
+from django.db import models
+from django.db.models import Q, Exists, OuterRef, QuerySet
+from psycopg2.extras import NumericRange
+
+from shallwe_locations.models import Location
+from .models import UserProfile, UserProfileAbout, UserProfileNeighborPreferences, UserProfileRentPreferences, \
+    PreferredLocationPrefix, SmokingLevelChoices, GuestsLevelChoices, PartiesLevelChoices, OccupationChoices, \
+    DrinkingLevelChoices, BedtimeLevelChoices
+from .models.parameters.about import TaggedOtherAnimalItem
+from .models.parameters.compatibility import ACCEPT_ALL_MASK
+
+
+# Accepted animals preferences with the matching parameters
+ANIMALS_ACCEPTED = {
+    'are_cats_accepted': 'has_cats',
+    'are_dogs_accepted': 'has_dogs',
+    'are_reptiles_accepted': 'has_reptiles',
+    'are_birds_accepted': 'has_birds',
+}
+
+
+def find_matching_profiles(profile: UserProfile) -> QuerySet[UserProfile]:
+    """
+    Visible profiles (other than the given one) that the profile accepts and that accept the profile.\n
+    The profile should have its parameters (about) set.
+    """
+    about = profile.about
+    preferences = profile.neighbor_preferences if hasattr(profile, 'neighbor_preferences') else None
+
+    candidates = UserProfile.objects.filter(
+        get_visible_q(),
+        about__isnull=False,
+    ).exclude(
+        pk=profile.pk
+    ).filter(
+        get_accepted_by_q(preferences),
+        get_accepting_q(about),
+    )
+    if hasattr(profile, 'rent_preferences'):
+        candidates = candidates.filter(get_overlapping_rent_q(profile.rent_preferences))
+    return candidates
+
+
+def find_profiles_with_overlapping_locations(locations: QuerySet[Location] | list[Location]) -> QuerySet[UserProfile]:
+    """Profiles whose preferred locations overlap the given ones (one is the same as or contains the other)"""
+    hierarchies = {location.hierarchy for location in locations}
+    prefixes = {prefix for hierarchy in hierarchies for prefix in Location.get_hierarchy_prefixes(hierarchy)}
+    return UserProfile.objects.filter(rent_preferences__in=_get_overlapping_rent_preferences(hierarchies, prefixes))
+
+
+def get_visible_q(prefix: str = '') -> Q:
+    """Condition on profiles (by the prefix) to be shown to other users"""
+    return Q(**{
+        f'{prefix}is_hidden': False,
+        f'{prefix}photo_verification_status': UserProfile.PhotoVerificationStatusChoices.VERIFIED,
+    })
+
+
+def get_overlapping_rent_q(rent_preferences: UserProfileRentPreferences, prefix: str = 'rent_preferences__') -> Q:
+    """Condition on candidates' rent preferences (by the prefix) to overlap the given ones"""
+    budget_range = NumericRange(rent_preferences.min_budget, rent_preferences.max_budget, '[]')
+    rent_duration_range = NumericRange(rent_preferences.min_rent_duration_level,
+                                       rent_preferences.max_rent_duration_level, '[]')
+    return Q(**{
+        f'{prefix}budget_range__overlap': budget_range,
+        f'{prefix}rent_duration_range__overlap': rent_duration_range,
+    }) & get_overlapping_locations_q(rent_preferences, prefix)
+
+
+def get_overlapping_locations_q(rent_preferences: UserProfileRentPreferences,
+                                prefix: str = 'rent_preferences__') -> Q:
+    """Condition on candidates' rent preferences (by the prefix) to have locations overlapping the given ones"""
+    own_prefixes = PreferredLocationPrefix.objects.filter(related_preferences=rent_preferences).values('prefix')
+    return Q(**{f'{prefix}in': _get_overlapping_rent_preferences(own_prefixes.filter(is_location=True), own_prefixes)})
+
+
+def get_accepted_by_q(preferences: UserProfileNeighborPreferences | None, prefix: str = 'about__') -> Q:
+    """Condition on candidates' parameters (by the prefix) to satisfy the given neighbor preferences"""
+    if preferences is None:
+        return Q()
+
+    today = date.today()
+    q = Q(**{
+        f'{prefix}birth_date__lte': today - relativedelta(years=preferences.min_age_accepted),
+        f'{prefix}birth_date__gt': today - relativedelta(years=preferences.max_age_accepted + 1),
+    })
+
+    if preferences.gender_accepted is not None:
+        q &= Q(**{f'{prefix}gender': preferences.gender_accepted})
+    if preferences.is_couple_accepted is False:
+        q &= Q(**{f'{prefix}is_couple': False})
+    if preferences.are_children_accepted is False:
+        q &= Q(**{f'{prefix}has_children': False})
+
+    q &= _get_value_accepted_q(f'{prefix}occupation_type', preferences.occupations_accepted, OccupationChoices)
+    q &= _get_value_accepted_q(f'{prefix}drinking_level', preferences.drinking_levels_accepted, DrinkingLevelChoices)
+    q &= _get_value_accepted_q(f'{prefix}bedtime_level', preferences.bedtime_levels_accepted, BedtimeLevelChoices)
+
+    # Smoking (nonsmokers have no smoking level or the no smoking one)
+    smokers_q = Q(**{
+        f'{prefix}smoking_level__gt': SmokingLevelChoices.NO_SMOKING,
+        f'{prefix}smoking_level__lte': preferences.max_smoking_level_accepted,
+    })
+    if preferences.are_nonsmokers_accepted:
+        smokers_q |= Q(**{f'{prefix}smoking_level__isnull': True}) | \
+                     Q(**{f'{prefix}smoking_level': SmokingLevelChoices.NO_SMOKING})
+    q &= smokers_q
+
+    if preferences.neighbourliness_level_accepted is not None:
+        q &= Q(**{f'{prefix}neighbourliness_level': preferences.neighbourliness_level_accepted})
+    if preferences.neatness_level_accepted is not None:
+        q &= Q(**{f'{prefix}neatness_level': preferences.neatness_level_accepted})
+    q &= _get_max_level_accepted_q(f'{prefix}guests_level', preferences.max_guests_level_accepted,
+                                   GuestsLevelChoices)
+    q &= _get_max_level_accepted_q(f'{prefix}parties_level', preferences.max_parties_level_accepted,
+                                   PartiesLevelChoices)
+
+    # Animals
+    for animal_accepted, has_animal in ANIMALS_ACCEPTED.items():
+        if not getattr(preferences, animal_accepted):
+            q &= Q(**{f'{prefix}{has_animal}': False})
+    if not preferences.are_other_animals_accepted:
+        q &= ~Exists(TaggedOtherAnimalItem.objects.filter(content_object=OuterRef(f'{prefix}pk')))
+
+    return q
+
+
+def get_accepting_q(about: UserProfileAbout, prefix: str = 'neighbor_preferences__') -> Q:
+    """Condition on candidates' neighbor preferences (by the prefix) to accept the given parameters"""
+    age = relativedelta(date.today(), about.birth_date).years
+    q = Q(**{f'{prefix}min_age_accepted__lte': age, f'{prefix}max_age_accepted__gte': age})
+
+    q &= _get_null_or_equal_q(f'{prefix}gender_accepted', about.gender)
+    if about.is_couple:
+        q &= _get_null_or_equal_q(f'{prefix}is_couple_accepted', True)
+    if about.has_children:
+        q &= _get_null_or_equal_q(f'{prefix}are_children_accepted', True)
+
+    q &= _get_values_accept_q(f'{prefix}occupations_accepted', about.occupation_type, OccupationChoices)
+    q &= _get_values_accept_q(f'{prefix}drinking_levels_accepted', about.drinking_level, DrinkingLevelChoices)
+    q &= _get_values_accept_q(f'{prefix}bedtime_levels_accepted', about.bedtime_level, BedtimeLevelChoices)
+
+    # Smoking
+    if about.smoking_level and about.smoking_level > SmokingLevelChoices.NO_SMOKING:
+        q &= Q(**{f'{prefix}max_smoking_level_accepted__gte': about.smoking_level})
+    else:
+        q &= Q(**{f'{prefix}are_nonsmokers_accepted': True})
+
+    q &= _get_null_or_equal_q(f'{prefix}neighbourliness_level_accepted', about.neighbourliness_level)
+    q &= _get_null_or_equal_q(f'{prefix}neatness_level_accepted', about.neatness_level)
+    q &= _get_max_level_accepts_q(f'{prefix}max_guests_level_accepted', about.guests_level, GuestsLevelChoices)
+    q &= _get_max_level_accepts_q(f'{prefix}max_parties_level_accepted', about.parties_level, PartiesLevelChoices)
+
+    # Animals
+    for animal_accepted, has_animal in ANIMALS_ACCEPTED.items():
+        if getattr(about, has_animal):
+            q &= Q(**{f'{prefix}{animal_accepted}': True})
+    if about.other_animals_tags.exists():
+        q &= Q(**{f'{prefix}are_other_animals_accepted': True})
+
+    # Candidates without preferences accept anyone
+    return Q(**{f'{prefix.removesuffix("__")}__isnull': True}) | q
+
+
+def _get_overlapping_rent_preferences(hierarchies, prefixes) -> QuerySet[PreferredLocationPrefix]:
+    """
+    IDs of rent preferences with a location inside one of the hierarchies (it has the hierarchy as a prefix)
+    or containing one of them (its own hierarchy is one of their prefixes).
+    """
+    return PreferredLocationPrefix.objects.filter(
+        Q(prefix__in=hierarchies) | Q(prefix__in=prefixes, is_location=True)
+    ).values('related_preferences')
+
+
+# Candidates' parameters against given preferences
+def _get_value_accepted_q(field: str, values_accepted: list[int] | None, choices: type[models.IntegerChoices]) -> Q:
+    if not values_accepted or set(values_accepted) >= set(choices.values):
+        return Q()
+    return Q(**{f'{field}__in': values_accepted})
+
+
+def _get_max_level_accepted_q(field: str, max_level_accepted: int | None, choices: type[models.IntegerChoices]) -> Q:
+    if max_level_accepted is None or max_level_accepted >= max(choices.values):
+        return Q()
+    return Q(**{f'{field}__lte': max_level_accepted})
+
+
+# Candidates' preferences against given parameters
+def _get_null_or_equal_q(field: str, value) -> Q:
+    q = Q(**{f'{field}__isnull': True})
+    if value is not None:
+        q |= Q(**{field: value})
+    return q
+
+
+def _get_values_accept_q(field: str, value: int | None, choices: type[models.IntegerChoices]) -> Q:
+    values_accepted = [value] if value is not None else choices.values
+    return Q(**{f'{field}__isnull': True}) | Q(**{field: []}) | Q(**{f'{field}__contains': values_accepted})
+
+
+def _get_max_level_accepts_q(field: str, level: int | None, choices: type[models.IntegerChoices]) -> Q:
+    max_level_accepted = level if level is not None else max(choices.values)
+    return Q(**{f'{field}__isnull': True}) | Q(**{f'{field}__gte': max_level_accepted})
+
+
+class CompatibilityVectors:
+    """Compatibility codes, birth dates and accepted ages of candidate profiles as NumPy arrays"""
+    def __init__(self, profile_ids: np.ndarray, attribute_codes: np.ndarray, acceptance_masks: np.ndarray,
+                 birth_dates: np.ndarray, min_ages_accepted: np.ndarray, max_ages_accepted: np.ndarray):
+        self.profile_ids = profile_ids
+        self.attribute_codes = attribute_codes
+        self.acceptance_masks = acceptance_masks
+        self.birth_dates = birth_dates
+        self.min_ages_accepted = min_ages_accepted
+        self.max_ages_accepted = max_ages_accepted
+
+    @classmethod
+    def load(cls, profiles: QuerySet[UserProfile] = None) -> 'CompatibilityVectors':
+        """Loads the visible profiles with parameters (or the given ones) in a single query"""
+        if profiles is None:
+            profiles = UserProfile.objects.filter(get_visible_q(), about__isnull=False)
+        rows = list(profiles.values_list(
+            'pk',
+            'about__compatibility_code',
+            'neighbor_preferences__compatibility_mask',
+            'about__birth_date',
+            'neighbor_preferences__min_age_accepted',
+            'neighbor_preferences__max_age_accepted',
+        ))
+        profile_ids, codes, masks, birth_dates, min_ages, max_ages = list(zip(*rows)) or [()] * 6
+
+        # Profiles without neighbor preferences accept anyone
+        masks = [ACCEPT_ALL_MASK if mask is None else mask for mask in masks]
+        min_ages = [0 if age is None else age for age in min_ages]
+        max_ages = [np.iinfo(np.int16).max if age is None else age for age in max_ages]
+
+        return cls(
+            profile_ids=np.array(profile_ids, dtype=np.int64),
+            attribute_codes=np.array(codes, dtype=np.uint64),
+            acceptance_masks=np.array(masks, dtype=np.uint64),
+            birth_dates=np.array(birth_dates, dtype='datetime64[D]'),
+            min_ages_accepted=np.array(min_ages, dtype=np.int16),
+            max_ages_accepted=np.array(max_ages, dtype=np.int16),
+        )
+
+    def __len__(self):
+        return len(self.profile_ids)
+
+    def find_matching_profile_ids(self, profile: UserProfile) -> np.ndarray:
+        """IDs of the loaded profiles (other than the given one) that the profile accepts and that accept it"""
+        about = profile.about
+        preferences = profile.neighbor_preferences if hasattr(profile, 'neighbor_preferences') else None
+        acceptance_mask = preferences.compatibility_mask if preferences else ACCEPT_ALL_MASK
+
+        # Candidates' parameters against the preferences, then the parameters against candidates' preferences
+        matches = (self.attribute_codes & np.uint64(~acceptance_mask & ACCEPT_ALL_MASK)) == 0
+        matches &= (np.uint64(about.compatibility_code) & ~self.acceptance_masks) == 0
+
+        if preferences:
+            today = date.today()
+            matches &= self.birth_dates <= np.datetime64(today - relativedelta(years=preferences.min_age_accepted))
+            matches &= self.birth_dates > np.datetime64(today - relativedelta(years=preferences.max_age_accepted + 1))
+        age = relativedelta(date.today(), about.birth_date).years
+        matches &= (self.min_ages_accepted <= age) & (self.max_ages_accepted >= age)
+
+        matches &= self.profile_ids != profile.pk
+        return self.profile_ids[matches]
@@ -0,0 +1,29 @@
+# Generated by Django 5.0.1 on 2026-10-17 22:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shallwe_profile', '0005_remove_interesttag_profile_about_interest_tag_name_constraint_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='photo_verification_status',
+            field=models.CharField(choices=[('verified', 'Verified'), ('pending', 'Pending'), ('rejected', 'Rejected')], default='verified', max_length=8),
+        ),
+        migrations.CreateModel(
+            name='PhotoVerificationJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('photo_name', models.CharField()),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('profile', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='photo_verification_job', to='shallwe_profile.userprofile')),
+            ],
+        ),
+    ]
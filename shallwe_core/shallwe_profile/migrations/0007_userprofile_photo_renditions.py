@@ -0,0 +1,84 @@
+# Generated by Django 5.0.1 on 2026-10-17 22:29
+
+import io
+from pathlib import Path
+
+from PIL import Image
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import migrations, models
+from imagekit.processors import ResizeToFill
+
+
+# Miniatures (size, quality) as UserProfile.PHOTO_RENDITIONS had them when they were moved from imagekit's cache
+PHOTO_RENDITIONS = {
+    'photo_w540': (540, 90),
+    'photo_w192': (192, 80),
+    'photo_w64': (64, 80),
+}
+
+
+def make_renditions(photo) -> dict[str, ContentFile]:
+    # Frozen copy of the rendering at the time, so later changes to shallwe_photo don't affect this migration
+    photo.open('rb')
+    try:
+        with Image.open(photo) as image:
+            image.load()
+            resized_images = {field_name: ResizeToFill(size, size).process(image)
+                              for field_name, (size, _) in PHOTO_RENDITIONS.items()}
+    finally:
+        photo.close()
+
+    rendition_files = {}
+    for field_name, resized_image in resized_images.items():
+        buffer = io.BytesIO()
+        resized_image.save(buffer, format='WEBP', quality=PHOTO_RENDITIONS[field_name][1])
+        rendition_files[field_name] = ContentFile(buffer.getvalue())
+    return rendition_files
+
+
+def make_existing_photo_renditions(apps, schema_editor):
+    UserProfile = apps.get_model('shallwe_profile', 'UserProfile')
+
+    for profile in UserProfile.objects.exclude(photo_w768=''):
+        if not default_storage.exists(profile.photo_w768.name):
+            continue
+
+        photo_stem = Path(profile.photo_w768.name).stem
+        for field_name, rendition_file in make_renditions(profile.photo_w768).items():
+            rendition_name = f'{photo_stem}_w{PHOTO_RENDITIONS[field_name][0]}.webp'
+            getattr(profile, field_name).save(rendition_name, rendition_file, save=False)
+        profile.save(update_fields=list(PHOTO_RENDITIONS))
+
+        # Drop the miniatures cached by imagekit
+        imagekit_cache_dir = str(Path('CACHE/images') / Path(profile.photo_w768.name).with_suffix(''))
+        if default_storage.exists(imagekit_cache_dir):
+            for cached_file_name in default_storage.listdir(imagekit_cache_dir)[1]:
+                default_storage.delete(f'{imagekit_cache_dir}/{cached_file_name}')
+            default_storage.delete(imagekit_cache_dir)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shallwe_profile', '0006_userprofile_photo_verification'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='photo_w192',
+            field=models.ImageField(blank=True, editable=False, upload_to='profile-photos/'),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='photo_w540',
+            field=models.ImageField(blank=True, editable=False, upload_to='profile-photos/'),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='photo_w64',
+            field=models.ImageField(blank=True, editable=False, upload_to='profile-photos/'),
+        ),
+        migrations.RunPython(make_existing_photo_renditions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-17 22:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shallwe_profile', '0007_userprofile_photo_renditions'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='userprofile',
+            name='photo_w768',
+            field=models.ImageField(upload_to='profile-photos/'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.0.1 on 2026-10-17 22:38
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shallwe_profile', '0008_alter_userprofile_photo_w768'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='userprofileabout',
+            index=models.Index(fields=['birth_date'], name='profile-about-birth-date'),
+        ),
+        migrations.AddIndex(
+            model_name='userprofileneighborpreferences',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['occupations_accepted', 'drinking_levels_accepted', 'bedtime_levels_accepted'], name='neighbor-prefs-accepted-gin'),
+        ),
+    ]
@@ -0,0 +1,135 @@
+# Generated by Django 5.0.1 on 2026-10-17 22:42
+
+from django.db import migrations, models
+
+
+# Frozen copy of models/parameters/compatibility.py at the time, so its later changes don't affect this migration
+NO_SMOKING = 1
+BOOLEAN_VALUES = (False, True)
+COMPATIBILITY_TRAITS = {
+    'gender': (1, 2),
+    'is_couple': BOOLEAN_VALUES,
+    'has_children': BOOLEAN_VALUES,
+    'occupation_type': (None, 1, 2, 3, 4),
+    'drinking_level': (None, 1, 2, 3, 4),
+    'smoking_level': (1, 2, 3, 4),
+    'neighbourliness_level': (None, 1, 2, 3),
+    'guests_level': (None, 1, 2, 3),
+    'parties_level': (None, 1, 2, 3),
+    'bedtime_level': (None, 1, 2, 3, 4),
+    'neatness_level': (None, 1, 2, 3),
+    'has_cats': BOOLEAN_VALUES,
+    'has_dogs': BOOLEAN_VALUES,
+    'has_reptiles': BOOLEAN_VALUES,
+    'has_birds': BOOLEAN_VALUES,
+    'has_other_animals': BOOLEAN_VALUES,
+}
+
+
+def _get_trait_bits() -> dict[str, dict]:
+    trait_bits, position = {}, 0
+    for trait, values in COMPATIBILITY_TRAITS.items():
+        trait_bits[trait] = {value: 1 << (position + i) for i, value in enumerate(values)}
+        position += len(values)
+    return trait_bits
+
+
+TRAIT_BITS = _get_trait_bits()
+
+
+def get_attributes_code(about, has_other_animals: bool) -> int:
+    code = 0
+    for trait in COMPATIBILITY_TRAITS:
+        if trait == 'has_other_animals':
+            value = has_other_animals
+        elif trait == 'smoking_level':
+            value = about.smoking_level or NO_SMOKING
+        else:
+            value = getattr(about, trait)
+        code |= TRAIT_BITS[trait][value]
+    return code
+
+
+def get_acceptance_mask(preferences) -> int:
+    def get_values_mask(trait, values):
+        mask_ = 0
+        for value in values:
+            mask_ |= TRAIT_BITS[trait][value]
+        return mask_
+
+    def get_any_mask(trait):
+        return get_values_mask(trait, COMPATIBILITY_TRAITS[trait])
+
+    def get_equal_mask(trait, value_accepted):
+        return get_any_mask(trait) if value_accepted is None else get_values_mask(trait, [value_accepted])
+
+    def get_boolean_mask(trait, is_true_accepted):
+        return get_any_mask(trait) if is_true_accepted else get_values_mask(trait, [False])
+
+    def get_items_mask(trait, values_accepted):
+        if not values_accepted or set(values_accepted) >= set(COMPATIBILITY_TRAITS[trait]) - {None}:
+            return get_any_mask(trait)
+        return get_values_mask(trait, values_accepted)
+
+    def get_max_level_mask(trait, max_level_accepted):
+        specified_values = [value for value in COMPATIBILITY_TRAITS[trait] if value is not None]
+        if max_level_accepted is None or max_level_accepted >= max(specified_values):
+            return get_any_mask(trait)
+        return get_values_mask(trait, [value for value in specified_values if value <= max_level_accepted])
+
+    mask = 0
+    mask |= get_equal_mask('gender', preferences.gender_accepted)
+    mask |= get_boolean_mask('is_couple', preferences.is_couple_accepted is not False)
+    mask |= get_boolean_mask('has_children', preferences.are_children_accepted is not False)
+    mask |= get_items_mask('occupation_type', preferences.occupations_accepted)
+    mask |= get_items_mask('drinking_level', preferences.drinking_levels_accepted)
+    mask |= get_items_mask('bedtime_level', preferences.bedtime_levels_accepted)
+    mask |= get_values_mask('smoking_level', range(NO_SMOKING + 1, preferences.max_smoking_level_accepted + 1))
+    if preferences.are_nonsmokers_accepted:
+        mask |= TRAIT_BITS['smoking_level'][NO_SMOKING]
+    mask |= get_equal_mask('neighbourliness_level', preferences.neighbourliness_level_accepted)
+    mask |= get_equal_mask('neatness_level', preferences.neatness_level_accepted)
+    mask |= get_max_level_mask('guests_level', preferences.max_guests_level_accepted)
+    mask |= get_max_level_mask('parties_level', preferences.max_parties_level_accepted)
+    mask |= get_boolean_mask('has_cats', preferences.are_cats_accepted)
+    mask |= get_boolean_mask('has_dogs', preferences.are_dogs_accepted)
+    mask |= get_boolean_mask('has_reptiles', preferences.are_reptiles_accepted)
+    mask |= get_boolean_mask('has_birds', preferences.are_birds_accepted)
+    mask |= get_boolean_mask('has_other_animals', preferences.are_other_animals_accepted)
+    return mask
+
+
+def set_existing_compatibility_codes(apps, schema_editor):
+    UserProfileAbout = apps.get_model('shallwe_profile', 'UserProfileAbout')
+    UserProfileNeighborPreferences = apps.get_model('shallwe_profile', 'UserProfileNeighborPreferences')
+    TaggedOtherAnimalItem = apps.get_model('shallwe_profile', 'TaggedOtherAnimalItem')
+
+    abouts_with_other_animals = set(TaggedOtherAnimalItem.objects.values_list('content_object_id', flat=True))
+    for about in UserProfileAbout.objects.all():
+        about.compatibility_code = get_attributes_code(about, about.pk in abouts_with_other_animals)
+        about.save(update_fields=['compatibility_code'])
+
+    for preferences in UserProfileNeighborPreferences.objects.all():
+        preferences.compatibility_mask = get_acceptance_mask(preferences)
+        preferences.save(update_fields=['compatibility_mask'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shallwe_profile', '0009_matching_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofileabout',
+            name='compatibility_code',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='userprofileneighborpreferences',
+            name='compatibility_mask',
+            field=models.BigIntegerField(default=2251799813685247, editable=False),
+        ),
+        migrations.RunPython(set_existing_compatibility_codes, migrations.RunPython.noop),
+    ]
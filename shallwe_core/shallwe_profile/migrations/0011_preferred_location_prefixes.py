@@ -0,0 +1,53 @@
+# Generated by Django 5.0.1 on 2026-10-17 22:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Hierarchy lengths of Location.get_hierarchy_prefixes at the time: whole country, region, city or PPL, city district
+HIERARCHY_LENGTHS = (2, 4, 12, 14)
+
+
+def get_hierarchy_prefixes(hierarchy: str) -> list[str]:
+    return [hierarchy[:length] for length in HIERARCHY_LENGTHS if length <= len(hierarchy)]
+
+
+def index_existing_preferred_locations(apps, schema_editor):
+    UserProfilePreferredLocations = apps.get_model('shallwe_profile', 'UserProfilePreferredLocations')
+    PreferredLocationPrefix = apps.get_model('shallwe_profile', 'PreferredLocationPrefix')
+
+    location_prefixes = {}  # (preferences id, prefix): is location
+    for preferences_id, hierarchy in UserProfilePreferredLocations.objects.values_list('related_preferences_id',
+                                                                                       'location__hierarchy'):
+        for prefix in get_hierarchy_prefixes(hierarchy):
+            is_location = prefix == hierarchy or location_prefixes.get((preferences_id, prefix), False)
+            location_prefixes[(preferences_id, prefix)] = is_location
+
+    PreferredLocationPrefix.objects.bulk_create(
+        PreferredLocationPrefix(related_preferences_id=preferences_id, prefix=prefix, is_location=is_location)
+        for (preferences_id, prefix), is_location in location_prefixes.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shallwe_profile', '0010_compatibility_codes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PreferredLocationPrefix',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('prefix', models.CharField(max_length=14)),
+                ('is_location', models.BooleanField()),
+                ('related_preferences', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='location_prefixes', to='shallwe_profile.userprofilerentpreferences')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['prefix', 'is_location', 'related_preferences'], name='rent-prefs-location-prefix')],
+                'unique_together': {('related_preferences', 'prefix')},
+            },
+        ),
+        migrations.RunPython(index_existing_preferred_locations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.0.1 on 2026-10-17 22:51
+
+import django.contrib.postgres.fields.ranges
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shallwe_profile', '0011_preferred_location_prefixes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofilerentpreferences',
+            name='budget_range',
+            field=models.GeneratedField(db_persist=True, expression=models.Func(models.F('min_budget'), models.F('max_budget'), models.Value('[]'), function='int4range', output_field=django.contrib.postgres.fields.ranges.IntegerRangeField()), output_field=django.contrib.postgres.fields.ranges.IntegerRangeField()),
+        ),
+        migrations.AddField(
+            model_name='userprofilerentpreferences',
+            name='rent_duration_range',
+            field=models.GeneratedField(db_persist=True, expression=models.Func(models.F('min_rent_duration_level'), models.F('max_rent_duration_level'), models.Value('[]'), function='int4range', output_field=django.contrib.postgres.fields.ranges.IntegerRangeField()), output_field=django.contrib.postgres.fields.ranges.IntegerRangeField()),
+        ),
+        migrations.AddIndex(
+            model_name='userprofilerentpreferences',
+            index=django.contrib.postgres.indexes.GistIndex(fields=['budget_range'], name='rent-prefs-budget-range-gist'),
+        ),
+        migrations.AddIndex(
+            model_name='userprofilerentpreferences',
+            index=django.contrib.postgres.indexes.GistIndex(fields=['rent_duration_range'], name='rent-prefs-duration-range-gist'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.0.1 on 2026-10-17 22:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shallwe_profile', '0012_rent_preferences_ranges'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfileMatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.PositiveSmallIntegerField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('matched_profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='shallwe_profile.userprofile')),
+                ('profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='matches', to='shallwe_profile.userprofile')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['profile', '-score'], name='profile-match-score')],
+                'unique_together': {('profile', 'matched_profile')},
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.1 on 2026-10-17 23:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shallwe_profile', '0013_profile_matches'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='photoverificationjob',
+            name='status',
+            field=models.CharField(choices=[('queued', 'Queued'), ('running', 'Running')], default='queued', max_length=7),
+        ),
+        migrations.AlterField(
+            model_name='userprofile',
+            name='photo_verification_status',
+            field=models.CharField(choices=[('verified', 'Verified'), ('pending', 'Pending'), ('rejected', 'Rejected'), ('failed', 'Failed')], default='verified', max_length=8),
+        ),
+    ]
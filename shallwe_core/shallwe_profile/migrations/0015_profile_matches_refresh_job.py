@@ -0,0 +1,23 @@
+# Generated by Django 5.0.1 on 2026-10-17 23:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shallwe_profile', '0014_photo_verification_job_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfileMatchesRefreshJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running')], default='queued', max_length=7)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('profile', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='matches_refresh_job', to='shallwe_profile.userprofile')),
+            ],
+        ),
+    ]
@@ -1,2 +1,3 @@
-from .profile import UserProfile
+from .profile import UserProfile, PhotoVerificationJob
 from .parameters import *
+from .match import ProfileMatch, ProfileMatchesRefreshJob
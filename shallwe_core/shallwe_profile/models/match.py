@@ -0,0 +1,41 @@
+from django.db import models
+
+from .profile import UserProfile
+
+
+class ProfileMatch(models.Model):
+    """Materialized match of two mutually compatible profiles, refreshed on profile changes (see matches.py).\n
+    Stored once per direction, so the matches of a profile are read by a single index lookup on profile"""
+
+    profile = models.ForeignKey(UserProfile, on_delete=models.CASCADE, null=False, related_name='matches')
+    matched_profile = models.ForeignKey(UserProfile, on_delete=models.CASCADE, null=False, related_name='+')
+
+    score = models.PositiveSmallIntegerField(null=False)  # 0-100, the same both directions
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('profile', 'matched_profile')
+        indexes = [
+            models.Index(fields=['profile', '-score'], name='profile-match-score'),
+        ]
+
+    def __str__(self):
+        return f'{self.__class__.__name__}(ProfileID: {self.profile_id}, MatchedID: {self.matched_profile_id})' \
+               f' - [{self.score}]'
+
+
+class ProfileMatchesRefreshJob(models.Model):
+    """Queued refresh of the stored matches of a profile, processed by the refresh_profile_matches --queued command"""
+
+    class StatusChoices(models.TextChoices):
+        QUEUED = 'queued', 'Queued'
+        RUNNING = 'running', 'Running'  # Claimed by a worker (at updated_at)
+
+    profile = models.OneToOneField(UserProfile, on_delete=models.CASCADE, null=False,
+                                   related_name='matches_refresh_job')
+
+    status = models.CharField(choices=StatusChoices.choices, max_length=7, null=False, default=StatusChoices.QUEUED)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.__class__.__name__}(ProfileID: {self.profile_id}) - [{self.status}]'
@@ -1,7 +1,8 @@
 from .choices import RoomSharingChoices, RentDurationChoices, GenderChoices, OccupationChoices, GuestsLevelChoices, \
     BedtimeLevelChoices, DrinkingLevelChoices, PartiesLevelChoices, SmokingLevelChoices, NeighbourlinessLevelChoices, \
     NeatnessLevelChoices
-from .rent import UserProfileRentPreferences, UserProfilePreferredLocations, OverlappingLocationsError
+from .rent import UserProfileRentPreferences, UserProfilePreferredLocations, PreferredLocationPrefix, \
+    OverlappingLocationsError
 from .about import UserProfileAbout, InterestTag, OtherAnimalTag, InterestsCountError, OtherAnimalsCountError, \
     UserTooYoungError, UserTooOldError
 from .neighbor import UserProfileNeighborPreferences, NotUniqueAcceptedItemsError
@@ -10,6 +10,7 @@ from taggit.models import TagBase, TaggedItemBase
 
 from .choices import GenderChoices, SmokingLevelChoices, NeighbourlinessLevelChoices, GuestsLevelChoices, \
     PartiesLevelChoices, NeatnessLevelChoices, OccupationChoices, DrinkingLevelChoices, BedtimeLevelChoices
+from .compatibility import get_attributes_code
 from .. import UserProfile
 
 
@@ -159,6 +160,9 @@ class UserProfileAbout(models.Model):
     interests_tags = TaggableManager(through=TaggedInterestItem)
     bio = models.CharField(null=True, blank=True, max_length=1024)
 
+    # Packed parameters for in-memory compatibility screening (see compatibility.py), kept up to date on save
+    compatibility_code = models.BigIntegerField(null=False, default=0, editable=False)
+
     class Meta:
         constraints = [
             models.CheckConstraint(
@@ -184,6 +188,9 @@ class UserProfileAbout(models.Model):
                                         'or smoking_level >1 and at least one of smoking types is True'
             ),
         ]
+        indexes = [
+            models.Index(fields=['birth_date'], name='profile-about-birth-date'),  # Age ranges in matching
+        ]
 
     def __str__(self):
         obj_string = f'{self.__class__.__name__}({str(self.user_profile)})'
@@ -191,8 +198,16 @@ class UserProfileAbout(models.Model):
 
     def save(self, *args, **kwargs):
         self._check_birth_date_valid()
+        self.compatibility_code = get_attributes_code(self, bool(self.pk) and self.other_animals_tags.exists())
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'compatibility_code'}
         super().save(*args, **kwargs)
 
+    def update_compatibility_code(self):
+        """Re-packs the parameters, for the changes not going through save (like other animals tags)"""
+        self.compatibility_code = get_attributes_code(self, self.other_animals_tags.exists())
+        UserProfileAbout.objects.filter(pk=self.pk).update(compatibility_code=self.compatibility_code)
+
     # Todo: unify with similar logic in Rent (setting locations)
     def _set_tags(self, field_name: str, amount_err_class: type, tags: Collection[str] = None):
         tags_manager = getattr(self, field_name)
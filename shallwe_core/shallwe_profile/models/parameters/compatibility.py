@@ -0,0 +1,128 @@
+"""
+Compatibility codes: profile parameters and neighbor preferences packed into single integers.
+
+Every trait (enum or boolean parameter) owns a bit per its possible value, an unspecified value included.
+The attributes code of UserProfileAbout sets exactly one bit per trait (the one of its value),
+the acceptance mask of UserProfileNeighborPreferences sets the bits of every value it accepts.
+So the parameters satisfy the preferences (age aside) if and only if attributes_code & ~acceptance_mask == 0.
+
+The preferences are read the same way as in shallwe_profile/matching.py.
+"""
+
+from typing import Iterable
+
+from .choices import GenderChoices, OccupationChoices, DrinkingLevelChoices, SmokingLevelChoices, \
+    NeighbourlinessLevelChoices, GuestsLevelChoices, PartiesLevelChoices, BedtimeLevelChoices, NeatnessLevelChoices
+
+
+BOOLEAN_VALUES = (False, True)
+
+# Trait: its possible values (None for unspecified). Nonsmokers have the no smoking level, specified or not.
+COMPATIBILITY_TRAITS = {
+    'gender': tuple(GenderChoices.values),
+    'is_couple': BOOLEAN_VALUES,
+    'has_children': BOOLEAN_VALUES,
+    'occupation_type': (None, *OccupationChoices.values),
+    'drinking_level': (None, *DrinkingLevelChoices.values),
+    'smoking_level': tuple(SmokingLevelChoices.values),
+    'neighbourliness_level': (None, *NeighbourlinessLevelChoices.values),
+    'guests_level': (None, *GuestsLevelChoices.values),
+    'parties_level': (None, *PartiesLevelChoices.values),
+    'bedtime_level': (None, *BedtimeLevelChoices.values),
+    'neatness_level': (None, *NeatnessLevelChoices.values),
+    'has_cats': BOOLEAN_VALUES,
+    'has_dogs': BOOLEAN_VALUES,
+    'has_reptiles': BOOLEAN_VALUES,
+    'has_birds': BOOLEAN_VALUES,
+    'has_other_animals': BOOLEAN_VALUES,
+}
+
+def _get_trait_bits() -> dict[str, dict]:
+    trait_bits, position = {}, 0
+    for trait, values in COMPATIBILITY_TRAITS.items():
+        trait_bits[trait] = {value: 1 << (position + i) for i, value in enumerate(values)}
+        position += len(values)
+    return trait_bits
+
+
+_TRAIT_BITS = _get_trait_bits()  # Trait: {value: its bit}
+
+ACCEPT_ALL_MASK = (1 << sum(map(len, COMPATIBILITY_TRAITS.values()))) - 1  # Also for profiles with no preferences
+
+
+def get_attributes_code(about, has_other_animals: bool) -> int:
+    """Packs the parameters of UserProfileAbout (other animals tags are checked by the caller)"""
+    code = 0
+    for trait in COMPATIBILITY_TRAITS:
+        if trait == 'has_other_animals':
+            value = has_other_animals
+        elif trait == 'smoking_level':
+            value = about.smoking_level or SmokingLevelChoices.NO_SMOKING
+        else:
+            value = getattr(about, trait)
+        code |= _TRAIT_BITS[trait][value]
+    return code
+
+
+def get_acceptance_mask(preferences) -> int:
+    """Packs the values accepted by UserProfileNeighborPreferences"""
+    mask = 0
+
+    mask |= _get_equal_mask('gender', preferences.gender_accepted)
+    mask |= _get_boolean_mask('is_couple', preferences.is_couple_accepted is not False)
+    mask |= _get_boolean_mask('has_children', preferences.are_children_accepted is not False)
+
+    mask |= _get_items_mask('occupation_type', preferences.occupations_accepted)
+    mask |= _get_items_mask('drinking_level', preferences.drinking_levels_accepted)
+    mask |= _get_items_mask('bedtime_level', preferences.bedtime_levels_accepted)
+
+    smoking_levels_accepted = range(SmokingLevelChoices.NO_SMOKING + 1, preferences.max_smoking_level_accepted + 1)
+    mask |= _get_values_mask('smoking_level', smoking_levels_accepted)
+    if preferences.are_nonsmokers_accepted:
+        mask |= _TRAIT_BITS['smoking_level'][SmokingLevelChoices.NO_SMOKING]
+
+    mask |= _get_equal_mask('neighbourliness_level', preferences.neighbourliness_level_accepted)
+    mask |= _get_equal_mask('neatness_level', preferences.neatness_level_accepted)
+    mask |= _get_max_level_mask('guests_level', preferences.max_guests_level_accepted)
+    mask |= _get_max_level_mask('parties_level', preferences.max_parties_level_accepted)
+
+    mask |= _get_boolean_mask('has_cats', preferences.are_cats_accepted)
+    mask |= _get_boolean_mask('has_dogs', preferences.are_dogs_accepted)
+    mask |= _get_boolean_mask('has_reptiles', preferences.are_reptiles_accepted)
+    mask |= _get_boolean_mask('has_birds', preferences.are_birds_accepted)
+    mask |= _get_boolean_mask('has_other_animals', preferences.are_other_animals_accepted)
+
+    return mask
+
+
+def _get_values_mask(trait: str, values: Iterable) -> int:
+    mask = 0
+    for value in values:
+        mask |= _TRAIT_BITS[trait][value]
+    return mask
+
+
+def _get_any_mask(trait: str) -> int:
+    return _get_values_mask(trait, COMPATIBILITY_TRAITS[trait])
+
+
+def _get_equal_mask(trait: str, value_accepted) -> int:
+    return _get_any_mask(trait) if value_accepted is None else _get_values_mask(trait, [value_accepted])
+
+
+def _get_boolean_mask(trait: str, is_true_accepted: bool) -> int:
+    return _get_any_mask(trait) if is_true_accepted else _get_values_mask(trait, [False])
+
+
+def _get_items_mask(trait: str, values_accepted: list[int] | None) -> int:
+    specified_values = set(COMPATIBILITY_TRAITS[trait]) - {None}
+    if not values_accepted or set(values_accepted) >= specified_values:
+        return _get_any_mask(trait)
+    return _get_values_mask(trait, values_accepted)
+
+
+def _get_max_level_mask(trait: str, max_level_accepted: int | None) -> int:
+    specified_values = [value for value in COMPATIBILITY_TRAITS[trait] if value is not None]
+    if max_level_accepted is None or max_level_accepted >= max(specified_values):
+        return _get_any_mask(trait)
+    return _get_values_mask(trait, [value for value in specified_values if value <= max_level_accepted])
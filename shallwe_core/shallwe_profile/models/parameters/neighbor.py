@@ -1,11 +1,13 @@
 from typing import Collection
 
 from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
 from django.core.exceptions import ValidationError
 from django.db import models
 
 from .choices import GenderChoices, SmokingLevelChoices, NeighbourlinessLevelChoices, GuestsLevelChoices, \
     PartiesLevelChoices, NeatnessLevelChoices, OccupationChoices, DrinkingLevelChoices, BedtimeLevelChoices
+from .compatibility import ACCEPT_ALL_MASK, get_acceptance_mask
 from .. import UserProfile
 
 
@@ -87,6 +89,9 @@ class UserProfileNeighborPreferences(models.Model):
     are_other_animals_accepted = models.BooleanField(null=False, default=True)
     # ------
 
+    # Packed accepted values for in-memory compatibility screening (see compatibility.py), kept up to date on save
+    compatibility_mask = models.BigIntegerField(null=False, default=ACCEPT_ALL_MASK, editable=False)
+
     class Meta:
         constraints = [
             # Age
@@ -113,11 +118,24 @@ class UserProfileNeighborPreferences(models.Model):
                                         ' nonsmokers must be accepted'
             )
         ]
+        indexes = [
+            # Accepted items containment in matching
+            GinIndex(
+                fields=['occupations_accepted', 'drinking_levels_accepted', 'bedtime_levels_accepted'],
+                name='neighbor-prefs-accepted-gin'
+            ),
+        ]
 
     def __str__(self):
         obj_string = f'{self.__class__.__name__}({str(self.user_profile)})'
         return obj_string
 
+    def save(self, *args, **kwargs):
+        self.compatibility_mask = get_acceptance_mask(self)
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'compatibility_mask'}
+        super().save(*args, **kwargs)
+
     def _set_list_values(self, field_name: str, values: Collection[models.IntegerChoices] = None):
         if values:
             if len(set(values)) != len(values):
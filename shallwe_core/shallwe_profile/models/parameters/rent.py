@@ -1,8 +1,13 @@
+from typing import Iterable
+
 from django.conf import settings
+from django.contrib.postgres.fields import IntegerRangeField
+from django.contrib.postgres.indexes import GistIndex
 from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
-from django.db import models, IntegrityError
-from django.db.models import QuerySet
+from django.db import models, IntegrityError, transaction
+from django.db.models import QuerySet, F, Func, Value
+from psycopg2.extras import NumericRange
 
 from shallwe_locations.models import Location
 from shallwe_util.efficiency import time_measure
@@ -35,6 +40,23 @@ def validate_locations_no_overlap(locations: QuerySet[Location]):
                                                     f" {other_new_location.hierarchy}")
 
 
+def get_inclusive_range(lower_field: str, upper_field: str) -> Func:
+    return Func(F(lower_field), F(upper_field), Value('[]'), function='int4range', output_field=IntegerRangeField())
+
+
+class UserProfileRentPreferencesQuerySet(models.QuerySet):
+    def overlapping_budget(self, min_budget: int, max_budget: int) -> 'UserProfileRentPreferencesQuerySet':
+        """Preferences with a budget range sharing at least one value with the given one (bounds included)"""
+        return self.filter(budget_range__overlap=NumericRange(min_budget, max_budget, '[]'))
+
+    def overlapping_rent_duration(self, min_rent_duration_level: int,
+                                  max_rent_duration_level: int) -> 'UserProfileRentPreferencesQuerySet':
+        """Preferences with a rent duration range sharing at least one level with the given one (bounds included)"""
+        return self.filter(
+            rent_duration_range__overlap=NumericRange(min_rent_duration_level, max_rent_duration_level, '[]')
+        )
+
+
 class UserProfileRentPreferences(models.Model):
     """**Caution:**\n
     Do NOT use locations manager to manage locations.\n
@@ -89,6 +111,20 @@ class UserProfileRentPreferences(models.Model):
         related_name='preferred_in'
     )
 
+    # Ranges of the above bounds, computed by the database, for overlap lookups served by their GiST indexes
+    budget_range = models.GeneratedField(
+        expression=get_inclusive_range('min_budget', 'max_budget'),
+        output_field=IntegerRangeField(),
+        db_persist=True
+    )
+    rent_duration_range = models.GeneratedField(
+        expression=get_inclusive_range('min_rent_duration_level', 'max_rent_duration_level'),
+        output_field=IntegerRangeField(),
+        db_persist=True
+    )
+
+    objects = UserProfileRentPreferencesQuerySet.as_manager()
+
     class Meta:
         constraints = [
             # Budget
@@ -114,6 +150,10 @@ class UserProfileRentPreferences(models.Model):
                 violation_error_message='max_rent_duration_level should be greater than or equal to min_rent_duration_level.'
             ),
         ]
+        indexes = [
+            GistIndex(fields=['budget_range'], name='rent-prefs-budget-range-gist'),
+            GistIndex(fields=['rent_duration_range'], name='rent-prefs-duration-range-gist'),
+        ]
 
     def __str__(self):
         obj_string = f'{self.__class__.__name__}({str(self.user_profile)})'
@@ -155,6 +195,13 @@ class UserProfileRentPreferences(models.Model):
     def _set_default_location(self):
         self.locations.set((Location.get_all_country(), ))
 
+    def update_location_prefixes(self):
+        """Rebuilds the location prefixes index entries of the preferences from their current locations"""
+        preferred_locations = [(self.pk, hierarchy) for hierarchy in self.locations.values_list('hierarchy', flat=True)]
+        with transaction.atomic():
+            self.location_prefixes.all().delete()
+            PreferredLocationPrefix.objects.bulk_create(PreferredLocationPrefix.get_index_entries(preferred_locations))
+
 
 class UserProfilePreferredLocations(models.Model):
     related_preferences = models.ForeignKey(UserProfileRentPreferences, on_delete=models.CASCADE, null=False)
@@ -164,6 +211,55 @@ class UserProfilePreferredLocations(models.Model):
         unique_together = ('related_preferences', 'location')
 
 
+class PreferredLocationPrefix(models.Model):
+    """Inverted index of preferred locations: every hierarchy prefix of the preferred locations
+    (their own hierarchies included) with the rent preferences referring to it.\n
+    Preferred locations of two profiles overlap if one's location hierarchy is a prefix of the other's one
+    (the same location or one containing the other), so overlapping preferences are found by prefix lookups only.\n
+    Kept up to date on preferred locations change and rebuilt after locations update (see signals.py)"""
+
+    related_preferences = models.ForeignKey(
+        UserProfileRentPreferences,
+        on_delete=models.CASCADE,
+        null=False,
+        related_name='location_prefixes'
+    )
+    prefix = models.CharField(max_length=14, null=False)
+    is_location = models.BooleanField(null=False)  # The prefix is the hierarchy of a preferred location itself
+
+    class Meta:
+        unique_together = ('related_preferences', 'prefix')
+        indexes = [
+            models.Index(fields=['prefix', 'is_location', 'related_preferences'], name='rent-prefs-location-prefix'),
+        ]
+
+    REBUILD_BATCH_SIZE = 1000
+
+    @classmethod
+    def get_index_entries(cls, preferred_locations: Iterable[tuple[int, str]]) -> list['PreferredLocationPrefix']:
+        """Index entries of the preferred locations given as (rent preferences id, location hierarchy)"""
+        location_prefixes = {}  # (preferences id, prefix): is location
+        for preferences_id, hierarchy in preferred_locations:
+            for prefix in Location.get_hierarchy_prefixes(hierarchy):
+                is_location = prefix == hierarchy or location_prefixes.get((preferences_id, prefix), False)
+                location_prefixes[(preferences_id, prefix)] = is_location
+
+        return [
+            cls(related_preferences_id=preferences_id, prefix=prefix, is_location=is_location)
+            for (preferences_id, prefix), is_location in location_prefixes.items()
+        ]
+
+    @classmethod
+    def rebuild(cls):
+        """Rebuilds the whole index at once (in a constant number of queries), e.g. after locations update"""
+        with transaction.atomic():
+            preferred_locations = UserProfilePreferredLocations.objects.values_list('related_preferences_id',
+                                                                                    'location__hierarchy')
+            index_entries = cls.get_index_entries(preferred_locations)
+            cls.objects.all().delete()
+            cls.objects.bulk_create(index_entries, batch_size=cls.REBUILD_BATCH_SIZE)
+
+
 if settings.SHALLWE_GLOBAL_ENV_MODE == 'DEV':
     validate_locations_no_overlap = time_measure(
         validate_locations_no_overlap
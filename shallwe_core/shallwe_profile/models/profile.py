@@ -5,37 +5,40 @@ from django.contrib.auth.models import User
 from django.core.files.storage import default_storage
 from django.db import models
 
-from imagekit.models import ImageSpecField, ProcessedImageField
-from imagekit.processors import ResizeToFill
+from shallwe_photo.renditions import Rendition, make_renditions
 
 
 class UserProfile(models.Model):
+    # Photo fields with their renditions of the uploaded photo
+    PHOTO_RENDITIONS = {
+        'photo_w768': Rendition(size=768, quality=80),
+        'photo_w540': Rendition(size=540, quality=90),
+        'photo_w192': Rendition(size=192, quality=80),
+        'photo_w64': Rendition(size=64, quality=80),
+    }
+
+    class PhotoVerificationStatusChoices(models.TextChoices):
+        VERIFIED = 'verified', 'Verified'
+        PENDING = 'pending', 'Pending'    # Face check is queued (see PROFILE_PHOTO_ASYNC_VERIFICATION)
+        REJECTED = 'rejected', 'Rejected'
+        FAILED = 'failed', 'Failed'       # Queued face check kept failing (see PROFILE_PHOTO_VERIFICATION_MAX_ATTEMPTS)
+
     user = models.OneToOneField(User, on_delete=models.CASCADE, null=False, related_name='profile')
     is_hidden = models.BooleanField(null=False, default=False)
     name = models.CharField(null=False)
 
-    # Highest resolution photo
-    photo_w768 = ProcessedImageField(upload_to='profile-photos/',
-                                     null=False,
-                                     processors=[ResizeToFill(768, 768)],
-                                     format='WEBP',
-                                     options={'quality': 80})
-
-    # Dynamically generated photo miniatures
-    photo_w540 = ImageSpecField(source='photo_w768',
-                                processors=[ResizeToFill(540, 540)],
-                                format='WEBP',
-                                options={'quality': 90})
-
-    photo_w192 = ImageSpecField(source='photo_w768',
-                                processors=[ResizeToFill(192, 192)],
-                                format='WEBP',
-                                options={'quality': 80})
-
-    photo_w64 = ImageSpecField(source='photo_w768',
-                               processors=[ResizeToFill(64, 64)],
-                               format='WEBP',
-                               options={'quality': 80})
+    # Highest resolution photo (the upload is resized to it on save, see PHOTO_RENDITIONS)
+    photo_w768 = models.ImageField(upload_to='profile-photos/', null=False)
+
+    # Photo miniatures, made along with photo_w768 whenever it changes
+    photo_w540 = models.ImageField(upload_to='profile-photos/', blank=True, editable=False)
+    photo_w192 = models.ImageField(upload_to='profile-photos/', blank=True, editable=False)
+    photo_w64 = models.ImageField(upload_to='profile-photos/', blank=True, editable=False)
+
+    photo_verification_status = models.CharField(choices=PhotoVerificationStatusChoices.choices,
+                                                 max_length=8,
+                                                 null=False,
+                                                 default=PhotoVerificationStatusChoices.VERIFIED)
 
     # Related groups of parameters
     # about
@@ -55,6 +58,11 @@ class UserProfile(models.Model):
             ),
         ]
 
+    @property
+    def is_visible(self) -> bool:
+        """Whether the profile is shown to other users (see matching.get_visible_q)"""
+        return not self.is_hidden and self.photo_verification_status == self.PhotoVerificationStatusChoices.VERIFIED
+
     def __str__(self):
         # String start
         obj_string = f'{self.__class__.__name__}(SelfID: {self.pk}, UserID: {self.user.pk}) - [{self.name}'
@@ -69,7 +77,8 @@ class UserProfile(models.Model):
         return obj_string
 
     def save(self, *args, **kwargs):
-        self._set_old_photos_for_deletion_if_changed()
+        if self._set_old_photos_for_deletion_if_changed() and self.photo_w768:
+            self._make_photo_renditions()
         super().save(*args, **kwargs)
 
     def delete(self, *args, **kwargs):
@@ -77,16 +86,36 @@ class UserProfile(models.Model):
         self._set_photo_paths_to_remove(self)
         super().delete(*args, **kwargs)
 
-    def _set_old_photos_for_deletion_if_changed(self):
-        # Store old photo paths for post-signal usage if changing the photo
-        if self.pk is not None:
-            previous_instance = UserProfile.objects.get(pk=self.pk)
-            if self.photo_w768 != previous_instance.photo_w768:
-                self._set_photo_paths_to_remove(previous_instance)
+    def _set_old_photos_for_deletion_if_changed(self) -> bool:
+        # Store old photo paths for post-signal usage if changing the photo, returns whether the photo is new
+        if self.pk is None:
+            return True
+        previous_instance = UserProfile.objects.get(pk=self.pk)
+        if self.photo_w768 != previous_instance.photo_w768:
+            self._set_photo_paths_to_remove(previous_instance)
+            return True
+        return False
+
+    def _make_photo_renditions(self):
+        # All the sizes are made from a single decode of the uploaded photo and encoded at once
+        renditions = self.PHOTO_RENDITIONS
+        if self.photo_w768._committed:  # Set to an already stored photo, so only the miniatures are made
+            renditions = {field_name: rendition for field_name, rendition in renditions.items()
+                          if field_name != 'photo_w768'}
+        rendition_files = make_renditions(self.photo_w768, renditions)
+
+        if 'photo_w768' in rendition_files:
+            photo_name = f'{Path(self.photo_w768.name).stem}.{renditions["photo_w768"].format.lower()}'
+            self.photo_w768.save(photo_name, rendition_files.pop('photo_w768'), save=False)
+
+        photo_stem = Path(self.photo_w768.name).stem
+        for field_name, rendition_file in rendition_files.items():
+            rendition = renditions[field_name]
+            rendition_name = f'{photo_stem}_w{rendition.size}.{rendition.format.lower()}'
+            getattr(self, field_name).save(rendition_name, rendition_file, save=False)
 
     def _set_photo_paths_to_remove(self, from_instance: 'UserProfile'):
         self._photo_paths_to_remove = {
-            'cache_dir': Path(from_instance.photo_w540.name).parent,
             'photo_w768': from_instance.photo_w768.name,
             'photo_w540': from_instance.photo_w540.name,
             'photo_w192': from_instance.photo_w192.name,
@@ -97,10 +126,29 @@ class UserProfile(models.Model):
         # Precaution if
         if self._photo_paths_to_remove:
             # Delete previous files
-            default_storage.delete(self._photo_paths_to_remove['photo_w768'])
-            default_storage.delete(self._photo_paths_to_remove['photo_w540'])
-            default_storage.delete(self._photo_paths_to_remove['photo_w192'])
-            default_storage.delete(self._photo_paths_to_remove['photo_w64'])
-            default_storage.delete(self._photo_paths_to_remove['cache_dir'])
+            for photo_path in self._photo_paths_to_remove.values():
+                if photo_path:
+                    default_storage.delete(photo_path)
             # Precaution reset
             self._photo_paths_to_remove = {}
+
+
+class PhotoVerificationJob(models.Model):
+    """Queued face check of a profile photo, processed by the verify_profile_photos command"""
+
+    class StatusChoices(models.TextChoices):
+        QUEUED = 'queued', 'Queued'
+        RUNNING = 'running', 'Running'  # Claimed by a worker (at updated_at)
+
+    profile = models.OneToOneField(UserProfile, on_delete=models.CASCADE, null=False,
+                                   related_name='photo_verification_job')
+
+    # Photo to check (the profile photo may be changed again while the job waits)
+    photo_name = models.CharField(null=False)
+
+    status = models.CharField(choices=StatusChoices.choices, max_length=7, null=False, default=StatusChoices.QUEUED)
+    attempts = models.PositiveSmallIntegerField(null=False, default=0)  # Claims by workers so far
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.__class__.__name__}(ProfileID: {self.profile_id}) - [{self.photo_name}]'
@@ -1,6 +1,7 @@
 import re
 from collections import OrderedDict
 
+from django.conf import settings
 from rest_framework import serializers
 from rest_framework.serializers import ModelSerializer
 
@@ -8,7 +9,9 @@ from shallwe_core.settings import PROFILE_NAME_REGEX
 from shallwe_photo import formatcheck, facecheck
 from . import UserProfileRentPreferencesCreateUpdateSerializer, UserProfileRentPreferencesReadSerializer
 from .about import UserProfileAboutCreateUpdateSerializer, UserProfileAboutReadSerializer
+from ..matches import enqueue_matches_refresh
 from ..models import UserProfile
+from ..verification import enqueue_photo_verification
 
 
 class UserProfileBaseCreateUpdateSerializer(serializers.ModelSerializer):
@@ -29,13 +32,29 @@ class UserProfileBaseCreateUpdateSerializer(serializers.ModelSerializer):
         except formatcheck.ImageValidationError as e:
             raise serializers.ValidationError(str(e))
 
-        # Check face
-        is_face_detected = facecheck.check_face_minified_temp(cleaned_photo)
-        if not is_face_detected:
-            raise serializers.ValidationError('No face found on image')
+        # Check face (unless it's going to be checked in background after saving)
+        if not settings.PROFILE_PHOTO_ASYNC_VERIFICATION:
+            is_face_detected = facecheck.check_face_minified(cleaned_photo)
+            if not is_face_detected:
+                raise serializers.ValidationError('No face found on image')
 
         return photo
 
+    def save(self, **kwargs):
+        if 'photo_w768' not in self.validated_data:
+            return super().save(**kwargs)
+
+        # A new photo is either verified already or is queued for verification
+        is_async = settings.PROFILE_PHOTO_ASYNC_VERIFICATION
+        kwargs['photo_verification_status'] = UserProfile.PhotoVerificationStatusChoices.PENDING \
+            if is_async \
+            else UserProfile.PhotoVerificationStatusChoices.VERIFIED
+        profile = super().save(**kwargs)
+
+        if is_async:
+            enqueue_photo_verification(profile)
+        return profile
+
     def validate_name(self, name):
         if not re.match(PROFILE_NAME_REGEX, name):
             raise serializers.ValidationError(
@@ -58,7 +77,8 @@ class UserProfileBaseReadSerializer(serializers.ModelSerializer):
             'photo_w768',
             'photo_w540',
             'photo_w192',
-            'photo_w64'
+            'photo_w64',
+            'photo_verification_status'
         ]
 
     @property
@@ -204,12 +224,18 @@ class UserProfileWithParametersCreateUpdateSerializer:
                 profile = self.instance
                 profile_arg = {}
 
+            are_parameters_saved = False
             for attr_group_name in ('about', 'rent_preferences'):
                 if serializer := self._get_serializer(attr_group_name):
                     serializer.save(
                         **profile_arg,
                         **kwargs.get(attr_group_name, {})
                     )
+                    are_parameters_saved = True
+
+            # Only the matches of this profile may have changed, they are refreshed in background
+            if are_parameters_saved:
+                enqueue_matches_refresh(profile)
 
             return profile
         else:
@@ -110,7 +110,7 @@ class UserProfileRentPreferencesReadSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = UserProfileRentPreferences
-        exclude = ['id', 'user_profile']
+        exclude = ['id', 'user_profile', 'budget_range', 'rent_duration_range']
 
     def _group_locations_by_category(self, locations_repr):
         serialized_locations = OrderedDict([
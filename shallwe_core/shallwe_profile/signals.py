@@ -1,7 +1,14 @@
-from django.db.models.signals import post_save, post_delete
-from django.dispatch import receiver
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver, Signal
 
-from .models import UserProfile
+from shallwe_locations.signals import locations_updated
+from .models import UserProfile, UserProfileAbout, UserProfileRentPreferences, UserProfilePreferredLocations, \
+    PreferredLocationPrefix
+from .models.parameters.about import TaggedOtherAnimalItem
+
+
+# Sent by refresh_profile_matches (see matches.py) with the counts of match rows created, deleted and recomputed
+matches_refreshed = Signal()
 
 
 # Profile
@@ -10,3 +17,33 @@ def handle_user_profile_save(sender, instance, **kwargs):
     # Check if the instance has stored old photo paths and delete old photos if so
     if hasattr(instance, '_photo_paths_to_remove') and instance._photo_paths_to_remove:
         instance._delete_old_photos()
+
+
+# About
+@receiver(m2m_changed, sender=TaggedOtherAnimalItem)
+def handle_other_animals_tags_change(sender, instance, action, **kwargs):
+    # Having other animals is a part of the compatibility code, which is otherwise only updated on save
+    if action in ('post_add', 'post_remove', 'post_clear') and isinstance(instance, UserProfileAbout):
+        instance.update_compatibility_code()
+
+
+# Rent preferences
+@receiver(m2m_changed, sender=UserProfilePreferredLocations)
+def handle_preferred_locations_change(sender, instance, action, reverse, pk_set, **kwargs):
+    # Keep the location prefixes index in line with the preferred locations
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        instance.update_location_prefixes()
+    elif pk_set:
+        for rent_preferences in UserProfileRentPreferences.objects.filter(pk__in=pk_set):
+            rent_preferences.update_location_prefixes()
+    else:  # Cleared from the location side, the affected preferences are unknown
+        PreferredLocationPrefix.rebuild()
+
+
+@receiver(locations_updated)
+def handle_locations_update(sender, **kwargs):
+    # Hierarchy codes may change with locations updates, deleted locations are dropped from preferences by cascade.
+    # Rebuilt once per update rather than per changed Location row
+    PreferredLocationPrefix.rebuild()
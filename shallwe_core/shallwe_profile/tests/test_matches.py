@@ -0,0 +1,218 @@
+from datetime import date, timedelta
+from io import StringIO
+from unittest.mock import Mock, patch
+
+from dateutil.relativedelta import relativedelta
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from ..matches import refresh_profile_matches, get_profile_matches, get_match_score, MatchesRefresh, NEUTRAL_SCORE, \
+    enqueue_matches_refresh, process_next_matches_refresh
+from ..models import UserProfile, UserProfileAbout, UserProfileRentPreferences, UserProfileNeighborPreferences, \
+    ProfileMatch, ProfileMatchesRefreshJob, GenderChoices, GuestsLevelChoices, NeatnessLevelChoices
+from ..serializers import UserProfileWithParametersCreateUpdateSerializer
+from ..signals import matches_refreshed
+
+
+class ProfileMatchesTestCase(TestCase):
+    fixtures = ['locations_mini_fixture.json']
+
+    def setUp(self):
+        self.refreshes = []
+        self.refresh_receiver = Mock(side_effect=lambda **kwargs: self.refreshes.append(kwargs['refresh']))
+        matches_refreshed.connect(self.refresh_receiver)
+
+    def tearDown(self):
+        matches_refreshed.disconnect(self.refresh_receiver)
+
+    def _create_profile(self, username: str, min_budget: int = 1000, max_budget: int = 2000,
+                        preferences: dict = None, **about_kwargs) -> UserProfile:
+        user = User.objects.create_user(username=username, password='testpassword')
+        profile = UserProfile.objects.create(user=user, name='ТестЮзер')
+
+        about_defaults = {
+            'birth_date': date.today() - relativedelta(years=30),
+            'gender': GenderChoices.MALE,
+            'is_couple': False,
+            'has_children': False,
+        }
+        about_defaults.update(about_kwargs)
+        UserProfileAbout.objects.create(user_profile=profile, **about_defaults)
+        UserProfileRentPreferences.objects.create(user_profile=profile, min_budget=min_budget, max_budget=max_budget)
+        if preferences is not None:
+            UserProfileNeighborPreferences.objects.create(user_profile=profile, **preferences)
+        return profile
+
+    def _get_stored_pairs(self) -> set[tuple[int, int, int]]:
+        return set(ProfileMatch.objects.values_list('profile_id', 'matched_profile_id', 'score'))
+
+    def test_refresh_stores_both_directions(self):
+        profile = self._create_profile('testuser', guests_level=GuestsLevelChoices.OFTEN)
+        close = self._create_profile('close', guests_level=GuestsLevelChoices.OFTEN)
+        far = self._create_profile('far', guests_level=GuestsLevelChoices.NEVER)
+        self._create_profile('rejecting', preferences={'gender_accepted': GenderChoices.FEMALE})
+        self._create_profile('other_budget', min_budget=5000, max_budget=6000)
+
+        self.assertEqual(refresh_profile_matches(profile), MatchesRefresh(created=4, deleted=0, recomputed=0))
+        self.assertEqual(self._get_stored_pairs(), {
+            (profile.pk, close.pk, 100), (close.pk, profile.pk, 100),
+            (profile.pk, far.pk, 50), (far.pk, profile.pk, 50),
+        })
+        self.assertEqual(self.refreshes, [MatchesRefresh(created=4, deleted=0, recomputed=0)])
+
+        with self.assertNumQueries(1):
+            self.assertEqual([match.matched_profile for match in get_profile_matches(profile)], [close, far])
+        with self.assertNumQueries(1):
+            self.assertEqual([match.matched_profile for match in get_profile_matches(close)], [profile])
+
+        UserProfile.objects.filter(pk=close.pk).update(is_hidden=True)
+        self.assertEqual([match.matched_profile for match in get_profile_matches(profile)], [far])
+
+    def test_refresh_only_changes_profile_matches(self):
+        profile = self._create_profile('testuser')
+        other = self._create_profile('other')
+        third = self._create_profile('third')
+        for each_profile in (profile, other, third):
+            refresh_profile_matches(each_profile)
+        self.assertEqual(len(self._get_stored_pairs()), 6)
+
+        UserProfileAbout.objects.filter(user_profile=profile).update(gender=GenderChoices.FEMALE)
+        UserProfileNeighborPreferences.objects.create(user_profile=other, gender_accepted=GenderChoices.MALE)
+        self.assertEqual(refresh_profile_matches(profile), MatchesRefresh(created=0, deleted=2, recomputed=2))
+
+        # Other and third still match, though other's preferences changed since, as only the profile was refreshed
+        self.assertEqual({(profile_id, matched_id) for profile_id, matched_id, _ in self._get_stored_pairs()}, {
+            (profile.pk, third.pk), (third.pk, profile.pk),
+            (other.pk, third.pk), (third.pk, other.pk),
+        })
+
+    def test_hidden_profile_matches_deleted(self):
+        profile = self._create_profile('testuser')
+        self._create_profile('other')
+        refresh_profile_matches(profile)
+
+        UserProfile.objects.filter(pk=profile.pk).update(is_hidden=True)
+        self.assertEqual(refresh_profile_matches(profile), MatchesRefresh(created=0, deleted=2, recomputed=0))
+        self.assertFalse(ProfileMatch.objects.exists())
+
+    def test_unverified_photo_not_shown(self):
+        profile = self._create_profile('testuser')
+        other = self._create_profile('other')
+        refresh_profile_matches(profile)
+
+        for status in (UserProfile.PhotoVerificationStatusChoices.PENDING,
+                       UserProfile.PhotoVerificationStatusChoices.REJECTED):
+            UserProfile.objects.filter(pk=other.pk).update(photo_verification_status=status)
+            # Not read by others even before the matches are refreshed
+            self.assertFalse(get_profile_matches(profile).exists())
+            self.assertEqual([match.matched_profile for match in get_profile_matches(other)], [profile])
+
+        self.assertEqual(refresh_profile_matches(other), MatchesRefresh(created=0, deleted=2, recomputed=0))
+        self.assertEqual(refresh_profile_matches(profile), MatchesRefresh(created=0, deleted=0, recomputed=0))
+
+        UserProfile.objects.filter(pk=other.pk).update(
+            photo_verification_status=UserProfile.PhotoVerificationStatusChoices.VERIFIED
+        )
+        self.assertEqual(refresh_profile_matches(other), MatchesRefresh(created=2, deleted=0, recomputed=0))
+        self.assertEqual([match.matched_profile for match in get_profile_matches(profile)], [other])
+
+    def test_serializer_save_queues_refresh(self):
+        profile = self._create_profile('testuser', neatness_level=NeatnessLevelChoices.HIGH)
+        other = self._create_profile('other', neatness_level=NeatnessLevelChoices.HIGH)
+
+        serializer = UserProfileWithParametersCreateUpdateSerializer(instance=profile, partial=True, data={
+            'about': {'neatness_level': NeatnessLevelChoices.LOW}
+        })
+        self.assertTrue(serializer.is_valid())
+        serializer.save()
+
+        # Not refreshed within the request
+        self.assertFalse(ProfileMatch.objects.exists())
+        self.assertTrue(process_next_matches_refresh())
+        self.assertFalse(process_next_matches_refresh())
+        self.assertEqual(self._get_stored_pairs(), {(profile.pk, other.pk, 50), (other.pk, profile.pk, 50)})
+
+        serializer = UserProfileWithParametersCreateUpdateSerializer(instance=profile, partial=True, data={
+            'rent_preferences': {'min_budget': 5000, 'max_budget': 6000}
+        })
+        self.assertTrue(serializer.is_valid())
+        serializer.save()
+        self.assertTrue(process_next_matches_refresh())
+        self.assertFalse(ProfileMatch.objects.exists())
+        self.assertEqual(self.refreshes, [MatchesRefresh(created=2, deleted=0, recomputed=0),
+                                          MatchesRefresh(created=0, deleted=2, recomputed=0)])
+
+    def test_refresh_queued_again_while_running_kept(self):
+        profile = self._create_profile('testuser')
+        self._create_profile('other')
+        enqueue_matches_refresh(profile)
+
+        def refresh_while_profile_changes(profile_):
+            enqueue_matches_refresh(profile_)
+            return refresh_profile_matches(profile_)
+
+        with patch('shallwe_profile.matches.refresh_profile_matches', side_effect=refresh_while_profile_changes):
+            self.assertTrue(process_next_matches_refresh())
+        self.assertEqual(ProfileMatchesRefreshJob.objects.get().status, ProfileMatchesRefreshJob.StatusChoices.QUEUED)
+
+        self.assertTrue(process_next_matches_refresh())
+        self.assertFalse(ProfileMatchesRefreshJob.objects.exists())
+        self.assertEqual(len(self.refreshes), 2)
+
+    @override_settings(PROFILE_MATCHES_REFRESH_TIMEOUT=60)
+    def test_abandoned_refresh_claimed_again(self):
+        profile = self._create_profile('testuser')
+        self._create_profile('other')
+        jobs = ProfileMatchesRefreshJob.objects.filter(pk=enqueue_matches_refresh(profile).pk)
+
+        # Claimed by a worker that is still refreshing
+        jobs.update(status=ProfileMatchesRefreshJob.StatusChoices.RUNNING)
+        self.assertFalse(process_next_matches_refresh())
+
+        # Claimed by a worker that died
+        jobs.update(updated_at=timezone.now() - timedelta(seconds=61))
+        self.assertTrue(process_next_matches_refresh())
+        self.assertEqual(ProfileMatch.objects.count(), 2)
+
+    def test_match_score(self):
+        profile = self._create_profile('testuser', min_budget=1000, max_budget=3000)
+        other = self._create_profile('other', min_budget=2000, max_budget=6000,
+                                     guests_level=GuestsLevelChoices.RARELY)
+        profile.about.set_interests_tags(['кіно', 'книги'])
+        other.about.set_interests_tags(['кіно', 'музика', 'спорт'])
+
+        # Budget: 1000 shared of 2000 (the narrower), interests: 1 shared of 4, guests level isn't specified by both
+        self.assertEqual(get_match_score(profile, other), round(100 * (0.5 + 0.25) / 2))
+
+        UserProfileAbout.objects.filter(user_profile=profile).update(guests_level=GuestsLevelChoices.OFTEN)
+        profile.refresh_from_db()
+        profile.about.refresh_from_db()
+        self.assertEqual(get_match_score(profile, other), round(100 * (0.5 + 0.25 + 0.5) / 3))
+
+        UserProfileRentPreferences.objects.filter(user_profile__in=[profile, other]).delete()
+        profile, other = UserProfile.objects.get(pk=profile.pk), UserProfile.objects.get(pk=other.pk)
+        other.about.set_interests_tags([])
+        UserProfileAbout.objects.filter(user_profile=other).update(guests_level=None)
+        self.assertEqual(get_match_score(profile, other), NEUTRAL_SCORE)
+
+    def test_refresh_command(self):
+        self._create_profile('testuser')
+        self._create_profile('other')
+
+        stdout = StringIO()
+        call_command('refresh_profile_matches', stdout=stdout)
+        self.assertEqual(ProfileMatch.objects.count(), 2)
+        self.assertIn('Match rows created: 2, deleted: 0, recomputed: 2', stdout.getvalue())
+
+    def test_queue_worker_command(self):
+        profile = self._create_profile('testuser')
+        self._create_profile('other')
+        enqueue_matches_refresh(profile)
+
+        stdout = StringIO()
+        call_command('refresh_profile_matches', queued=True, once=True, stdout=stdout)
+        self.assertEqual(ProfileMatch.objects.count(), 2)
+        self.assertFalse(ProfileMatchesRefreshJob.objects.exists())
+        self.assertIn('Matches refreshes processed: 1', stdout.getvalue())
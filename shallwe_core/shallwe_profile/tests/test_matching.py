@@ -0,0 +1,417 @@
+import random
+import time
+from datetime import date
+from unittest.mock import Mock
+
+import numpy as np
+from dateutil.relativedelta import relativedelta
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+
+from shallwe_locations.models import Location
+from shallwe_locations.signals import locations_updated
+from shallwe_util.tests import benchmark
+from ..admin import UserProfileAdmin
+from ..matching import find_matching_profiles, CompatibilityVectors, find_profiles_with_overlapping_locations
+from ..models import UserProfile, UserProfileAbout, UserProfileNeighborPreferences, UserProfileRentPreferences, \
+    UserProfilePreferredLocations, PreferredLocationPrefix, RentDurationChoices, GenderChoices, \
+    OccupationChoices, DrinkingLevelChoices, SmokingLevelChoices, GuestsLevelChoices, PartiesLevelChoices, \
+    NeighbourlinessLevelChoices, BedtimeLevelChoices, NeatnessLevelChoices
+from ..models.parameters.compatibility import ACCEPT_ALL_MASK
+
+
+class MatchingTestCase(TestCase):
+    def _create_profile(self, username: str, preferences: dict = None, is_hidden: bool = False,
+                        **about_kwargs) -> UserProfile:
+        user = User.objects.create_user(username=username, password='testpassword')
+        profile = UserProfile.objects.create(user=user, name='ТестЮзер', is_hidden=is_hidden)
+
+        about_defaults = {
+            'birth_date': date.today() - relativedelta(years=30),
+            'gender': GenderChoices.MALE,
+            'is_couple': False,
+            'has_children': False,
+        }
+        about_defaults.update(about_kwargs)
+        UserProfileAbout.objects.create(user_profile=profile, **about_defaults)
+        if preferences is not None:
+            UserProfileNeighborPreferences.objects.create(user_profile=profile, **preferences)
+
+        return UserProfile.objects.select_related('about', 'neighbor_preferences').get(pk=profile.pk)
+
+
+
+class RentPreferencesOverlapTestCase(MatchingTestCase):
+    fixtures = ['locations_medium_fixture.json']
+
+    def _create_located_profile(self, username: str, *location_names: str, **rent_kwargs) -> UserProfile:
+        profile = self._create_profile(username)
+        rent_defaults = {'min_budget': 1000, 'max_budget': 2000}
+        rent_defaults.update(rent_kwargs)
+        rent_preferences = UserProfileRentPreferences.objects.create(user_profile=profile, **rent_defaults)
+        if location_names:
+            rent_preferences.set_locations(Location.objects.filter(search_name__in=location_names))
+        return UserProfile.objects.select_related('about', 'rent_preferences').get(pk=profile.pk)
+
+    def test_prefixes_index_kept_up_to_date(self):
+        profile = self._create_located_profile('testuser')
+        prefixes = profile.rent_preferences.location_prefixes
+        self.assertQuerySetEqual(prefixes.values_list('prefix', 'is_location'), [('UA', True)])
+
+        profile.rent_preferences.set_locations(Location.objects.filter(search_name__in=['Вінниця-1', 'Вінниця-2']))
+        self.assertQuerySetEqual(prefixes.values_list('prefix', 'is_location'), [
+            ('UA', False), ('UA05', False), ('UA0501001001', False),
+            ('UA050100100101', True), ('UA050100100102', True),
+        ], ordered=False)
+
+        profile.rent_preferences.set_locations(None)
+        self.assertQuerySetEqual(prefixes.values_list('prefix', 'is_location'), [('UA', True)])
+
+    def test_prefixes_index_kept_up_to_date_in_admin(self):
+        profile = self._create_located_profile('testuser', 'Вінниця')
+        ppl = Location.objects.get(search_name='Полянка')
+        # Inline formsets save the preferred locations rows themselves
+        UserProfilePreferredLocations.objects.filter(related_preferences=profile.rent_preferences).update(location=ppl)
+
+        profile_admin = UserProfileAdmin(UserProfile, admin.site)
+        profile_admin.save_related(RequestFactory().post('/'), Mock(instance=profile), formsets=[], change=True)
+        self.assertQuerySetEqual(profile.rent_preferences.location_prefixes.filter(is_location=True).values_list(
+            'prefix', flat=True
+        ), [ppl.hierarchy])
+
+    def test_overlapping_locations(self):
+        city = self._create_located_profile('city', 'Вінниця')
+        district = self._create_located_profile('district', 'Вінниця-1')
+        other_district = self._create_located_profile('other_district', 'Вінниця-2')
+        ppl = self._create_located_profile('ppl', 'Полянка')
+        region = self._create_located_profile('region', 'Вінницька')
+        other_region = self._create_located_profile('other_region', 'АР Крим')
+        several = self._create_located_profile('several', 'Полянка', 'АР Крим')
+        whole_country = self._create_located_profile('whole_country')
+
+        for location_names, expected_profiles in (
+            (['Вінниця'], [city, district, other_district, region, whole_country]),
+            (['Вінниця-1'], [city, district, region, whole_country]),
+            (['Вінниця-1', 'Полянка'], [city, district, ppl, region, several, whole_country]),
+            (['АР Крим'], [other_region, several, whole_country]),
+            (['Вся Україна'], [city, district, other_district, ppl, region, other_region, several, whole_country]),
+        ):
+            locations = list(Location.objects.filter(search_name__in=location_names))
+            with self.assertNumQueries(1):
+                profiles = list(find_profiles_with_overlapping_locations(locations))
+            self.assertCountEqual(profiles, expected_profiles)
+
+        self.assertCountEqual(find_matching_profiles(district), [city, region, whole_country])
+        self.assertCountEqual(find_matching_profiles(several), [ppl, region, other_region, whole_country])
+
+    def test_overlapping_budget_and_rent_duration(self):
+        cheap = self._create_located_profile('cheap', min_budget=0, max_budget=1000)
+        middle = self._create_located_profile('middle', min_budget=1500, max_budget=1500,
+                                              min_rent_duration_level=RentDurationChoices.NEAR_6_MONTH,
+                                              max_rent_duration_level=RentDurationChoices.NEAR_YEAR)
+        expensive = self._create_located_profile('expensive', min_budget=5000, max_budget=9000,
+                                                 min_rent_duration_level=RentDurationChoices.GT_YEAR,
+                                                 max_rent_duration_level=RentDurationChoices.GT_YEAR)
+        rent_preferences = UserProfileRentPreferences.objects.all()
+
+        self.assertQuerySetEqual(rent_preferences.overlapping_budget(1000, 1500),
+                                 [cheap.rent_preferences, middle.rent_preferences], ordered=False)
+        self.assertQuerySetEqual(rent_preferences.overlapping_budget(1001, 1499), [])
+        self.assertQuerySetEqual(rent_preferences.overlapping_budget(9000, 10000), [expensive.rent_preferences])
+        self.assertQuerySetEqual(
+            rent_preferences.overlapping_rent_duration(RentDurationChoices.NEAR_YEAR, RentDurationChoices.GT_YEAR),
+            [cheap.rent_preferences, middle.rent_preferences, expensive.rent_preferences], ordered=False
+        )
+        self.assertQuerySetEqual(
+            rent_preferences.overlapping_budget(0, 2000).overlapping_rent_duration(RentDurationChoices.LT_3_MONTH,
+                                                                                   RentDurationChoices.NEAR_3_MONTH),
+            [cheap.rent_preferences]
+        )
+
+        self.assertCountEqual(find_matching_profiles(cheap), [])
+        self.assertCountEqual(find_matching_profiles(middle), [])
+        flexible = self._create_located_profile('flexible', min_budget=1000, max_budget=6000)
+        self.assertCountEqual(find_matching_profiles(flexible), [cheap, middle, expensive])
+        self.assertCountEqual(find_matching_profiles(middle), [flexible])
+
+    def test_index_rebuilt_on_locations_update(self):
+        profile = self._create_located_profile('testuser', 'Полянка')
+        PreferredLocationPrefix.objects.all().delete()
+
+        Location.objects.filter(search_name='Полянка').update(hierarchy='UA0501001003')
+        locations_updated.send(sender=self.__class__)
+        self.assertTrue(profile.rent_preferences.location_prefixes.filter(prefix='UA0501001003',
+                                                                          is_location=True).exists())
+
+    def test_index_rebuilt_at_once(self):
+        self._create_located_profile('testuser', 'Вінниця-1', 'Полянка')
+        with CaptureQueriesContext(connection) as queries:
+            PreferredLocationPrefix.rebuild()
+        index_entries = set(PreferredLocationPrefix.objects.values_list('related_preferences', 'prefix', 'is_location'))
+
+        for i in range(3):
+            self._create_located_profile(f'other{i}', 'Вінниця', 'АР Крим')
+        with self.assertNumQueries(len(queries)):
+            PreferredLocationPrefix.rebuild()
+        self.assertTrue(index_entries < set(
+            PreferredLocationPrefix.objects.values_list('related_preferences', 'prefix', 'is_location')
+        ))
+
+
+class FindMatchingProfilesTestCase(MatchingTestCase):
+    def setUp(self):
+        self.profile = self._create_profile('testuser')
+
+    def _set_preferences(self, profile: UserProfile, **preferences) -> UserProfile:
+        UserProfileNeighborPreferences.objects.filter(user_profile=profile).delete()
+        UserProfileNeighborPreferences.objects.create(user_profile=profile, **preferences)
+        return UserProfile.objects.select_related('about', 'neighbor_preferences').get(pk=profile.pk)
+
+    def _assert_matches(self, profile: UserProfile, expected_profiles: list[UserProfile]):
+        self.assertQuerySetEqual(find_matching_profiles(profile), expected_profiles, ordered=False)
+
+    def test_no_preferences_match_anyone_visible(self):
+        other = self._create_profile('other', preferences={})
+        self._create_profile('hidden', is_hidden=True)
+
+        self._assert_matches(self.profile, [other])
+        self._assert_matches(other, [self.profile])
+
+    def test_unverified_photos_not_matched(self):
+        other = self._create_profile('other')
+        for status in (UserProfile.PhotoVerificationStatusChoices.PENDING,
+                       UserProfile.PhotoVerificationStatusChoices.REJECTED):
+            UserProfile.objects.filter(pk=other.pk).update(photo_verification_status=status)
+            self._assert_matches(self.profile, [])
+            self.assertEqual(len(CompatibilityVectors.load()), 1)
+
+    def test_age_both_ways(self):
+        younger = self._create_profile('younger', birth_date=date.today() - relativedelta(years=20))
+        older = self._create_profile('older', preferences={'min_age_accepted': 40},
+                                     birth_date=date.today() - relativedelta(years=50))
+
+        # The older one doesn't accept the 30 years old profile
+        self._assert_matches(self.profile, [younger])
+
+        self.profile = self._set_preferences(self.profile, min_age_accepted=16, max_age_accepted=25)
+        self._assert_matches(self.profile, [younger])
+
+        self.profile = self._set_preferences(self.profile, min_age_accepted=30, max_age_accepted=130)
+        self._assert_matches(self.profile, [])
+
+    def test_gender_both_ways(self):
+        female = self._create_profile('female', gender=GenderChoices.FEMALE)
+        male_only = self._create_profile('male_only', preferences={'gender_accepted': GenderChoices.MALE},
+                                         gender=GenderChoices.FEMALE)
+        female_only = self._create_profile('female_only', preferences={'gender_accepted': GenderChoices.FEMALE},
+                                           gender=GenderChoices.FEMALE)
+
+        self._assert_matches(self.profile, [female, male_only])
+
+        self.profile = self._set_preferences(self.profile, gender_accepted=GenderChoices.MALE)
+        self._assert_matches(self.profile, [])
+
+    def test_accepted_items_both_ways(self):
+        student = self._create_profile('student', occupation_type=OccupationChoices.STUDENT)
+        unspecified = self._create_profile('unspecified')
+        students_only = self._create_profile('students_only', preferences={
+            'occupations_accepted': [OccupationChoices.STUDENT]
+        }, occupation_type=OccupationChoices.REMOTE)
+        all_accepted = self._create_profile('all_accepted', preferences={
+            'occupations_accepted': OccupationChoices.values
+        })
+
+        # The profile's occupation isn't specified, so only accepted by those accepting any
+        self._assert_matches(self.profile, [student, unspecified, all_accepted])
+
+        self.profile = self._set_preferences(self.profile, occupations_accepted=[OccupationChoices.STUDENT,
+                                                                                 OccupationChoices.REMOTE])
+        self._assert_matches(self.profile, [student])
+
+        UserProfileAbout.objects.filter(user_profile=self.profile).update(occupation_type=OccupationChoices.STUDENT)
+        self.profile = self._set_preferences(self.profile, occupations_accepted=[])
+        self._assert_matches(self.profile, [student, unspecified, students_only, all_accepted])
+
+    def test_drinking_levels_accepted(self):
+        drinking = self._create_profile('drinking', drinking_level=DrinkingLevelChoices.ALWAYS)
+        not_drinking = self._create_profile('not_drinking', drinking_level=DrinkingLevelChoices.NO_DRINKING)
+
+        self.profile = self._set_preferences(self.profile, drinking_levels_accepted=[DrinkingLevelChoices.NO_DRINKING])
+        self._assert_matches(self.profile, [not_drinking])
+
+        self.profile = self._set_preferences(self.profile, drinking_levels_accepted=DrinkingLevelChoices.values)
+        self._assert_matches(self.profile, [drinking, not_drinking])
+
+    def test_smoking_both_ways(self):
+        smoker_kwargs = {'smoking_level': SmokingLevelChoices.EVERYWHERE, 'smokes_cigs': True}
+        nonsmoker = self._create_profile('nonsmoker', smoking_level=SmokingLevelChoices.NO_SMOKING)
+        smoker = self._create_profile('smoker', **smoker_kwargs)
+        smokers_only = self._create_profile('smokers_only', preferences={'are_nonsmokers_accepted': False},
+                                            **smoker_kwargs)
+
+        self._assert_matches(self.profile, [nonsmoker, smoker])
+
+        self.profile = self._set_preferences(self.profile, max_smoking_level_accepted=SmokingLevelChoices.NO_SMOKING)
+        self._assert_matches(self.profile, [nonsmoker])
+
+        self.profile = self._set_preferences(self.profile, are_nonsmokers_accepted=False,
+                                             max_smoking_level_accepted=SmokingLevelChoices.EVERYWHERE)
+        self._assert_matches(self.profile, [smoker])
+
+    def test_guests_level_both_ways(self):
+        often = self._create_profile('often', guests_level=GuestsLevelChoices.OFTEN)
+        rarely_accepted = self._create_profile('rarely_accepted', preferences={
+            'max_guests_level_accepted': GuestsLevelChoices.RARELY
+        }, guests_level=GuestsLevelChoices.RARELY)
+
+        # Unspecified guests level is only accepted by those accepting any
+        self._assert_matches(self.profile, [often])
+        self.profile = self._set_preferences(self.profile, max_guests_level_accepted=GuestsLevelChoices.RARELY)
+        self._assert_matches(self.profile, [])
+
+        UserProfileAbout.objects.filter(user_profile=self.profile).update(guests_level=GuestsLevelChoices.NEVER)
+        self.profile = self._set_preferences(self.profile, max_guests_level_accepted=GuestsLevelChoices.RARELY)
+        self._assert_matches(self.profile, [rarely_accepted])
+
+    def test_animals_both_ways(self):
+        cat_owner = self._create_profile('cat_owner', has_cats=True)
+        other_animal_owner = self._create_profile('other_animal_owner')
+        other_animal_owner.about.set_other_animals_tags(['миша'])
+        no_cats = self._create_profile('no_cats', preferences={'are_cats_accepted': False})
+
+        self._assert_matches(self.profile, [cat_owner, other_animal_owner, no_cats])
+
+        self.profile = self._set_preferences(self.profile, are_cats_accepted=False, are_other_animals_accepted=False)
+        self._assert_matches(self.profile, [no_cats])
+
+        UserProfileAbout.objects.filter(user_profile=self.profile).update(has_cats=True)
+        self.profile = self._set_preferences(self.profile)
+        self._assert_matches(self.profile, [cat_owner, other_animal_owner])
+
+    def test_single_query(self):
+        for i in range(5):
+            self._create_profile(f'user{i}', preferences={'max_smoking_level_accepted': SmokingLevelChoices.ON_BALCONY})
+        self.profile = self._set_preferences(self.profile, are_other_animals_accepted=False)
+
+        candidates = find_matching_profiles(self.profile)
+        with self.assertNumQueries(1):
+            self.assertEqual(len(candidates), 5)
+
+
+class CompatibilityVectorsTestCase(MatchingTestCase):
+    def _get_random_about(self, rng: random.Random) -> dict:
+        smoking_level = rng.choice([None, *SmokingLevelChoices.values])
+        return {
+            'birth_date': date.today() - relativedelta(years=rng.randint(16, 80), days=rng.randint(0, 364)),
+            'gender': rng.choice(GenderChoices.values),
+            'is_couple': rng.random() < 0.3,
+            'has_children': rng.random() < 0.3,
+            'occupation_type': rng.choice([None, *OccupationChoices.values]),
+            'drinking_level': rng.choice([None, *DrinkingLevelChoices.values]),
+            'smoking_level': smoking_level,
+            'smokes_cigs': bool(smoking_level and smoking_level > SmokingLevelChoices.NO_SMOKING),
+            'neighbourliness_level': rng.choice([None, *NeighbourlinessLevelChoices.values]),
+            'guests_level': rng.choice([None, *GuestsLevelChoices.values]),
+            'parties_level': rng.choice([None, *PartiesLevelChoices.values]),
+            'bedtime_level': rng.choice([None, *BedtimeLevelChoices.values]),
+            'neatness_level': rng.choice([None, *NeatnessLevelChoices.values]),
+            'has_cats': rng.random() < 0.3,
+            'has_dogs': rng.random() < 0.3,
+        }
+
+    def _get_random_preferences(self, rng: random.Random) -> dict | None:
+        if rng.random() < 0.2:
+            return None
+        min_age_accepted = rng.randint(16, 50)
+        max_smoking_level_accepted = rng.choice(SmokingLevelChoices.values)
+        return {
+            'min_age_accepted': min_age_accepted,
+            'max_age_accepted': rng.randint(min_age_accepted, 130),
+            'gender_accepted': rng.choice([None, None, *GenderChoices.values]),
+            'is_couple_accepted': rng.choice([None, False, True]),
+            'are_children_accepted': rng.choice([None, False, True]),
+            'occupations_accepted': rng.sample(OccupationChoices.values, rng.randint(0, 2)),
+            'drinking_levels_accepted': rng.sample(DrinkingLevelChoices.values, rng.randint(0, 4)),
+            'max_smoking_level_accepted': max_smoking_level_accepted,
+            'are_nonsmokers_accepted': max_smoking_level_accepted == SmokingLevelChoices.NO_SMOKING
+                                       or rng.random() < 0.8,
+            'max_guests_level_accepted': rng.choice(GuestsLevelChoices.values),
+            'max_parties_level_accepted': rng.choice([None, *PartiesLevelChoices.values]),
+            'neatness_level_accepted': rng.choice([None, None, *NeatnessLevelChoices.values]),
+            'are_cats_accepted': rng.random() < 0.7,
+            'are_other_animals_accepted': rng.random() < 0.7,
+        }
+
+    def test_same_matches_as_query(self):
+        rng = random.Random(21)
+        profiles = []
+        for i in range(40):
+            profile = self._create_profile(f'user{i}', preferences=self._get_random_preferences(rng),
+                                           is_hidden=rng.random() < 0.1, **self._get_random_about(rng))
+            if rng.random() < 0.2:
+                profile.about.set_other_animals_tags(['миша'])
+            profiles.append(profile)
+
+        vectors = CompatibilityVectors.load()
+        self.assertEqual(len(vectors), UserProfile.objects.filter(is_hidden=False).count())
+
+        matches_count = 0
+        for profile in profiles:
+            profile = UserProfile.objects.select_related('about', 'neighbor_preferences').get(pk=profile.pk)
+            expected_ids = set(find_matching_profiles(profile).values_list('pk', flat=True))
+            self.assertEqual(set(vectors.find_matching_profile_ids(profile).tolist()), expected_ids)
+            matches_count += len(expected_ids)
+        self.assertGreater(matches_count, 0)
+
+    def test_codes_kept_up_to_date(self):
+        profile = self._create_profile('testuser', preferences={})
+        self.assertEqual(profile.neighbor_preferences.compatibility_mask, ACCEPT_ALL_MASK)
+        code = profile.about.compatibility_code
+
+        profile.about.set_other_animals_tags(['миша'])
+        profile.about.refresh_from_db()
+        self.assertNotEqual(profile.about.compatibility_code, code)
+        profile.about.set_other_animals_tags([])
+        profile.about.refresh_from_db()
+        self.assertEqual(profile.about.compatibility_code, code)
+
+        profile.about.has_cats = True
+        profile.about.save()
+        self.assertNotEqual(profile.about.compatibility_code, code)
+
+        profile.neighbor_preferences.are_cats_accepted = False
+        profile.neighbor_preferences.save()
+        self.assertNotEqual(profile.neighbor_preferences.compatibility_mask, ACCEPT_ALL_MASK)
+
+
+@benchmark
+class CompatibilityVectorsBenchmarkTest(MatchingTestCase):
+    CANDIDATES_COUNT = 1_000_000
+
+    def test_screening_million_candidates(self):
+        profile = self._create_profile('testuser', preferences={'max_smoking_level_accepted': 3})
+
+        rng = np.random.default_rng(22)
+        rejected_bits = np.left_shift(np.uint64(1), rng.integers(0, ACCEPT_ALL_MASK.bit_length(),
+                                                                    self.CANDIDATES_COUNT, dtype=np.uint64))
+        vectors = CompatibilityVectors(
+            profile_ids=np.arange(self.CANDIDATES_COUNT, dtype=np.int64) + profile.pk + 1,
+            attribute_codes=np.full(self.CANDIDATES_COUNT, profile.about.compatibility_code, dtype=np.uint64),
+            acceptance_masks=np.uint64(ACCEPT_ALL_MASK) & ~rejected_bits,
+            birth_dates=np.datetime64(date.today()) - rng.integers(16 * 366, 80 * 365, self.CANDIDATES_COUNT),
+            min_ages_accepted=rng.integers(16, 40, self.CANDIDATES_COUNT, dtype=np.int16),
+            max_ages_accepted=rng.integers(40, 130, self.CANDIDATES_COUNT, dtype=np.int16),
+        )
+
+        timings = []
+        for _ in range(5):
+            start = time.perf_counter()
+            matching_ids = vectors.find_matching_profile_ids(profile)
+            timings.append(time.perf_counter() - start)
+
+        self.assertGreater(len(matching_ids), 0)
+        self.assertLess(min(timings), 0.1, f'Compatibility screening of {self.CANDIDATES_COUNT} candidates '
+                                           f'took {min(timings) * 1000:.1f} ms')
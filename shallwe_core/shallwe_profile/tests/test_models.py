@@ -1,5 +1,7 @@
 from datetime import date
+from unittest.mock import patch
 
+from PIL import Image
 from dateutil.relativedelta import relativedelta
 from django.core.exceptions import ValidationError
 from django.core.files.storage import default_storage
@@ -100,6 +102,33 @@ class UserProfileTestCase(TestCase):
             self.assertFalse(default_storage.exists(path), f"File '{path}' still exists after profile deletion.")
 
 
+    def test_user_profile_photo_renditions(self):
+        with open(self.jpeg_file_path, 'rb') as jpg_file:
+            initial_uploaded_file = SimpleUploadedFile("valid-format.jpg", jpg_file.read(), content_type="image/jpeg")
+
+        profile = UserProfile.objects.create(user=self.user, name='ТестЮзер', photo_w768=initial_uploaded_file)
+
+        # Miniatures are stored right away
+        for field_name, expected_size in (('photo_w540', 540), ('photo_w192', 192), ('photo_w64', 64)):
+            photo = getattr(profile, field_name)
+            self.assertTrue(default_storage.exists(photo.name))
+            with default_storage.open(photo.name) as photo_file, Image.open(photo_file) as image:
+                self.assertEqual((image.format, image.size), ('WEBP', (expected_size, expected_size)))
+
+        # Saving without changing the photo keeps the miniatures, reading them involves no image work
+        initial_photo_names = [profile.photo_w540.name, profile.photo_w192.name, profile.photo_w64.name]
+        profile.name = 'Змінений'
+        profile.save()
+        with patch('PIL.Image.open') as image_open_mock:
+            profile = UserProfile.objects.get(pk=profile.pk)
+            self.assertEqual([profile.photo_w540.name, profile.photo_w192.name, profile.photo_w64.name],
+                             initial_photo_names)
+            self.assertTrue(profile.photo_w64.url)
+        image_open_mock.assert_not_called()
+
+        profile.delete()
+
+
 class UserProfileRentPreferencesTestCase(TestCase):
     fixtures = ['locations_mini_fixture.json']
 
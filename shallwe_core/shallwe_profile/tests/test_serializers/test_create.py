@@ -343,7 +343,7 @@ class UserProfileWithParametersSerializerCreateTestCase(TestCase):
         }
 
         with patch('shallwe_photo.formatcheck.clean_image', self.mock_clean_image), \
-                patch('shallwe_photo.facecheck.check_face_minified_temp', self.mock_check_face):
+                patch('shallwe_photo.facecheck.check_face_minified', self.mock_check_face):
             invalid_name_serializer = UserProfileWithParametersCreateUpdateSerializer(data=invalid_name_data)
             self.assertFalse(invalid_name_serializer.is_valid(), 'Invalid name should not pass validation')
 
@@ -375,7 +375,7 @@ class UserProfileWithParametersSerializerCreateTestCase(TestCase):
         }
 
         with patch('shallwe_photo.formatcheck.clean_image', self.mock_clean_image), \
-                patch('shallwe_photo.facecheck.check_face_minified_temp', self.mock_check_face):
+                patch('shallwe_photo.facecheck.check_face_minified', self.mock_check_face):
             invalid_rent_prefs_serializer = UserProfileWithParametersCreateUpdateSerializer(data=invalid_rent_prefs_data)
             self.assertFalse(invalid_rent_prefs_serializer.is_valid(),
                              'Invalid rent preferences should not pass validation')
@@ -394,7 +394,7 @@ class UserProfileWithParametersSerializerCreateTestCase(TestCase):
             'about': self.valid_about | {'birth_date': '1900-02-02'}
         }
         with patch('shallwe_photo.formatcheck.clean_image', self.mock_clean_image), \
-                patch('shallwe_photo.facecheck.check_face_minified_temp', self.mock_check_face):
+                patch('shallwe_photo.facecheck.check_face_minified', self.mock_check_face):
             invalid_about_serializer = UserProfileWithParametersCreateUpdateSerializer(data=invalid_about_data)
             self.assertFalse(invalid_about_serializer.is_valid(),
                              'Invalid about should not pass validation')
@@ -181,9 +181,10 @@ class UserProfileBaseReadSerializerTestCase(TestCase):
             ('is_hidden', False),
             ('name', 'ТестЮзер'),
             ('photo_w768', '/media/profile-photos/valid-format.webp'),
-            ('photo_w540', '/media/CACHE/images/profile-photos/valid-format/48b30af8f559237f115cb97f6b29d6c3.webp'),
-            ('photo_w192', '/media/CACHE/images/profile-photos/valid-format/ffdfdd5001b678517d6f10c82650581a.webp'),
-            ('photo_w64', '/media/CACHE/images/profile-photos/valid-format/181eccfd1992d4775c37070e9b98e463.webp')
+            ('photo_w540', '/media/profile-photos/valid-format_w540.webp'),
+            ('photo_w192', '/media/profile-photos/valid-format_w192.webp'),
+            ('photo_w64', '/media/profile-photos/valid-format_w64.webp'),
+            ('photo_verification_status', 'verified')
         ])
 
         serializer = UserProfileBaseReadSerializer(self.profile)
@@ -244,11 +245,12 @@ class UserProfileWithParametersSerializerReadTestCase(TestCase):
                            ('photo_w768',
                             '/media/profile-photos/valid-format.webp'),
                            ('photo_w540',
-                            '/media/CACHE/images/profile-photos/valid-format/48b30af8f559237f115cb97f6b29d6c3.webp'),
+                            '/media/profile-photos/valid-format_w540.webp'),
                            ('photo_w192',
-                            '/media/CACHE/images/profile-photos/valid-format/ffdfdd5001b678517d6f10c82650581a.webp'),
+                            '/media/profile-photos/valid-format_w192.webp'),
                            ('photo_w64',
-                            '/media/CACHE/images/profile-photos/valid-format/181eccfd1992d4775c37070e9b98e463.webp')])),
+                            '/media/profile-photos/valid-format_w64.webp'),
+                           ('photo_verification_status', 'verified')])),
              ('rent_preferences',
               OrderedDict([('min_budget', 1000),
                            ('max_budget', 2000),
@@ -0,0 +1,161 @@
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch, Mock
+
+import numpy as np
+from PIL import Image
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from shallwe_photo.facecheck import load_minified_image
+from ..models import UserProfile, PhotoVerificationJob, ProfileMatchesRefreshJob
+from ..serializers import UserProfileWithParametersCreateUpdateSerializer
+from ..verification import enqueue_photo_verification, process_next_photo_verification
+
+
+class PhotoVerificationQueueTestCase(TestCase):
+    fixtures = ['locations_mini_fixture.json']
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+
+    def tearDown(self):
+        for profile in UserProfile.objects.filter(user=self.user):
+            profile.delete()
+
+    def _get_photo(self, filename: str = 'valid-format.jpg') -> SimpleUploadedFile:
+        from django.contrib.staticfiles import finders
+        with open(finders.find(f'shallwe_profile/img/{filename}'), 'rb') as photo_file:
+            return SimpleUploadedFile(filename, photo_file.read(), content_type='image/jpeg')
+
+    def _create_profile(self, **kwargs) -> UserProfile:
+        return UserProfile.objects.create(user=self.user, name='ТестЮзер', photo_w768=self._get_photo(), **kwargs)
+
+    @override_settings(PROFILE_PHOTO_ASYNC_VERIFICATION=True)
+    def test_async_upload_queued(self):
+        serializer = UserProfileWithParametersCreateUpdateSerializer(data={
+            'profile': {'name': 'Іван', 'photo': self._get_photo()},
+            'rent_preferences': {'min_budget': 1000, 'max_budget': 2000},
+            'about': {'birth_date': '1960-02-02', 'gender': 1, 'is_couple': True, 'has_children': False}
+        })
+
+        check_face_mock = Mock(return_value=True)
+        with patch('shallwe_photo.facecheck.check_face_minified', check_face_mock):
+            self.assertTrue(serializer.is_valid())
+            profile = serializer.save(kwargs={'profile': {'user': self.user}})
+
+        check_face_mock.assert_not_called()
+        self.assertEqual(profile.photo_verification_status, UserProfile.PhotoVerificationStatusChoices.PENDING)
+        self.assertEqual(profile.photo_verification_job.photo_name, profile.photo_w768.name)
+
+    def test_job_verifies_photo(self):
+        for is_face_detected, expected_status in (
+            (True, UserProfile.PhotoVerificationStatusChoices.VERIFIED),
+            (False, UserProfile.PhotoVerificationStatusChoices.REJECTED)
+        ):
+            profile = self._create_profile(photo_verification_status=UserProfile.PhotoVerificationStatusChoices.PENDING)
+            enqueue_photo_verification(profile)
+
+            with patch('shallwe_photo.facecheck.check_face_minified', return_value=is_face_detected):
+                self.assertTrue(process_next_photo_verification())
+            self.assertFalse(process_next_photo_verification())
+
+            profile.refresh_from_db()
+            self.assertEqual(profile.photo_verification_status, expected_status)
+            self.assertFalse(PhotoVerificationJob.objects.exists())
+            # Shown to (or hidden from) others once the matches are refreshed
+            self.assertTrue(ProfileMatchesRefreshJob.objects.filter(profile=profile).exists())
+            profile.delete()
+
+    def test_stored_rendition_checked(self):
+        profile = self._create_profile(photo_verification_status=UserProfile.PhotoVerificationStatusChoices.PENDING)
+        enqueue_photo_verification(profile)
+
+        with patch('shallwe_photo.facecheck.check_face_minified', return_value=True) as check_face_mock:
+            process_next_photo_verification()
+        checked_image = load_minified_image(check_face_mock.call_args.args[0])
+
+        # The face check sees practically the same pixels as it would on the upload itself (sync verification)
+        uploaded_image = load_minified_image(Image.open(self._get_photo()))
+        pixel_differences = np.abs(np.asarray(checked_image.convert('RGB'), dtype=int) -
+                                   np.asarray(uploaded_image.convert('RGB'), dtype=int))
+        self.assertLess(pixel_differences.mean(), 2)
+
+    def test_job_of_replaced_photo_ignored(self):
+        profile = self._create_profile(photo_verification_status=UserProfile.PhotoVerificationStatusChoices.PENDING)
+        job = enqueue_photo_verification(profile)
+        PhotoVerificationJob.objects.filter(pk=job.pk).update(photo_name='profile-photos/previous.webp')
+
+        check_face_mock = Mock(return_value=False)
+        with patch('shallwe_photo.facecheck.check_face_minified', check_face_mock):
+            self.assertTrue(process_next_photo_verification())
+
+        check_face_mock.assert_not_called()
+        self.assertFalse(PhotoVerificationJob.objects.exists())
+        profile.refresh_from_db()
+        self.assertEqual(profile.photo_verification_status, UserProfile.PhotoVerificationStatusChoices.PENDING)
+
+    def test_check_runs_outside_transaction(self):
+        profile = self._create_profile(photo_verification_status=UserProfile.PhotoVerificationStatusChoices.PENDING)
+        enqueue_photo_verification(profile)
+        atomic_blocks_count = len(connection.atomic_blocks)  # The test's own ones
+
+        def check_face_claimed(_):
+            self.assertEqual(len(connection.atomic_blocks), atomic_blocks_count)
+            self.assertEqual(PhotoVerificationJob.objects.get().status, PhotoVerificationJob.StatusChoices.RUNNING)
+            return True
+
+        with patch('shallwe_photo.facecheck.check_face_minified', side_effect=check_face_claimed) as check_face_mock:
+            self.assertTrue(process_next_photo_verification())
+        check_face_mock.assert_called_once()
+
+    @override_settings(PROFILE_PHOTO_VERIFICATION_MAX_ATTEMPTS=2)
+    def test_failed_job_retried_limited_times(self):
+        profile = self._create_profile(photo_verification_status=UserProfile.PhotoVerificationStatusChoices.PENDING)
+        enqueue_photo_verification(profile)
+
+        with patch('shallwe_photo.facecheck.check_face_minified', side_effect=OSError('No weights')), \
+                self.assertLogs('shallwe_profile.verification', level='ERROR'):
+            self.assertTrue(process_next_photo_verification())
+            self.assertEqual(PhotoVerificationJob.objects.get().status, PhotoVerificationJob.StatusChoices.QUEUED)
+            self.assertTrue(process_next_photo_verification())
+            self.assertFalse(process_next_photo_verification())
+
+        profile.refresh_from_db()
+        self.assertEqual(profile.photo_verification_status, UserProfile.PhotoVerificationStatusChoices.FAILED)
+        self.assertFalse(PhotoVerificationJob.objects.exists())
+
+    @override_settings(PROFILE_PHOTO_VERIFICATION_TIMEOUT=60)
+    def test_abandoned_job_claimed_again(self):
+        profile = self._create_profile(photo_verification_status=UserProfile.PhotoVerificationStatusChoices.PENDING)
+        job = enqueue_photo_verification(profile)
+        jobs = PhotoVerificationJob.objects.filter(pk=job.pk)
+
+        # Claimed by a worker that is still checking it
+        jobs.update(status=PhotoVerificationJob.StatusChoices.RUNNING, attempts=1)
+        self.assertFalse(process_next_photo_verification())
+
+        # Claimed by a worker that died
+        jobs.update(updated_at=timezone.now() - timedelta(seconds=61))
+        with patch('shallwe_photo.facecheck.check_face_minified', return_value=True):
+            self.assertTrue(process_next_photo_verification())
+
+        profile.refresh_from_db()
+        self.assertEqual(profile.photo_verification_status, UserProfile.PhotoVerificationStatusChoices.VERIFIED)
+
+    def test_worker_command(self):
+        profile = self._create_profile(photo_verification_status=UserProfile.PhotoVerificationStatusChoices.PENDING)
+        enqueue_photo_verification(profile)
+
+        stdout = StringIO()
+        with patch('shallwe_photo.facecheck.face_detector_registry.warm_up'), \
+                patch('shallwe_photo.facecheck.check_face_minified', return_value=True):
+            call_command('verify_profile_photos', once=True, stdout=stdout)
+
+        profile.refresh_from_db()
+        self.assertEqual(profile.photo_verification_status, UserProfile.PhotoVerificationStatusChoices.VERIFIED)
+        self.assertIn('Photo verifications processed: 1', stdout.getvalue())
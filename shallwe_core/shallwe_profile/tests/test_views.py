@@ -1,4 +1,5 @@
 import datetime
+import io
 import json
 from collections import OrderedDict
 from unittest.mock import patch
@@ -6,6 +7,7 @@ from unittest.mock import patch
 from PIL import Image
 from django.core.files.uploadedfile import SimpleUploadedFile
 
+from shallwe_photo.facecheck import FaceCheckResult
 from ..models import UserProfile, UserProfileAbout, UserProfileRentPreferences
 from shallwe_util.tests import AuthorizedAPITestCase
 
@@ -51,7 +53,7 @@ class ProfileCreateAPIViewTest(AuthorizedAPITestCase):
 
     def test_valid_profile_creation_tags_as_strs(self):
         with patch('shallwe_photo.formatcheck.clean_image', lambda x: x), \
-             patch('shallwe_photo.facecheck.check_face_minified_temp', lambda x: True):
+             patch('shallwe_photo.facecheck.check_face_minified', lambda x: True):
 
             data_tags_as_strs = self.valid_data_min | {
                 'rent_preferences[locations]': 'UA01',
@@ -63,7 +65,7 @@ class ProfileCreateAPIViewTest(AuthorizedAPITestCase):
 
     def test_valid_profile_creation_min_budget_zero(self):
         with patch('shallwe_photo.formatcheck.clean_image', lambda x: x), \
-                patch('shallwe_photo.facecheck.check_face_minified_temp', lambda x: True):
+                patch('shallwe_photo.facecheck.check_face_minified', lambda x: True):
 
             data_min_budget_zero = self.valid_data_min | {
                 'rent_preferences[min_budget]': 0,
@@ -73,7 +75,7 @@ class ProfileCreateAPIViewTest(AuthorizedAPITestCase):
 
     def test_invalid_data_response(self):
         with patch('shallwe_photo.formatcheck.clean_image', lambda x: None), \
-             patch('shallwe_photo.facecheck.check_face_minified_temp', lambda x: True):
+             patch('shallwe_photo.facecheck.check_face_minified', lambda x: True):
 
             # Wrong value
             invalid_data_wrong_value = self.valid_data_min | {
@@ -178,6 +180,23 @@ class ProfileUpdateAPIViewTest(AuthorizedAPITestCase):
         check(valid_data3)
         self.assertEqual(get_profile().rent_preferences.room_sharing_level, 1)
 
+    def test_profile_photo_update_palette_and_bilevel_png(self):
+        gradient = Image.linear_gradient('L').resize((1000, 1000))
+
+        for image in (gradient.convert('RGB').quantize(16), gradient.convert('1')):
+            buffer = io.BytesIO()
+            image.save(buffer, format='PNG')
+            photo = SimpleUploadedFile('photo.png', buffer.getvalue(), content_type='image/png')
+
+            with patch('shallwe_photo.facecheck.run_face_cascade', return_value=FaceCheckResult()) as cascade_mock:
+                response = self._get_response_shortcut({'profile[photo]': photo})
+
+            self.assertEqual(response.status_code, 200, image.mode)
+            cascade_mock.assert_called_once()
+            profile = UserProfile.objects.get(pk=self.profile.pk)
+            self.assertEqual(profile.photo_verification_status, UserProfile.PhotoVerificationStatusChoices.VERIFIED)
+            self.assertTrue(profile.photo_w768.name.endswith('.webp'))
+
 
 class ProfileReadAPIViewTest(AuthorizedAPITestCase):
     fixtures = ['locations_mini_fixture.json']
@@ -241,11 +260,12 @@ class ProfileReadAPIViewTest(AuthorizedAPITestCase):
                            ('photo_w768',
                             '/media/profile-photos/valid-format.webp'),
                            ('photo_w540',
-                            '/media/CACHE/images/profile-photos/valid-format/48b30af8f559237f115cb97f6b29d6c3.webp'),
+                            '/media/profile-photos/valid-format_w540.webp'),
                            ('photo_w192',
-                            '/media/CACHE/images/profile-photos/valid-format/ffdfdd5001b678517d6f10c82650581a.webp'),
+                            '/media/profile-photos/valid-format_w192.webp'),
                            ('photo_w64',
-                            '/media/CACHE/images/profile-photos/valid-format/181eccfd1992d4775c37070e9b98e463.webp')])),
+                            '/media/profile-photos/valid-format_w64.webp'),
+                           ('photo_verification_status', 'verified')])),
                 ('rent_preferences',
                 OrderedDict([('min_budget', 1000),
                            ('max_budget', 2000),
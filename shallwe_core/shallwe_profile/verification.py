@@ -0,0 +1,108 @@
+"""
+Database-backed queue of profile photo face checks (used if PROFILE_PHOTO_ASYNC_VERIFICATION is on).
+
+The upload request only stores the photo as pending and enqueues a job, so it doesn't wait for the face detectors.
+Jobs are processed by the verify_profile_photos command, any number of its workers can run at once:
+a worker claims a job (marks it running) in a short transaction, skipping the rows locked by other workers,
+runs the face check outside any transaction and writes the verdict in another short one.
+A job claimed longer than PROFILE_PHOTO_VERIFICATION_TIMEOUT ago (its worker died) is claimed again.
+Once a job has been claimed PROFILE_PHOTO_VERIFICATION_MAX_ATTEMPTS times, the photo is marked failed.
+
+Until the photo is verified the profile isn't shown to other users (see matching.get_visible_q),
+the verdict queues a refresh of the profile's matches, so it shows up in (or leaves) the stored matches.
+
+The job checks the stored photo_w768 rendition, as the upload itself isn't kept. The check runs on the photo
+minified to 200x200 (facecheck.load_minified_image) either way: the rendition is the upload downscaled to 768px
+and encoded with light compression, which doesn't survive downscaling by another 4 times,
+so both minify to practically the same pixels (see PhotoVerificationQueueTestCase.test_stored_rendition_checked).
+"""
+
+import logging
+from datetime import timedelta
+
+from PIL import Image
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from shallwe_photo import facecheck
+from .matches import enqueue_matches_refresh
+from .models import UserProfile, PhotoVerificationJob
+
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_photo_verification(profile: UserProfile) -> PhotoVerificationJob:
+    """Queues a face check of the current profile photo (replacing a queued check of a previous one, if any)"""
+    job, _ = PhotoVerificationJob.objects.update_or_create(
+        profile=profile,
+        defaults={'photo_name': profile.photo_w768.name, 'status': PhotoVerificationJob.StatusChoices.QUEUED,
+                  'attempts': 0}
+    )
+    return job
+
+
+def process_next_photo_verification() -> bool:
+    """Processes the oldest queued job not claimed by other workers, returns False if there was none"""
+    with transaction.atomic():
+        job = PhotoVerificationJob.objects.select_for_update(skip_locked=True).filter(
+            Q(status=PhotoVerificationJob.StatusChoices.QUEUED) |
+            Q(status=PhotoVerificationJob.StatusChoices.RUNNING,
+              updated_at__lt=timezone.now() - timedelta(seconds=settings.PROFILE_PHOTO_VERIFICATION_TIMEOUT))
+        ).order_by('updated_at').first()
+
+        if job is None:
+            return False
+
+        if not UserProfile.objects.filter(pk=job.profile_id, photo_w768=job.photo_name).exists():
+            # The photo was replaced since (and its file removed), so a newer job decides
+            job.delete()
+            return True
+
+        if job.attempts >= settings.PROFILE_PHOTO_VERIFICATION_MAX_ATTEMPTS:
+            _resolve(job, UserProfile.PhotoVerificationStatusChoices.FAILED)
+            return True
+
+        job.status = PhotoVerificationJob.StatusChoices.RUNNING
+        job.attempts += 1
+        job.save(update_fields=['status', 'attempts', 'updated_at'])
+
+    # The check takes seconds, so no transaction (and no row lock) is held while it runs
+    try:
+        is_face_detected = check_stored_photo(job.photo_name)
+    except Exception:
+        logger.exception('Face check of %s failed (attempt %d)', job.photo_name, job.attempts)
+        with transaction.atomic():
+            if job.attempts >= settings.PROFILE_PHOTO_VERIFICATION_MAX_ATTEMPTS:
+                _resolve(job, UserProfile.PhotoVerificationStatusChoices.FAILED)
+            else:
+                _get_claimed(job).update(status=PhotoVerificationJob.StatusChoices.QUEUED)
+        return True
+
+    with transaction.atomic():
+        _resolve(job, UserProfile.PhotoVerificationStatusChoices.VERIFIED
+                 if is_face_detected
+                 else UserProfile.PhotoVerificationStatusChoices.REJECTED)
+    return True
+
+
+def check_stored_photo(photo_name: str) -> bool:
+    with default_storage.open(photo_name, 'rb') as photo_file, Image.open(photo_file) as image:
+        return facecheck.check_face_minified(image)
+
+
+def _get_claimed(job: PhotoVerificationJob):
+    # The job row is replaced by a newer one (another photo) if the photo changes while it's checked
+    return PhotoVerificationJob.objects.filter(pk=job.pk, photo_name=job.photo_name)
+
+
+def _resolve(job: PhotoVerificationJob, status: str) -> None:
+    # Applies only if the photo wasn't replaced while being checked
+    if UserProfile.objects.filter(pk=job.profile_id, photo_w768=job.photo_name).update(
+            photo_verification_status=status):
+        # The profile is shown to others only with a verified photo
+        enqueue_matches_refresh(job.profile)
+    _get_claimed(job).delete()
@@ -1,9 +1,21 @@
+import os
+from unittest import skipUnless
+
 from django.contrib.auth import get_user_model
-from django.test import TestCase, Client
+from django.test import TestCase, Client, tag
 from django.test.client import MULTIPART_CONTENT, encode_multipart, BOUNDARY
 from django.urls import reverse
 
 
+def benchmark(test_item):
+    """
+    Marks a wall-clock benchmark (test or test case), kept out of the regular suite as its timings vary by machine.\n
+    Run with SHALLWE_BACKEND_BENCHMARKS=true ./manage.py test --tag benchmark
+    """
+    is_enabled = os.environ.get('SHALLWE_BACKEND_BENCHMARKS') == 'true'
+    return tag('benchmark')(skipUnless(is_enabled, 'Benchmarks run with SHALLWE_BACKEND_BENCHMARKS=true')(test_item))
+
+
 class AuthorizedAPITestCase(TestCase):
     @classmethod
     def setUpTestData(cls):